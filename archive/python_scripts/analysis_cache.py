@@ -0,0 +1,356 @@
+"""
+Memory-mapped cache of the analysis columns of the CPS source.
+
+create_wgt_groups.py and unweighted_wgt_groups.py read overlapping columns
+of the same Parquet source, and each read decodes and copies them again.
+build_analysis_cache() decodes the union of their columns once (filtered
+like read_cps: from START_DATE on, age 16+) into an uncompressed Arrow IPC
+(Feather v2) file, with each column in the narrowest type that holds it:
+  - integers without missing values: the smallest integer type
+  - integers with missing values (the codes): float32 with NaN, exact for codes
+  - other floats: float64 with NaN
+Missing values are stored as NaN rather than Arrow nulls, so every column
+converts to NumPy without a copy. read_analysis_frame() memory-maps the
+file: pages are read on first access and live in the OS page cache, which
+every process reading the file shares, so concurrent scripts and notebooks
+hold one copy of the data between them instead of one each.
+
+The cache records the source files' sizes and mtimes and is rebuilt when the
+source changes (or a reader asks for columns it does not have). A build holds
+an exclusive lock on <cache>.lock, works in its own scratch directory and
+swaps the finished file in with os.replace, so concurrent builders wait for
+each other and readers only ever see a complete file:
+
+    from analysis_cache import read_cps_cached
+    df = read_cps_cached(source_path, columns=['personid', 'date', 'wagegrowthtracker83'], start='2020-01-01')
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from cps_io import (
+    START_DATE, MIN_AGE, ROW_ID, cps_filter, first_row_id, has_consecutive_row_ids, open_cps_dataset
+)
+
+# Union of the columns read by create_wgt_groups.py and unweighted_wgt_groups.py
+ANALYSIS_COLUMNS = [
+    'personid', 'date', 'age76', 'female76', 'race76', 'censusdiv76', 'metstat78', 'educ92', 'employer89',
+    'recession76', 'occupation76', 'occupation76_tm12', 'industry76', 'industry76_tm12', 'paidhrly82',
+    'paidhrly82_tm12', 'wageperhr82', 'wageperhr82_tm12', 'wageperhrclean82', 'wagegrowthtracker83',
+    'lfdetail94', 'lfdetail94_tm12', 'sameemployer94', 'sameemployer94_tm1', 'sameemployer94_tm2',
+    'sameactivities94', 'sameactivities94_tm1', 'sameactivities94_tm2'
+]
+
+# Rows per batch scanned from the source
+BATCH_SIZE = 1_000_000
+
+# Largest integer float32 holds exactly
+FLOAT32_EXACT = 2**24
+
+INTEGER_TYPES = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+
+# Caches written with another layout are rebuilt
+CACHE_FORMAT = '3'
+
+
+def default_cache_path(source_path: str) -> str:
+    """<source without extension>_analysis.arrow, next to the source."""
+    return os.path.splitext(source_path.rstrip('/'))[0] + '_analysis.arrow'
+
+
+def source_signature(source_path: str) -> list:
+    """(relative path, size, mtime) of every file of the source."""
+    if not os.path.isdir(source_path):
+        stat = os.stat(source_path)
+        return [[os.path.basename(source_path), stat.st_size, stat.st_mtime_ns]]
+    signature = []
+    for root, _, names in os.walk(source_path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            signature.append([os.path.relpath(os.path.join(root, name), source_path), stat.st_size, stat.st_mtime_ns])
+    return sorted(signature)
+
+
+################################################################################
+# Build
+################################################################################
+@contextmanager
+def build_lock(cache_path: str):
+    """Exclusive lock on <cache_path>.lock, waiting for any other builder to finish."""
+    with open(f"{cache_path}.lock", 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _batch_stats(batch: pa.RecordBatch, stats: dict):
+    """Accumulate missing counts, min/max and integrality per numeric column."""
+    for name, array in zip(batch.schema.names, batch.columns):
+        if not (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+            continue
+        s = stats.setdefault(name, {'missing': 0, 'min': None, 'max': None, 'integral': True})
+        if pa.types.is_floating(array.type):
+            array = pc.if_else(pc.is_nan(array), None, array)
+            present = pc.drop_null(array)
+            if s['integral'] and len(present):
+                s['integral'] = pc.all(pc.equal(pc.floor(present), present)).as_py()
+        s['missing'] += array.null_count
+        min_max = pc.min_max(array)
+        for key, pick in (('min', min), ('max', max)):
+            value = min_max[key].as_py()
+            if value is not None:
+                s[key] = value if s[key] is None else pick(s[key], value)
+
+
+def compact_type(field: pa.Field, stats: dict) -> pa.DataType:
+    """Narrowest type for a column that converts to NumPy without a copy."""
+    if pa.types.is_timestamp(field.type):
+        return pa.timestamp('ns')
+    s = stats.get(field.name)
+    if s is None:
+        return field.type
+    if not s['integral']:
+        return pa.float64()
+    if s['min'] is None:
+        # Every value missing
+        return pa.float32()
+    if s['missing']:
+        return pa.float32() if max(abs(s['min']), abs(s['max'])) <= FLOAT32_EXACT else pa.float64()
+    for typ in INTEGER_TYPES:
+        info = np.iinfo(typ.to_pandas_dtype())
+        if info.min <= s['min'] and s['max'] <= info.max:
+            return typ
+    return pa.int64()
+
+
+def _compact_values(array: pa.Array, typ: pa.DataType) -> np.ndarray:
+    array = pc.cast(array, typ)
+    if pa.types.is_floating(typ) and array.null_count:
+        array = pc.fill_null(array, np.nan)
+    return array.to_numpy(zero_copy_only=False)
+
+
+def build_analysis_cache(
+    source_path: str,
+    cache_path: str = None,
+    columns: list = ANALYSIS_COLUMNS,
+    start: str = START_DATE,
+    min_age: int = MIN_AGE
+    ) -> str:
+    """
+    Write `columns` of the rows read_cps(source_path, start=start) returns
+    to an uncompressed Arrow IPC file in compact types. Two scans of the
+    source: one for the types and row count, one to write.
+
+    The file holds a single record batch, so each column is one contiguous
+    buffer that converts to NumPy without a copy (a column split over
+    several batches has to be concatenated). The batch is assembled in
+    file-backed scratch arrays next to the cache rather than in memory.
+    """
+    cache_path = cache_path or default_cache_path(source_path)
+    with build_lock(cache_path):
+        return _write_analysis_cache(source_path, cache_path, columns, start, min_age)
+
+
+def _write_analysis_cache(source_path: str, cache_path: str, columns: list, start: str, min_age: int) -> str:
+    """build_analysis_cache without the lock (the caller holds it)."""
+    start_time = time.time()
+    dataset = open_cps_dataset(source_path)
+    row_filter = cps_filter(dataset, start=start, min_age=min_age)
+
+    stats = {}
+    rows = 0
+    for batch in dataset.to_batches(columns=columns, filter=row_filter, batch_size=BATCH_SIZE):
+        _batch_stats(batch, stats)
+        rows += batch.num_rows
+    source_schema = dataset.schema
+    schema = pa.schema([pa.field(name, compact_type(source_schema.field(name), stats)) for name in columns])
+
+    # Private to this build, next to the cache so the finished file can be renamed into place
+    scratch_dir = tempfile.mkdtemp(
+        prefix=f"{os.path.basename(cache_path)}.build-", dir=os.path.dirname(os.path.abspath(cache_path))
+    )
+    try:
+        scratch = {
+            field.name: np.lib.format.open_memmap(
+                os.path.join(scratch_dir, f"{field.name}.npy"), mode='w+',
+                dtype=field.type.to_pandas_dtype(), shape=(rows,)
+            )
+            for field in schema
+        }
+        offset = 0
+        for batch in dataset.to_batches(columns=columns, filter=row_filter, batch_size=BATCH_SIZE):
+            for name, field in zip(columns, schema):
+                scratch[name][offset:offset + batch.num_rows] = _compact_values(batch.column(name), field.type)
+            offset += batch.num_rows
+
+        date_sorted = 'date' in scratch and bool((scratch['date'][1:] >= scratch['date'][:-1]).all())
+        metadata = {
+            'format': CACHE_FORMAT,
+            'source': json.dumps(source_signature(source_path)),
+            'start': str(start),
+            'min_age': str(min_age),
+            'date_sorted': json.dumps(date_sorted),
+        }
+        if has_consecutive_row_ids(dataset, start):
+            # Row id of the first cached row (see cps_io.py)
+            metadata['first_row_id'] = str(first_row_id(dataset, start, min_age))
+        arrays = [pa.array(scratch[field.name], type=field.type) for field in schema]
+        tmp_path = os.path.join(scratch_dir, 'cache.arrow')
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            # No compression, so readers can map the buffers directly
+            with pa.ipc.new_file(sink, schema.with_metadata(metadata)) as writer:
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        del arrays, scratch
+        # Atomic; readers that have the old file mapped keep their view of it
+        os.replace(tmp_path, cache_path)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    size_gb = os.path.getsize(cache_path) / 1024**3
+    print(f"Cached {rows} rows x {len(columns)} columns ({size_gb:.2f} GB) in {cache_path} "
+          f"in {time.time() - start_time:.1f} seconds.")
+    return cache_path
+
+
+################################################################################
+# Read
+################################################################################
+def open_analysis_cache(cache_path: str, columns: list = None) -> pa.Table:
+    """The cached table, memory-mapped (no data is read until it is accessed)."""
+    with pa.memory_map(cache_path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def cache_metadata(schema: pa.Schema) -> dict:
+    return {key.decode(): value.decode() for key, value in (schema.metadata or {}).items()}
+
+
+def cache_is_current(
+    source_path: str,
+    cache_path: str,
+    columns: list = ANALYSIS_COLUMNS,
+    start: str = START_DATE,
+    min_age: int = MIN_AGE
+    ) -> bool:
+    if not os.path.exists(cache_path):
+        return False
+    schema = open_analysis_cache(cache_path).schema
+    metadata = cache_metadata(schema)
+    return (
+        metadata.get('format') == CACHE_FORMAT
+        and metadata.get('source') == json.dumps(source_signature(source_path))
+        and int(metadata.get('min_age', -1)) == min_age
+        # Rows from `start` on are all cached if the cache starts no later
+        and pd.Timestamp(metadata.get('start')) <= pd.Timestamp(start)
+        and set(columns) <= set(schema.names)
+    )
+
+
+def ensure_analysis_cache(
+    source_path: str,
+    cache_path: str = None,
+    columns: list = ANALYSIS_COLUMNS,
+    start: str = START_DATE
+    ) -> str:
+    """Path of a current cache with `columns`, (re)building it if needed."""
+    cache_path = cache_path or default_cache_path(source_path)
+    if cache_is_current(source_path, cache_path, columns, start):
+        return cache_path
+    with build_lock(cache_path):
+        # Another process may have built it while this one waited for the lock
+        if not cache_is_current(source_path, cache_path, columns, start):
+            print(f"Building analysis cache {cache_path}...")
+            columns = list(dict.fromkeys(ANALYSIS_COLUMNS + list(columns)))
+            _write_analysis_cache(
+                source_path, cache_path, columns, min(pd.Timestamp(start), pd.Timestamp(START_DATE)), MIN_AGE
+            )
+    return cache_path
+
+
+def read_analysis_frame(
+    cache_path: str,
+    columns: list = None,
+    start: str = None,
+    end: str = None,
+    row_ids: bool = False
+    ) -> pd.DataFrame:
+    """
+    `columns` of the cached rows with start <= date <= end as a DataFrame
+    whose columns are views of the mapped file. The arrays are read-only;
+    assign new columns instead of modifying them in place. With row_ids,
+    adds the rows' ids (see cps_io.py) as a row_id column.
+    """
+    table = open_analysis_cache(cache_path)
+    metadata = cache_metadata(table.schema)
+    if row_ids and 'first_row_id' not in metadata:
+        raise ValueError(f"{cache_path} has no row ids (built from an unpartitioned source with a start other than {START_DATE})")
+    positions = None
+    if start is not None or end is not None:
+        dates = table.column('date')
+        if json.loads(metadata.get('date_sorted', 'false')):
+            # Rows are in date order: slice, which keeps the mapping
+            values = dates.to_numpy()
+            first = 0 if start is None else int(np.searchsorted(values, np.datetime64(pd.Timestamp(start)), 'left'))
+            last = len(values) if end is None else int(np.searchsorted(values, np.datetime64(pd.Timestamp(end)), 'right'))
+            table = table.slice(first, last - first)
+            positions = np.arange(first, last)
+        else:
+            mask = pc.scalar(True)
+            if start is not None:
+                mask = pc.and_(mask, pc.greater_equal(dates, pd.Timestamp(start)))
+            if end is not None:
+                mask = pc.and_(mask, pc.less_equal(dates, pd.Timestamp(end)))
+            table = table.filter(mask)
+            positions = pc.indices_nonzero(mask).to_numpy() if row_ids else None
+    if columns is not None:
+        table = table.select(columns)
+    df = table.to_pandas(split_blocks=True)
+    if row_ids:
+        positions = np.arange(len(df)) if positions is None else positions
+        df[ROW_ID] = positions + int(metadata['first_row_id'])
+    return df
+
+
+def read_cps_cached(
+    source_path: str,
+    columns: list = None,
+    start: str = START_DATE,
+    end: str = None,
+    cache_path: str = None,
+    row_ids: bool = False
+    ) -> pd.DataFrame:
+    """read_cps() through the analysis cache: same rows, compact types."""
+    columns = columns or ANALYSIS_COLUMNS
+    cache_path = ensure_analysis_cache(source_path, cache_path, columns, start or START_DATE)
+    return read_analysis_frame(cache_path, columns, start, end, row_ids)
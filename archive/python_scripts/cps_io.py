@@ -0,0 +1,169 @@
+"""
+Readers for the CPS Parquet data used by the group and wage growth scripts.
+
+The source can be the original single Parquet file or the Hive-partitioned
+dataset written by ingest/convert_to_parquet.py (year=YYYY/month=M/, sorted
+by personid within each month), which is scanned in calendar order. For the
+partitioned layout, date bounds are also turned into year/month partition
+filters so whole months outside the range are never opened.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+# Same restrictions as the Atlanta Fed scripts: observations from January 1982
+# on (date >= START_DATE), age 16+
+START_DATE = "1982-01-01"
+MIN_AGE = 16
+
+
+def is_month_partitioned(dataset: ds.Dataset) -> bool:
+    partitioning = dataset.partitioning
+    return partitioning is not None and {'year', 'month'} <= set(partitioning.schema.names)
+
+
+def open_cps_dataset(path: str) -> ds.Dataset:
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    if is_month_partitioned(dataset):
+        # Discovery lists month=10 before month=2; put the files in calendar
+        # order so scans return rows in date order
+        month_of = {}
+        for fragment in dataset.get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            month_of[fragment.path] = (keys['year'], keys['month'])
+        files = sorted(month_of, key=lambda file: (month_of[file], file))
+        dataset = ds.dataset(files, format='parquet', partitioning='hive', partition_base_dir=path)
+    return dataset
+
+
+def _month_key(field_year, field_month):
+    return field_year * 12 + field_month
+
+
+def cps_filter(
+    dataset: ds.Dataset,
+    start: str = START_DATE,
+    end: str = None,
+    min_age: int = MIN_AGE
+    ) -> ds.Expression:
+    """
+    Row filter for date >= start, date <= end (either may be None) and
+    age76 >= min_age, plus the equivalent partition filter when the dataset
+    is partitioned by month.
+    """
+    expression = ds.field('age76') >= min_age
+    if start is not None:
+        expression &= ds.field('date') >= pd.Timestamp(start)
+    if end is not None:
+        expression &= ds.field('date') <= pd.Timestamp(end)
+
+    if is_month_partitioned(dataset):
+        month_key = _month_key(ds.field('year'), ds.field('month'))
+        if start is not None:
+            start = pd.Timestamp(start)
+            expression &= month_key >= _month_key(start.year, start.month)
+        if end is not None:
+            end = pd.Timestamp(end)
+            expression &= month_key <= _month_key(end.year, end.month)
+    return expression
+
+
+def read_cps(
+    path: str,
+    columns: list = None,
+    start: str = START_DATE,
+    end: str = None,
+    min_age: int = MIN_AGE
+    ) -> pd.DataFrame:
+    """
+    Read `columns` (all source columns if None) for observations with
+    start <= date <= end and age76 >= min_age. Partition columns are not
+    returned unless requested.
+    """
+    dataset = open_cps_dataset(path)
+    if columns is None:
+        partition_names = dataset.partitioning.schema.names if is_month_partitioned(dataset) else []
+        columns = [name for name in dataset.schema.names if name not in partition_names]
+    table = dataset.to_table(columns=columns, filter=cps_filter(dataset, start, end, min_age))
+    return table.to_pandas()
+
+
+def months_back(months: int, end: str = None) -> str:
+    """Start date that selects the last `months` months up to `end` (default: today)."""
+    end = pd.Timestamp.today() if end is None else pd.Timestamp(end)
+    return (end.to_period('M') - months + 1).to_timestamp().strftime('%Y-%m-%d')
+
+
+################################################################################
+# Row ids
+################################################################################
+# Row ids number the rows of the scan read_cps(path) does with the default
+# filter (date >= START_DATE, age76 >= MIN_AGE), in scan order. Outputs that
+# carry them (WGT_groups.parquet) can be lined up with another read of the
+# same source by position instead of a join on (personid, date).
+ROW_ID = 'row_id'
+
+
+def first_row_id(dataset: ds.Dataset, start: str = START_DATE, min_age: int = MIN_AGE) -> int:
+    """
+    Row id of the first row a scan with date >= start returns: the number
+    of rows from START_DATE up to (not including) start, negative if start
+    is earlier. Rows of such a scan have consecutive ids only if the source
+    is month-partitioned or start is START_DATE (the other rows of an
+    unsorted file are interleaved).
+    """
+    if pd.Timestamp(start) == pd.Timestamp(START_DATE):
+        return 0
+    return (
+        dataset.count_rows(filter=cps_filter(dataset, START_DATE, min_age=min_age))
+        - dataset.count_rows(filter=cps_filter(dataset, start, min_age=min_age))
+    )
+
+
+def has_consecutive_row_ids(dataset: ds.Dataset, start: str = START_DATE) -> bool:
+    return is_month_partitioned(dataset) or pd.Timestamp(start) == pd.Timestamp(START_DATE)
+
+
+def attach_groups(df: pd.DataFrame, groups: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """
+    Left join of the group columns of `groups` (WGT_groups.parquet) onto
+    `df` by (personid, date), without a hash join when both carry row ids:
+    identical row ids are attached as they are, otherwise rows are matched by
+    binary search on the sorted row ids of `groups`. Matches are checked
+    against personid and date. Without row ids (files written before them)
+    this falls back to merge().
+    """
+    keys = ['personid', 'date']
+    columns = columns or [col for col in groups.columns if col not in keys + [ROW_ID]]
+    if ROW_ID not in df.columns or ROW_ID not in groups.columns:
+        print("No row ids; merging on personid and date.")
+        return df.merge(groups[keys + columns], on=keys, how='left')
+
+    left = df[ROW_ID].to_numpy()
+    right = groups[ROW_ID].to_numpy()
+    if len(left) == len(right) and np.array_equal(left, right):
+        indexer = None
+        matched = slice(None)
+    else:
+        if len(right) > 1 and not (right[1:] > right[:-1]).all():
+            raise ValueError(f"groups are not sorted by {ROW_ID}")
+        indexer = np.searchsorted(right, left)
+        found = indexer < len(right)
+        found[found] = right[indexer[found]] == left[found]
+        indexer[~found] = -1
+        matched = found
+    for key in keys:
+        if key not in groups.columns:
+            continue
+        ours = df[key].to_numpy()[matched]
+        theirs = groups[key].to_numpy()
+        theirs = theirs if indexer is None else theirs[indexer[matched]]
+        if not np.array_equal(ours, theirs):
+            raise ValueError(f"{key} differs between rows with the same {ROW_ID}; "
+                             "the groups were created from a different source")
+
+    df = df.copy(deep=False)
+    for col in columns:
+        values = groups[col].array
+        df[col] = values if indexer is None else pd.api.extensions.take(values, indexer, allow_fill=True)
+    return df
@@ -0,0 +1,25 @@
+"""
+Data locations shared by the scripts in this folder and run_pipeline.py.
+
+Edit the defaults here (not in the scripts), or set WGT_RAW_DATA_PATH,
+WGT_PROCESSED_DATA_PATH and WGT_SOURCE_PATH in the environment;
+run_pipeline.py passes its paths to every stage that way.
+"""
+import os
+
+rawdatapath = os.environ.get('WGT_RAW_DATA_PATH', "/home/ec2-user/tlg_wagetracker/data")
+processeddatapath = os.environ.get('WGT_PROCESSED_DATA_PATH', "/home/ec2-user/tlg_wagetracker/data")
+
+# CPS Parquet source written by ingest/convert_to_parquet.py
+sourcepath = os.environ.get(
+    'WGT_SOURCE_PATH', f"{rawdatapath}/CPS_harmonized_variable_longitudinally_matched_age16plus.parquet"
+)
+
+
+def path_environment(rawdatapath: str, processeddatapath: str, sourcepath: str) -> dict:
+    """Environment variables that point the scripts at these paths."""
+    return {
+        'WGT_RAW_DATA_PATH': rawdatapath,
+        'WGT_PROCESSED_DATA_PATH': processeddatapath,
+        'WGT_SOURCE_PATH': sourcepath,
+    }
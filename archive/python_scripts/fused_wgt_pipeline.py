@@ -0,0 +1,202 @@
+"""
+Single-scan version of create_wgt_groups.py followed by unweighted_wgt_groups.py.
+
+The two scripts read the source twice, write WGT_groups.parquet and
+wage-growth-data_unweighted.parquet, and read the groups back to attach
+them. Groups are row-local and wage quartiles, the unweighted filter and the
+collapse are month-local (see wgt_parallel.py), so this reads each source
+batch once, in date order, and as soon as a month is complete computes its
+groups, wage quartiles, unweighted observations and collapsed row. Only a
+block of about BATCH_SIZE rows of whole months is held in memory. The
+collapsed and smoothed outputs are always written; the intermediate files
+(WGT_groups.parquet and the unweighted observations) only when asked for:
+
+    python fused_wgt_pipeline.py                      # collapsed and smoothed outputs
+    python fused_wgt_pipeline.py groups unweighted    # plus both intermediate files
+
+The source must be scanned in date order: the month-partitioned dataset (or
+a single file sorted by date).
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from analysis_cache import compact_type
+from cps_io import ROW_ID, START_DATE, cps_filter, first_row_id, has_consecutive_row_ids, open_cps_dataset
+from data_paths import processeddatapath, sourcepath
+from smoothing import smooth_collapsed
+from stream_wgt_groups import month_ids
+from wgt_parallel import SOURCE_COLUMNS, month_outputs
+
+# Rows per batch read from the source
+BATCH_SIZE = 1_000_000
+
+# Intermediate outputs that can be requested, and their files
+INTERMEDIATES = {
+    'groups': 'WGT_groups',
+    'unweighted': 'wage-growth-data_unweighted',
+}
+
+
+def footer_stats(dataset: ds.Dataset, columns: list) -> dict:
+    """
+    Missing count, min and max of each integer column over every file of the
+    source, from the Parquet footers (no data is read), in the form
+    analysis_cache.compact_type takes. Columns stored as floats in some file
+    or without statistics are left out.
+    """
+    stats, unknown = {}, set()
+    for fragment in dataset.get_fragments():
+        physical, metadata = fragment.physical_schema, fragment.metadata
+        for name in columns:
+            if name in unknown or name not in physical.names:
+                continue
+            if not pa.types.is_integer(physical.field(name).type):
+                unknown.add(name)
+                continue
+            index = metadata.schema.names.index(name)
+            s = stats.setdefault(name, {'missing': 0, 'min': None, 'max': None, 'integral': True})
+            for group in range(metadata.num_row_groups):
+                column_stats = metadata.row_group(group).column(index).statistics
+                if column_stats is None or not column_stats.has_null_count:
+                    unknown.add(name)
+                    break
+                s['missing'] += column_stats.null_count
+                if column_stats.has_min_max:
+                    s['min'] = column_stats.min if s['min'] is None else min(s['min'], column_stats.min)
+                    s['max'] = column_stats.max if s['max'] is None else max(s['max'], column_stats.max)
+    return {name: s for name, s in stats.items() if name not in unknown}
+
+
+def scan_schema(schema: pa.Schema, columns: list, stats: dict = None) -> pa.Schema:
+    """
+    Types batches are read as, the same for every month whether or not its
+    codes have missing values. Integer columns with footer statistics get
+    the analysis cache's type (compact_type), so the outputs have the serial
+    scripts' column types; the others become floats: float32 for codes of
+    up to 16 bits, which it holds exactly, float64 otherwise.
+    """
+    stats = stats or {}
+
+    def scan_type(field):
+        if not pa.types.is_integer(field.type):
+            return field.type
+        if field.name in stats:
+            return compact_type(field, stats)
+        if field.name == 'personid':
+            return field.type
+        return pa.float32() if field.type.bit_width <= 16 else pa.float64()
+    return pa.schema([pa.field(name, scan_type(schema.field(name))) for name in columns])
+
+
+def scan_month_blocks(
+    source_path: str,
+    columns: list = SOURCE_COLUMNS,
+    start: str = START_DATE,
+    batch_size: int = BATCH_SIZE
+    ):
+    """
+    Yield the rows of the source (date >= start, age 16+) from one scan, as
+    DataFrames of whole months in month order. Months are put together until
+    a block has batch_size rows, so small months do not each pay the fixed
+    cost of the group and collapse steps.
+    """
+    dataset = open_cps_dataset(source_path)
+    schema = scan_schema(dataset.schema, columns, footer_stats(dataset, columns))
+    complete, complete_rows = [], 0
+    current, current_month = [], None
+    for batch in dataset.to_batches(columns=columns, filter=cps_filter(dataset, start), batch_size=batch_size):
+        if not batch.num_rows:
+            continue
+        df = pa.Table.from_batches([batch]).cast(schema).to_pandas()
+        months = month_ids(df['date'])
+        if (np.diff(months) < 0).any() or (current_month is not None and months[0] < current_month):
+            raise ValueError(f"{source_path} is not in date order; use the month-partitioned dataset")
+        bounds = np.flatnonzero(np.diff(months)) + 1
+        for first, last in zip(np.r_[0, bounds], np.r_[bounds, len(df)]):
+            if current_month is not None and months[first] != current_month:
+                # The current month is complete
+                complete += current
+                complete_rows += sum(len(piece) for piece in current)
+                current = []
+                if complete_rows >= batch_size:
+                    yield pd.concat(complete, ignore_index=True)
+                    complete, complete_rows = [], 0
+            current_month = months[first]
+            current.append(df.iloc[first:last])
+    if complete or current:
+        yield pd.concat(complete + current, ignore_index=True)
+
+
+def fused_wgt_pipeline(
+    source_path: str,
+    output_dir: str,
+    write: tuple = (),
+    start: str = START_DATE
+    ) -> tuple:
+    """
+    Create the collapsed and smoothed unweighted outputs in output_dir from
+    one scan of the source, plus the intermediates named in `write`
+    ('groups', 'unweighted'). Returns (collapsed, smoothed).
+    """
+    unknown = set(write) - set(INTERMEDIATES)
+    if unknown:
+        raise ValueError(f"Unknown outputs {sorted(unknown)}; expected some of {list(INTERMEDIATES)}")
+    start_time = time.time()
+    dataset = open_cps_dataset(source_path)
+    next_row_id = first_row_id(dataset, start) if has_consecutive_row_ids(dataset, start) else None
+
+    writers = {}
+    collapsed = []
+    rows_processed = 0
+    try:
+        for df in scan_month_blocks(source_path, start=start):
+            groups, unweighted, collapsed_month = month_outputs(df)
+            if collapsed_month is not None:
+                collapsed.append(collapsed_month)
+            if 'groups' in write and next_row_id is not None:
+                groups = groups.copy()
+                groups.insert(0, ROW_ID, np.arange(next_row_id, next_row_id + len(groups)))
+                next_row_id += len(groups)
+            for name, frame in (('groups', groups), ('unweighted', unweighted)):
+                if name not in write:
+                    continue
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if name not in writers:
+                    writers[name] = pq.ParquetWriter(f"{output_dir}/{INTERMEDIATES[name]}.parquet", table.schema)
+                    frame.head(100).to_csv(f"{output_dir}/{INTERMEDIATES[name]}_sample.csv", index=False)
+                writers[name].write_table(table)
+            rows_processed += len(df)
+            print(f"{df['date'].iloc[-1]:%Y-%m}: {rows_processed} rows processed.")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for name in writers:
+        print(f"Saved {INTERMEDIATES[name]}.parquet to {output_dir}")
+
+    # Collapsed and smoothed outputs, as in unweighted_wgt_groups.py
+    collapsed = pd.concat(collapsed, ignore_index=True)
+    collapsed['date'] = pd.to_datetime({'year': collapsed['year'], 'month': collapsed['month'], 'day': 1})
+    collapsed['date'] = collapsed['date'].dt.strftime('%m/%d/%Y')
+    collapsed.head(100).to_csv(f"{output_dir}/wage-growth-data_unweighted_collapsed_sample.csv", index=False)
+    collapsed.to_parquet(f"{output_dir}/wage-growth-data_unweighted_collapsed.parquet", index=False)
+    print(f"Saved unsmoothed unweighted cuts to {output_dir}/wage-growth-data_unweighted_collapsed.parquet")
+    smoothed = smooth_collapsed(collapsed)
+    smoothed.head(100).to_csv(f"{output_dir}/wage-growth-data_unweighted_smoothed_sample.csv", index=False)
+    smoothed.to_parquet(f"{output_dir}/wage-growth-data_unweighted_smoothed.parquet", index=False)
+    print(f"Saved smoothed unweighted cuts to {output_dir}/wage-growth-data_unweighted_smoothed.parquet")
+    print(f"Processed {rows_processed} rows in {time.time() - start_time:.1f} seconds.")
+    return collapsed, smoothed
+
+
+if __name__ == "__main__":
+    fused_wgt_pipeline(
+        sourcepath,
+        processeddatapath,
+        write=tuple(sys.argv[1:])
+    )
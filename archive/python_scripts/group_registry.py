@@ -0,0 +1,386 @@
+"""
+Single definition of the Wage Growth Tracker groups (dimensions), compiled to
+both pandas (int8 codes / Categoricals) and SQL (CASE expressions).
+
+Definitions follow the Atlanta Fed's create_wgt_groups.do. Each group is a
+list of (label, condition) rules; the first matching rule wins, and rows that
+match nothing get the group's default label (or missing). Label order defines
+the integer codes: code i is labels[i], -1 is missing.
+
+Running this file regenerates the generated blocks of the SQL scripts in
+sqlite/scripts/ so the SQL and Python outputs stay identical.
+"""
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+################################################################################
+# Conditions
+################################################################################
+
+@dataclass(frozen=True)
+class Eq:
+    column: str
+    value: int
+
+    def sql(self) -> str:
+        return f"{self.column} == {self.value}"
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return (df[self.column] == self.value).to_numpy()
+
+
+@dataclass(frozen=True)
+class In:
+    column: str
+    values: tuple
+
+    def sql(self) -> str:
+        return f"{self.column} in ({','.join(str(v) for v in self.values)})"
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return df[self.column].isin(self.values).to_numpy()
+
+
+@dataclass(frozen=True)
+class Between:
+    column: str
+    low: int
+    high: int
+
+    def sql(self) -> str:
+        return f"{self.column} between {self.low} and {self.high}"
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return df[self.column].between(self.low, self.high, inclusive='both').to_numpy()
+
+
+@dataclass(frozen=True)
+class AtLeast:
+    column: str
+    value: int
+
+    def sql(self) -> str:
+        return f"{self.column} >= {self.value}"
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return (df[self.column] >= self.value).to_numpy()
+
+
+@dataclass(frozen=True)
+class Differs:
+    """Stata `a != b`: two missing values compare equal (SQL `is not`)."""
+    column: str
+    other: str
+
+    def sql(self) -> str:
+        return f"{self.column} is not {self.other}"
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        a, b = df[self.column], df[self.other]
+        return ((a != b) & ~(a.isna() & b.isna())).to_numpy()
+
+
+@dataclass(frozen=True)
+class AnyOf:
+    conditions: tuple
+
+    def sql(self) -> str:
+        return ' or '.join(c.sql() for c in self.conditions)
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return np.logical_or.reduce([c.mask(df) for c in self.conditions])
+
+
+@dataclass(frozen=True)
+class AllOf:
+    conditions: tuple
+
+    def sql(self) -> str:
+        return ' and '.join(
+            f"({c.sql()})" if isinstance(c, AnyOf) else c.sql() for c in self.conditions
+        )
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return np.logical_and.reduce([c.mask(df) for c in self.conditions])
+
+################################################################################
+# Groups
+################################################################################
+
+@dataclass(frozen=True)
+class Group:
+    name: str
+    labels: tuple
+    rules: tuple
+    default: str = None
+    description: str = ''
+
+    @property
+    def columns(self) -> list:
+        """Source columns the rules read."""
+        found = []
+        def visit(condition):
+            if isinstance(condition, (AnyOf, AllOf)):
+                for c in condition.conditions:
+                    visit(c)
+            else:
+                for col in (condition.column, getattr(condition, 'other', None)):
+                    if col is not None and col not in found:
+                        found.append(col)
+        for _, condition in self.rules:
+            visit(condition)
+        return found
+
+    def code(self, label: str) -> int:
+        return self.labels.index(label)
+
+    def codes(self, df: pd.DataFrame) -> np.ndarray:
+        """int8 code per row (-1 = missing)."""
+        default = -1 if self.default is None else self.code(self.default)
+        return np.select(
+            [condition.mask(df) for _, condition in self.rules],
+            [np.int8(self.code(label)) for label, _ in self.rules],
+            default=np.int8(default)
+        ).astype(np.int8)
+
+    def categorical(self, df: pd.DataFrame) -> pd.Categorical:
+        return codes_to_categorical(self.codes(df), self.labels)
+
+    def sql(self, indent: str = '') -> str:
+        lines = [f"{indent}, case"]
+        for label, condition in self.rules:
+            if isinstance(condition, AnyOf) and len(condition.conditions) > 2:
+                # One alternative per line, as in the hand-written scripts
+                alternatives = f"\n{indent}\t\tor ".join(c.sql() for c in condition.conditions)
+                lines.append(f"{indent}\twhen\n{indent}\t\t{alternatives}\n{indent}\tthen '{label}'")
+            else:
+                lines.append(f"{indent}\twhen {condition.sql()} then '{label}'")
+        if self.default is not None:
+            lines.append(f"{indent}\telse '{self.default}'")
+        lines.append(f"{indent}end as {self.name}")
+        return '\n'.join(lines)
+
+
+def codes_to_categorical(codes: np.ndarray, labels: tuple) -> pd.Categorical:
+    return pd.Categorical.from_codes(codes, categories=list(labels))
+
+
+EMPLOYER_SWITCH = tuple(
+    Eq(col, 2) for col in (
+        'sameemployer94', 'sameemployer94_tm1', 'sameemployer94_tm2',
+        'sameactivities94', 'sameactivities94_tm1', 'sameactivities94_tm2'
+    )
+)
+
+CENSUS_DIVISIONS = ('pac', 'esc', 'wsc', 'mnt', 'nen', 'sat', 'wnc', 'enc', 'mat')
+
+GROUPS = (
+    Group(
+        'hrlygroup', ('Hourly', 'Non-Hourly'),
+        (
+            ('Hourly', AllOf((Eq('paidhrly82', 1), Eq('paidhrly82_tm12', 1)))),
+            # Non-hourly in either period, or switched into/out of hourly
+            ('Non-Hourly', AllOf((In('paidhrly82', (0, 1)), In('paidhrly82_tm12', (0, 1))))),
+        ),
+        description="Paid hourly in both periods"
+    ),
+    Group(
+        'jstayergroup', ('Job Stayer', 'Job Switcher'),
+        (
+            ('Job Switcher', AnyOf((
+                Differs('occupation76', 'occupation76_tm12'),
+                Differs('industry76', 'industry76_tm12'),
+            ) + EMPLOYER_SWITCH)),
+        ),
+        default='Job Stayer',
+        description="New occupation/industry or a different employer/activities answer"
+    ),
+    Group(
+        'agegroup', ('16-24', '25-54', '55+'),
+        (
+            ('16-24', Between('age76', 16, 24)),
+            ('25-54', Between('age76', 25, 54)),
+            ('55+', AtLeast('age76', 55)),
+        )
+    ),
+    Group(
+        'gengroup', ('Male', 'Female'),
+        (
+            ('Male', Eq('female76', 0)),
+            ('Female', Eq('female76', 1)),
+        )
+    ),
+    Group(
+        'secgroup', ('Goods', 'Services'),
+        (
+            ('Goods', In('industry76', (1, 2, 3, 13))),
+            ('Services', In('industry76', (4, 5, 6, 7, 8, 9, 10, 11, 12))),
+        )
+    ),
+    Group(
+        'edgroup3', ('Nodegree', 'Associates', 'Bachelor+'),
+        (
+            ('Nodegree', Between('educ92', 1, 3)),
+            ('Bachelor+', Between('educ92', 6, 7)),
+            ('Associates', Between('educ92', 4, 5)),
+        ),
+        description="Education groups for 12-month average cuts"
+    ),
+    Group(
+        'edgroup2', ('Nodegree', 'Degree'),
+        (
+            ('Nodegree', Between('educ92', 1, 3)),
+            ('Degree', Between('educ92', 4, 7)),
+        ),
+        description="Education groups for 3-month average cuts"
+    ),
+    Group(
+        'occgroup', ('Professional', 'Nonprofessional'),
+        (
+            ('Professional', In('occupation76', (11, 12, 13))),
+            ('Nonprofessional', In('occupation76', (21, 22, 23, 31, 32, 33, 34))),
+        )
+    ),
+    Group(
+        'ftptgroup', ('Full-time', 'Part-time'),
+        (
+            ('Full-time', AnyOf((Eq('lfdetail94', 6), Between('lfdetail94', 8, 20)))),
+            ('Part-time', AnyOf((Eq('lfdetail94', 7), Between('lfdetail94', 21, 32)))),
+        )
+    ),
+    Group(
+        'skillgroup', ('Low', 'Middle', 'High'),
+        (
+            ('Low', In('occupation76', (32, 33, 34))),
+            ('Middle', In('occupation76', (21, 22, 23, 31))),
+            ('High', In('occupation76', (11, 12, 13))),
+        )
+    ),
+    Group(
+        'indgroup',
+        (
+            'Construction & Mining', 'Education & Health', 'Finance and Business Services',
+            'Leisure & Hospitality', 'Manufacturing', 'Public Administration',
+            'Trade & Transportation'
+        ),
+        (
+            ('Construction & Mining', In('industry76', (1, 2))),
+            ('Education & Health', Eq('industry76', 9)),
+            ('Finance and Business Services', In('industry76', (6, 7, 8))),
+            ('Leisure & Hospitality', In('industry76', (10, 11))),
+            ('Manufacturing', Eq('industry76', 3)),
+            ('Public Administration', Eq('industry76', 12)),
+            ('Trade & Transportation', In('industry76', (4, 5))),
+        )
+    ),
+    Group(
+        'racegroup', ('White', 'Nonwhite'),
+        (
+            ('White', Eq('race76', 1)),
+            ('Nonwhite', Between('race76', 2, 3)),
+        )
+    ),
+    Group(
+        'msagroup', ('MSA', 'NonMSA'),
+        (
+            ('MSA', Eq('metstat78', 1)),
+            ('NonMSA', Eq('metstat78', 2)),
+        )
+    ),
+    Group(
+        'cdivgroup', CENSUS_DIVISIONS,
+        tuple((div, Eq('censusdiv76', i + 1)) for i, div in enumerate(CENSUS_DIVISIONS))
+    ),
+)
+
+# Wage quartile of the average of current and 12-month-lagged hourly wage,
+# computed within each month. Only the labels are shared: the thresholds
+# come from the data (quantiles in pandas, ntile(4) in SQL).
+WAGE_GROUP = Group('wagegroup', ('1st', '2nd', '3rd', '4th'), ())
+
+GROUPS_BY_NAME = {group.name: group for group in GROUPS + (WAGE_GROUP,)}
+
+# Raw columns needed to assign every group
+GROUP_COLUMNS = list(dict.fromkeys(col for group in GROUPS for col in group.columns))
+
+
+def add_groups(df: pd.DataFrame, as_codes: bool = False) -> pd.DataFrame:
+    """
+    Add one column per group. Columns are Categoricals sharing the registry's
+    labels, or raw int8 codes if `as_codes` is True; either way one byte per row.
+    """
+    for group in GROUPS:
+        df[group.name] = group.codes(df) if as_codes else group.categorical(df)
+    return df
+
+
+# Years in which Census masking of identifiers leaves months without any wgt
+# observation; their wages still count towards the quartile thresholds.
+BLACKOUT_YEARS = (1985, 1986, 1995, 1996)
+
+def wage_hr_avg(df: pd.DataFrame) -> pd.Series:
+    """
+    Average of current and 12-month-lagged hourly wage, used for the wage
+    quartiles. Missing unless the observation has a wage growth value
+    (which implies both wages exist) or falls in a masking year.
+    """
+    condition = df['wagegrowthtracker83'].notna() | df['date'].dt.year.isin(BLACKOUT_YEARS)
+    return ((df['wageperhr82'] + df['wageperhr82_tm12']) / 2).where(condition)
+
+
+def wage_quartile_codes(wage: pd.Series, p25, p50, p75) -> np.ndarray:
+    """Allocate observations to wage quartiles given per-row thresholds."""
+    wage = np.asarray(wage, dtype='float64')
+    p25, p50, p75 = (np.asarray(p, dtype='float64') for p in (p25, p50, p75))
+    codes = np.full(len(wage), -1, dtype=np.int8)
+    valid = ~np.isnan(wage)
+    codes[valid & (wage < p25)] = 0
+    codes[valid & (wage >= p25) & (wage < p50)] = 1
+    codes[valid & (wage >= p50) & (wage < p75)] = 2
+    codes[valid & (wage >= p75)] = 3
+    return codes
+
+################################################################################
+# SQL
+################################################################################
+
+SQL_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sqlite', 'scripts')
+GENERATED_SQL_SCRIPTS = ('create_wgt_groups.sql', 'refresh_wgt_groups.sql')
+
+def group_cases_sql(indent: str = '\t\t\t') -> str:
+    return '\n'.join(group.sql(indent) for group in GROUPS)
+
+def group_columns_sql(alias: str = 'g', indent: str = '\t') -> str:
+    return '\n'.join(f"{indent}, {alias}.{group.name}" for group in GROUPS)
+
+def wage_group_sql(column: str, indent: str = '\t') -> str:
+    lines = [f"{indent}, case {column}"]
+    for i, label in enumerate(WAGE_GROUP.labels):
+        lines.append(f"{indent}\twhen {i + 1} then '{label}'")
+    lines.append(f"{indent}end as {WAGE_GROUP.name}")
+    return '\n'.join(lines)
+
+def render_sql(text: str) -> str:
+    """Replace every `/* begin generated: <block> */ ... /* end generated */` block."""
+    blocks = {
+        'group cases': group_cases_sql,
+        'group columns': group_columns_sql,
+        'wage group': lambda: wage_group_sql('g.wagequartile'),
+    }
+    pattern = re.compile(r"(/\* begin generated: ([a-z ]+) \*/)(.*?)(\n[ \t]*/\* end generated \*/)", re.S)
+    return pattern.sub(lambda m: m.group(1) + '\n' + blocks[m.group(2)]() + m.group(4), text)
+
+
+if __name__ == "__main__":
+    for filename in GENERATED_SQL_SCRIPTS:
+        path = os.path.join(SQL_SCRIPTS_DIR, filename)
+        with open(path, 'r') as file:
+            text = file.read()
+        rendered = render_sql(text)
+        with open(path, 'w') as file:
+            file.write(rendered)
+        print(f"{'Updated' if rendered != text else 'Unchanged'}: {path}")
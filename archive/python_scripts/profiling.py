@@ -0,0 +1,212 @@
+"""
+Stage profiling for the pipeline scripts.
+
+Wrap each named step in a stage (a context manager, or a decorator for
+functions) and record the frame it produced:
+
+    profiler = Profiler('summary', log_path='profile.json')
+    with profiler.stage('read') as stage:
+        df = read_cps(...)
+        stage.observe(df)
+    ...
+    profiler.report()
+
+Modes:
+  off       stages are a shared no-op; nothing is measured or written
+  summary   wall time, CPU time, peak RSS increase and rows per stage
+  detailed  also the frame's columns and (shallow) memory, current RSS, and
+            the functions with the most cumulative time in each top-level
+            stage (cProfile)
+
+Memory is never measured with memory_usage(deep=True), which walks every
+Python object in object columns and can cost more than the step it measures.
+The WGT_PROFILE environment variable overrides the mode, so e.g.
+`WGT_PROFILE=summary python run_pipeline.py` profiles every stage script.
+The log is JSON or CSV, depending on the extension of log_path.
+"""
+import cProfile
+import csv
+import functools
+import json
+import os
+import pstats
+import resource
+import time
+from contextlib import contextmanager
+
+MODES = ('off', 'summary', 'detailed')
+
+# Functions listed per stage in detailed mode
+HOTSPOTS = 10
+
+LOG_COLUMNS = [
+    'stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_increase_mb', 'rows', 'columns', 'frame_mb', 'rss_mb',
+    'hotspots'
+]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _current_rss_mb() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+
+
+class StageRecord:
+    """Measurements of one run of a stage."""
+
+    def __init__(self, name: str, detailed: bool = False):
+        self.name = name
+        self.detailed = detailed
+        self.values = {'stage': name}
+
+    def observe(self, df):
+        """Record the size of the frame the stage produced."""
+        self.values['rows'] = len(df)
+        if self.detailed:
+            usage = df.memory_usage(index=True, deep=False)
+            if df.ndim > 1:
+                usage = usage.sum()
+            self.values['columns'] = df.shape[1] if df.ndim > 1 else 1
+            self.values['frame_mb'] = round(usage / 1024**2, 1)
+
+
+class _NullStage:
+    """The stage used when profiling is off: one shared object that does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def observe(self, df):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    def __init__(self, mode: str = 'off', log_path: str = None):
+        mode = os.environ.get('WGT_PROFILE', mode)
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+        self.mode = mode
+        self.log_path = log_path
+        self.records = []
+        self._depth = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def stage(self, name: str):
+        """Context manager measuring the enclosed block as stage `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        detailed = self.mode == 'detailed'
+        record = StageRecord(name, detailed)
+        # cProfile cannot nest, so only top-level stages collect hotspots
+        profile = cProfile.Profile() if detailed and self._depth == 0 else None
+        self._depth += 1
+        peak_before = _peak_rss_mb()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            self._depth -= 1
+            record.values['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+            record.values['cpu_seconds'] = round(time.process_time() - cpu_start, 4)
+            record.values['peak_rss_increase_mb'] = round(_peak_rss_mb() - peak_before, 1)
+            if detailed:
+                record.values['rss_mb'] = round(_current_rss_mb(), 1)
+                if profile is not None:
+                    record.values['hotspots'] = self._hotspots(profile)
+                print(f"[profile] {self._format(record.values)}")
+            self.records.append(record.values)
+
+    def profiled(self, name: str = None):
+        """Decorator: run the function as a stage (named after it by default)."""
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _hotspots(profile: cProfile.Profile) -> list:
+        stats = pstats.Stats(profile)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            f"{func[2]} ({os.path.basename(func[0])}:{func[1]}) {cumulative:.3f}s"
+            for func, (_, _, _, cumulative, _) in rows[:HOTSPOTS]
+        ]
+
+    @staticmethod
+    def _format(values: dict) -> str:
+        text = (f"{values['stage']}: {values['wall_seconds']:.2f}s wall, {values['cpu_seconds']:.2f}s CPU, "
+                f"+{values['peak_rss_increase_mb']:.0f} MB peak RSS")
+        if 'rows' in values:
+            text += f", {values['rows']:,} rows"
+        return text
+
+    def summary(self) -> list:
+        """Totals per stage name, in first-run order."""
+        totals = {}
+        for values in self.records:
+            total = totals.setdefault(values['stage'], {
+                'stage': values['stage'], 'runs': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'peak_rss_increase_mb': 0.0
+            })
+            total['runs'] += 1
+            for key in ('wall_seconds', 'cpu_seconds', 'peak_rss_increase_mb'):
+                total[key] += values[key]
+            if 'rows' in values:
+                total['rows'] = values['rows']
+        return list(totals.values())
+
+    def write(self, path: str = None):
+        """Write the stage records as JSON (one object per stage run) or CSV."""
+        path = path or self.log_path
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=LOG_COLUMNS)
+                writer.writeheader()
+                for values in self.records:
+                    row = dict(values)
+                    if 'hotspots' in row:
+                        row['hotspots'] = '; '.join(row['hotspots'])
+                    writer.writerow(row)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'mode': self.mode, 'stages': self.records, 'summary': self.summary()}, f, indent=2)
+        print(f"Profile written to {path}")
+
+    def report(self):
+        """Print the per-stage totals and write the log (if a log_path is set)."""
+        if not self.enabled:
+            return
+        print("Stage profile:")
+        for total in self.summary():
+            runs = f" ({total['runs']} runs)" if total['runs'] > 1 else ''
+            print(f"  {self._format(total)}{runs}")
+        if self.log_path:
+            self.write()
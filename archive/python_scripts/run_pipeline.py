@@ -0,0 +1,140 @@
+"""
+Run the Python pipeline, skipping stages whose inputs have not changed.
+
+Stages (see stage_cache.py for how runs are matched):
+  convert     ingest/convert_to_parquet.py   .dta -> Parquet (if ingest/config.yml exists)
+  groups      create_wgt_groups.py           WGT_groups.parquet
+  unweighted  unweighted_wgt_groups.py       unweighted, collapsed and smoothed outputs
+  cube        wgt_cube.py                    wgt_cube.parquet
+
+With fused = True, groups and unweighted are replaced by one stage:
+  fused       fused_wgt_pipeline.py          unweighted, collapsed and smoothed outputs
+which reads the source once and does not write WGT_groups.parquet.
+
+Each stage's fingerprint covers its input files, its code (including the
+group definitions in group_registry.py), the config.yml values it uses and
+the outputs of the stages before it, so e.g. a change to smoothing.py reruns
+only the unweighted and cube stages. The data paths come from data_paths.py
+and are passed to every stage in the environment; when ingest/config.yml
+exists, the Parquet it converts to (parquet_path) is the source the later
+stages read.
+
+    python run_pipeline.py                   # run what changed
+    python run_pipeline.py groups            # also force the groups stage
+"""
+import os
+import sys
+
+import yaml
+
+from data_paths import path_environment, processeddatapath, rawdatapath, sourcepath
+from stage_cache import Stage, StageCache, run_stages
+
+# Stage cache location and size limit
+cache_dir = f"{processeddatapath}/.stage_cache"
+cache_max_gb = 20
+
+# Run groups and unweighted as one scan of the source (fused_wgt_pipeline.py)
+fused = False
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+INGEST_DIR = os.path.join(SCRIPTS_DIR, '..', '..', 'ingest')
+CONFIG_PATH = os.path.join(INGEST_DIR, 'config.yml')
+
+# config.yml values that change the Parquet output (not e.g. workers)
+CONVERT_CONFIG_KEYS = [
+    'dta_file_path', 'parquet_path', 'chunksize', 'parquet_columns', 'parquet_partition_by_month'
+]
+
+
+def script(name: str, directory: str = SCRIPTS_DIR) -> str:
+    return os.path.join(directory, name)
+
+
+def pipeline_stages(
+    rawdatapath: str = rawdatapath,
+    processeddatapath: str = processeddatapath,
+    fused: bool = fused
+    ) -> list:
+    source = sourcepath
+    groups = f"{processeddatapath}/WGT_groups.parquet"
+    unweighted = f"{processeddatapath}/wage-growth-data_unweighted.parquet"
+    stages = []
+
+    if os.path.exists(CONFIG_PATH):
+        with open(CONFIG_PATH) as f:
+            config = yaml.safe_load(f)
+        stages.append(Stage(
+            name='convert',
+            command=[sys.executable, 'convert_to_parquet.py'],
+            cwd=INGEST_DIR,
+            inputs=[config['dta_file_path']],
+            code=[script(name, INGEST_DIR) for name in (
+                'convert_to_parquet.py', 'ingest_utils.py', 'dta_reader.py', 'dta_schema.py'
+            )],
+            params={key: config.get(key) for key in CONVERT_CONFIG_KEYS},
+            outputs=[config['parquet_path']],
+            # Too large to keep a second copy; the stage is skipped while the dataset is unchanged
+            cache_outputs=False
+        ))
+        # The later stages read what the convert stage writes
+        source = config['parquet_path']
+    env = path_environment(rawdatapath, processeddatapath, source)
+
+    unweighted_outputs = [
+        unweighted,
+        f"{processeddatapath}/wage-growth-data_unweighted_collapsed.parquet",
+        f"{processeddatapath}/wage-growth-data_unweighted_smoothed.parquet",
+    ]
+    if fused:
+        stages.append(Stage(
+            name='fused',
+            # The cube stage reads the unweighted observations
+            command=[sys.executable, 'fused_wgt_pipeline.py', 'unweighted'],
+            cwd=SCRIPTS_DIR,
+            inputs=[source],
+            code=[script(name) for name in (
+                'fused_wgt_pipeline.py', 'wgt_parallel.py', 'stream_wgt_groups.py', 'wgt_collapse.py',
+                'smoothing.py', 'group_registry.py', 'cps_io.py'
+            )],
+            outputs=unweighted_outputs,
+            env=env
+        ))
+    else:
+        stages.append(Stage(
+            name='groups',
+            command=[sys.executable, 'create_wgt_groups.py'],
+            cwd=SCRIPTS_DIR,
+            inputs=[source],
+            code=[script(name) for name in ('create_wgt_groups.py', 'group_registry.py', 'cps_io.py', 'analysis_cache.py')],
+            outputs=[groups, f"{processeddatapath}/WGT_groups_sample.csv"],
+            env=env
+        ))
+        stages.append(Stage(
+            name='unweighted',
+            command=[sys.executable, 'unweighted_wgt_groups.py'],
+            cwd=SCRIPTS_DIR,
+            inputs=[source, groups],
+            code=[script(name) for name in (
+                'unweighted_wgt_groups.py', 'wgt_collapse.py', 'smoothing.py', 'group_registry.py', 'cps_io.py',
+                'analysis_cache.py'
+            )],
+            outputs=unweighted_outputs,
+            env=env
+        ))
+    stages.append(Stage(
+        name='cube',
+        command=[sys.executable, 'wgt_cube.py'],
+        cwd=SCRIPTS_DIR,
+        inputs=[unweighted],
+        code=[script(name) for name in ('wgt_cube.py', 'wgt_collapse.py', 'smoothing.py', 'group_registry.py')],
+        outputs=[f"{processeddatapath}/wgt_cube.parquet"],
+        env=env
+    ))
+    return stages
+
+
+if __name__ == "__main__":
+    cache = StageCache(cache_dir, int(cache_max_gb * 1024**3))
+    ran = run_stages(pipeline_stages(), cache, force=tuple(sys.argv[1:]))
+    print(f"Pipeline complete; ran {', '.join(ran) if ran else 'no stages'}.")
@@ -0,0 +1,190 @@
+"""
+Smoothed versions of the collapsed monthly series, with the Census masking
+gaps blanked out (from unweighted_wgt_groups.py).
+
+All series are smoothed together as one (months x series) array: every
+moving average window comes from the same cumulative sums, exponential
+smoothing is one recursion over the months for all series at once, and the
+masking gaps are compiled from MASKING_GAPS into one boolean mask per
+variant. A new smoothed variant for the dashboard is an entry in a
+`smoothers` dict, e.g.
+
+    smooth_collapsed(collapsed, smoothers=DASHBOARD_SMOOTHERS)
+
+Each smoothed value only depends on the months up to it, so after new months
+are collapsed only the rows from the first new month onwards have to be
+recomputed (pass `start`), using the preceding months as context.
+"""
+import numpy as np
+import pandas as pd
+
+# Smoothed series start in 1983
+SMOOTHED_START = pd.Timestamp('1983-01-01')
+
+# Census masking gaps (first, last month): 12-month wage growth cannot be
+# matched across them, so the collapsed series have no values in these
+# months. A moving average is blanked for every month whose window includes
+# a gap month, and exponential smoothing restarts after each gap.
+MASKING_GAPS = [('1985-07', '1986-09'), ('1995-06', '1996-08')]
+
+# Smoothed variants: column suffix -> ('mean', window in months) for a
+# trailing moving average or ('ewm', alpha) for exponential smoothing.
+# SMOOTHERS are the variants in the smoothed outputs.
+SMOOTHERS = {'3mma': ('mean', 3), '12mma': ('mean', 12)}
+DASHBOARD_SMOOTHERS = {
+    '3mma': ('mean', 3), '6mma': ('mean', 6), '12mma': ('mean', 12), '24mma': ('mean', 24),
+    'ewma': ('ewm', 0.25),
+}
+
+# Collapsed columns smoothed for the unweighted output
+SMOOTHED_VARIABLES = [
+    'wgt', 'wgt_ym', 'wgt_nm', 'wgt_gi', 'wgt_si', 'wgt_ft', 'wgt_pt', 'wgt_de', 'wgt_he', 'wgt_le', 'wgt_ae',
+    'wgt_ya', 'wgt_oa', 'wgt_pa', 'wgt_ws', 'wgt_ms', 'wgt_jst', 'wgt_jsw', 'wgt_wr', 'wgt_or', 'wgt_cmi',
+    'wgt_ehi', 'wgt_fpi', 'wgt_lhi', 'wgt_mni', 'wgt_pai', 'wgt_tti', 'wgt_ho', 'wgt_lo', 'wgt_mo', 'wgt_nen',
+    'wgt_mat', 'wgt_enc', 'wgt_wnc', 'wgt_sat', 'wgt_esc', 'wgt_wsc', 'wgt_mnt', 'wgt_pac', 'wgt_avg', 'wgt_p25',
+    'wgt_p75', 'zero', 'wgt_q1', 'wgt_q2', 'wgt_q3', 'wgt_q4'
+]
+
+
+def _month_numbers(dates) -> np.ndarray:
+    """Months since 0000-01 (year * 12 + month - 1) of each date."""
+    dates = pd.DatetimeIndex(dates)
+    return np.asarray(dates.year * 12 + dates.month - 1, dtype=np.int64)
+
+
+# MASKING_GAPS compiled to (first, last) month numbers
+GAP_MONTHS = np.array([
+    _month_numbers([pd.Period(first, 'M').to_timestamp(), pd.Period(last, 'M').to_timestamp()])
+    for first, last in MASKING_GAPS
+], dtype=np.int64).reshape(-1, 2)
+
+
+def blackout_mask(dates, window: int) -> np.ndarray:
+    """True for dates whose `window`-month average includes a masking gap month."""
+    months = _month_numbers(dates)
+    if window <= 1:
+        # Unsmoothed values are kept as they are
+        return np.zeros(len(months), dtype=bool)
+    first, last = GAP_MONTHS[:, 0], GAP_MONTHS[:, 1] + window - 1
+    return ((months[:, None] >= first) & (months[:, None] <= last)).any(axis=1)
+
+
+def gap_mask(dates) -> np.ndarray:
+    """True for dates in a masking gap."""
+    months = _month_numbers(dates)
+    return ((months[:, None] >= GAP_MONTHS[:, 0]) & (months[:, None] <= GAP_MONTHS[:, 1])).any(axis=1)
+
+
+def moving_averages(values: np.ndarray, windows) -> dict:
+    """
+    Trailing means of each column of `values` (months x series) over every
+    window, ignoring NaN (pandas rolling(window, min_periods=1).mean()).
+    One cumulative sum of the values and of the non-missing counts serves
+    all windows. Returns {window: months x series}.
+    """
+    valid = ~np.isnan(values)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    end = np.arange(1, len(values) + 1)
+    averages = {}
+    for window in windows:
+        begin = np.maximum(end - window, 0)
+        n = counts[end] - counts[begin]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages[window] = np.where(n > 0, (sums[end] - sums[begin]) / n, np.nan)
+    return averages
+
+
+def exponential_smoothing(values: np.ndarray, alpha: float, restart: np.ndarray = None) -> np.ndarray:
+    """
+    s[t] = alpha * x[t] + (1 - alpha) * s[t-1] for each column of `values`
+    (months x series); a missing x[t] carries s[t-1] forward
+    (pandas ewm(alpha=alpha, adjust=False, ignore_na=True).mean()). The
+    recursion starts again at months where `restart` is True.
+    """
+    smoothed = np.full(values.shape, np.nan)
+    state = np.full(values.shape[1], np.nan)
+    for t in range(len(values)):
+        if restart is not None and restart[t]:
+            state[:] = np.nan
+        x = values[t]
+        state = np.where(np.isnan(state), x, np.where(np.isnan(x), state, alpha * x + (1 - alpha) * state))
+        smoothed[t] = state
+    return smoothed
+
+
+def smooth_array(values: np.ndarray, dates, smoothers: dict = SMOOTHERS) -> dict:
+    """
+    Every variant in `smoothers` of every column of `values` (months x
+    series, one row per consecutive month of `dates`), with the masking gaps
+    blanked. Returns {suffix: months x series}.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    windows = {param for method, param in smoothers.values() if method == 'mean'}
+    averages = moving_averages(values, windows)
+    in_gap = gap_mask(dates)
+    # Exponential smoothing restarts at the first month after each gap
+    restart = np.r_[False, in_gap[:-1] & ~in_gap[1:]]
+
+    smoothed = {}
+    for suffix, (method, param) in smoothers.items():
+        if method == 'mean':
+            mask = blackout_mask(dates, param)
+            smoothed[suffix] = np.where(mask[:, None], np.nan, averages[param])
+        elif method == 'ewm':
+            smoothed[suffix] = exponential_smoothing(values, param, restart)
+            smoothed[suffix][in_gap] = np.nan
+        else:
+            raise ValueError(f"Unknown smoothing method {method!r} for {suffix}; expected 'mean' or 'ewm'.")
+    return smoothed
+
+
+def history_months(smoothers: dict = SMOOTHERS) -> int:
+    """Months before a row its smoothed values depend on (None: all of them)."""
+    if any(method != 'mean' for method, _ in smoothers.values()):
+        return None
+    return max(param for _, param in smoothers.values()) - 1
+
+
+def smooth_collapsed(
+    collapsed: pd.DataFrame,
+    variables: list = SMOOTHED_VARIABLES,
+    start=None,
+    smoothers: dict = SMOOTHERS
+    ) -> pd.DataFrame:
+    """
+    Smoothed `variables` from 1983 on, one row per month with columns date,
+    year, month, date_monthly, wgt_raw, f'{var}_{suffix}' for every variant
+    in `smoothers` (by default f'{var}_3mma' and f'{var}_12mma') and rec.
+    With `start` (a month), only the rows from that month on are computed
+    and returned.
+    """
+    collapsed = collapsed[collapsed['year'] >= SMOOTHED_START.year].reset_index(drop=True)
+    dates = pd.to_datetime({'year': collapsed['year'], 'month': collapsed['month'], 'day': 1})
+    first = 0
+    history = history_months(smoothers)
+    if start is not None and history is not None:
+        # Earlier rows are only needed as the first windows' history
+        first = max(int(np.searchsorted(dates, pd.Period(start, 'M').to_timestamp())) - history, 0)
+    collapsed, dates = collapsed.iloc[first:], dates.iloc[first:]
+
+    smoothed = smooth_array(collapsed[variables].to_numpy(dtype=np.float64), dates, smoothers)
+    # Columns ordered by variable, then variant
+    data = np.stack([smoothed[suffix] for suffix in smoothers], axis=2).reshape(len(collapsed), -1)
+    columns = [f'{var}_{suffix}' for var in variables for suffix in smoothers]
+    result = pd.concat([
+        pd.DataFrame({
+            'date': dates.dt.strftime('%m/%d/%Y'),
+            'year': collapsed['year'],
+            'month': collapsed['month'],
+            'date_monthly': collapsed['date_monthly'],
+            'wgt_raw': collapsed['wgt_raw'],
+        }),
+        pd.DataFrame(data, columns=columns, index=collapsed.index),
+        collapsed[['rec']]
+    ], axis=1)
+
+    if start is not None:
+        result = result[dates >= pd.Period(start, 'M').to_timestamp()]
+    return result.reset_index(drop=True)
@@ -0,0 +1,246 @@
+"""
+Fingerprint cache for pipeline stages.
+
+A stage is a command with declared inputs (data files or directories), code
+files, parameters (e.g. config.yml values) and outputs. Its fingerprint is a
+hash over all of them, with files identified by content. When a stage is run
+with a fingerprint seen before:
+  - if its outputs on disk are still the ones that run produced, it is
+    skipped;
+  - otherwise the outputs are restored from the cache directory, if they
+    were stored there;
+  - otherwise it runs.
+A run that does not produce every declared output fails, and a missing
+output is never taken as current. Outputs of each run are copied into the
+cache directory (unless the stage sets cache_outputs=False, e.g. for the
+multi-GB Parquet conversion). When the cache grows past max_bytes, the least
+recently used entries are evicted.
+
+File hashes are memoized by (size, mtime), so an unchanged multi-GB source
+is hashed once, not on every run.
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass, field
+
+HASH_BLOCK = 16 * 1024 * 1024
+
+# path_hash of a path that does not exist
+MISSING = 'missing'
+
+
+@dataclass
+class Stage:
+    name: str
+    command: list
+    cwd: str
+    inputs: list = field(default_factory=list)
+    code: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    outputs: list = field(default_factory=list)
+    cache_outputs: bool = True
+    # Environment variables set for the command (e.g. data paths)
+    env: dict = field(default_factory=dict)
+
+
+def _files_under(path: str) -> list:
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        )
+    return [path]
+
+
+def _path_size(path: str) -> int:
+    return sum(os.path.getsize(file) for file in _files_under(path))
+
+
+class StageCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._hashes_path = os.path.join(cache_dir, 'file_hashes.json')
+        self._hashes = {}
+        if os.path.exists(self._hashes_path):
+            with open(self._hashes_path) as f:
+                self._hashes = json.load(f)
+
+    ############################################################################
+    # Fingerprints
+    ############################################################################
+    def file_hash(self, path: str) -> str:
+        """sha256 of a file's content, recomputed only when its size or mtime changes."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo = self._hashes.get(path)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b''):
+                digest.update(block)
+        self._hashes[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def save_hashes(self):
+        with open(self._hashes_path, 'w') as f:
+            json.dump(self._hashes, f)
+
+    def path_hash(self, path: str) -> str:
+        """Hash of a file, or of every file (with relative names) under a directory."""
+        if not os.path.exists(path):
+            return MISSING
+        if not os.path.isdir(path):
+            return self.file_hash(path)
+        digest = hashlib.sha256()
+        for file in _files_under(path):
+            digest.update(os.path.relpath(file, path).encode())
+            digest.update(self.file_hash(file).encode())
+        return digest.hexdigest()
+
+    def fingerprint(self, stage: Stage) -> str:
+        description = {
+            'command': stage.command,
+            'inputs': {path: self.path_hash(path) for path in stage.inputs},
+            'code': {path: self.path_hash(path) for path in stage.code},
+            'params': stage.params,
+            'env': stage.env,
+            'outputs': stage.outputs,
+        }
+        self.save_hashes()
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+    ############################################################################
+    # Entries
+    ############################################################################
+    def _entry_dir(self, stage: Stage, key: str) -> str:
+        return os.path.join(self.cache_dir, stage.name, key)
+
+    def _read_manifest(self, entry_dir: str) -> dict:
+        path = os.path.join(entry_dir, 'manifest.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, entry_dir: str, manifest: dict):
+        with open(os.path.join(entry_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def _outputs_current(self, stage: Stage, manifest: dict) -> bool:
+        for path in stage.outputs:
+            current = self.path_hash(path)
+            # A missing output is never current, even if a manifest recorded it missing
+            if current == MISSING or current != manifest['outputs'].get(path):
+                return False
+        return True
+
+    def restore(self, stage: Stage, key: str) -> bool:
+        """
+        Make the outputs of a cached run of `stage` current. Returns False if
+        there is no such run or its outputs can no longer be produced.
+        """
+        entry_dir = self._entry_dir(stage, key)
+        manifest = self._read_manifest(entry_dir)
+        if manifest is None:
+            return False
+        if not self._outputs_current(stage, manifest):
+            if not manifest['stored']:
+                return False
+            for i, path in enumerate(stage.outputs):
+                artifact = os.path.join(entry_dir, f'output-{i}')
+                if not os.path.exists(artifact):
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                if os.path.isdir(artifact):
+                    shutil.copytree(artifact, path)
+                else:
+                    shutil.copy2(artifact, path)
+            print(f"[{stage.name}] Restored outputs from cache.")
+        manifest['last_used'] = time.time()
+        self._write_manifest(entry_dir, manifest)
+        return True
+
+    def store(self, stage: Stage, key: str):
+        """Record a completed run of `stage` and copy its outputs into the cache."""
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"[{stage.name}] Run did not produce {missing}; not cached.")
+        entry_dir = self._entry_dir(stage, key)
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.makedirs(entry_dir)
+        size = sum(_path_size(path) for path in stage.outputs)
+        stored = stage.cache_outputs and size <= self.max_bytes
+        if stored:
+            for i, path in enumerate(stage.outputs):
+                artifact = os.path.join(entry_dir, f'output-{i}')
+                if os.path.isdir(path):
+                    shutil.copytree(path, artifact)
+                else:
+                    shutil.copy2(path, artifact)
+        self._write_manifest(entry_dir, {
+            'stage': stage.name,
+            'outputs': {path: self.path_hash(path) for path in stage.outputs},
+            'stored': stored,
+            'bytes': size if stored else 0,
+            'created': time.time(),
+            'last_used': time.time(),
+        })
+        self.save_hashes()
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for stage_name in os.listdir(self.cache_dir):
+            stage_dir = os.path.join(self.cache_dir, stage_name)
+            if not os.path.isdir(stage_dir):
+                continue
+            for key in os.listdir(stage_dir):
+                manifest = self._read_manifest(os.path.join(stage_dir, key))
+                if manifest is not None:
+                    entries.append((manifest['last_used'], manifest['bytes'], os.path.join(stage_dir, key)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if size:
+                shutil.rmtree(entry_dir)
+                total -= size
+                print(f"Evicted {entry_dir} ({size / 1024**2:.1f} MB) from stage cache.")
+
+
+def run_stages(stages: list, cache: StageCache, force: tuple = ()) -> list:
+    """
+    Run `stages` in order, skipping the ones whose fingerprint matches a
+    cached run (stages named in `force` always run). Returns the names of
+    the stages that ran.
+    """
+    ran = []
+    for stage in stages:
+        # Fingerprint after the previous stages ran, since their outputs are inputs here
+        key = cache.fingerprint(stage)
+        if stage.name not in force and cache.restore(stage, key):
+            print(f"[{stage.name}] Inputs unchanged, skipped.")
+            continue
+        print(f"[{stage.name}] Running {' '.join(stage.command)}...")
+        start_time = time.time()
+        subprocess.run(stage.command, cwd=stage.cwd, check=True, env={**os.environ, **stage.env})
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(
+                f"[{stage.name}] {' '.join(stage.command)} did not write {missing}; check the paths it uses "
+                "(data_paths.py)."
+            )
+        cache.store(stage, key)
+        print(f"[{stage.name}] Completed in {time.time() - start_time:.1f} seconds.")
+        ran.append(stage.name)
+    return ran
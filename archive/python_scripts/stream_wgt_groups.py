@@ -0,0 +1,201 @@
+"""
+Bounded-memory version of create_wgt_groups.py.
+
+Groups are row-local and wage quartiles are month-local, so the full history
+never has to be in memory at once:
+  1. A narrow pass reads only the wage columns and computes the per-month
+     p25/p50/p75 of wage_hr_avg, holding only the wages of the months it has
+     not finished (spilled to disk past the memory ceiling if the source is
+     not in date order).
+  2. A second pass reads the source in batches sized to the memory ceiling,
+     assigns groups and wage quartiles, and appends each batch to
+     WGT_groups.parquet.
+Output rows are in source order, with row ids (see cps_io.py).
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cps_io import (
+    ROW_ID, START_DATE, cps_filter, first_row_id, has_consecutive_row_ids, is_month_partitioned, open_cps_dataset
+)
+from data_paths import processeddatapath, sourcepath
+from group_registry import GROUPS, GROUP_COLUMNS, WAGE_GROUP, add_groups, codes_to_categorical, wage_hr_avg, wage_quartile_codes
+from wgt_collapse import segment_quantile
+
+# Memory ceiling for the whole run, in GB
+memory_limit_gb = 12
+
+WAGE_COLUMNS = ['date', 'wagegrowthtracker83', 'wageperhr82', 'wageperhr82_tm12']
+
+# Rough multiple of a batch's raw size held while assigning groups
+# (pandas copy, boolean masks and the output frame)
+BATCH_OVERHEAD = 4
+
+
+def month_ids(dates: pd.Series) -> np.ndarray:
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.int32)
+
+
+def month_thresholds(wages: np.ndarray) -> np.ndarray:
+    """p25/p50/p75 of one month's wages."""
+    wages = np.sort(wages)
+    starts, counts = np.array([0]), np.array([len(wages)])
+    return np.array([segment_quantile(wages, starts, counts, q)[0] for q in (0.25, 0.5, 0.75)])
+
+
+def _spill(pending: dict, spill_dir: str):
+    """Append each month's buffered wages to its file in spill_dir."""
+    for month, pieces in pending.items():
+        with open(os.path.join(spill_dir, f"{month}.f8"), 'ab') as f:
+            for piece in pieces:
+                piece.tofile(f)
+
+
+def wage_quartile_thresholds(
+    source: ds.Dataset,
+    source_filter: ds.Expression,
+    batch_size: int,
+    memory_bytes: float,
+    scratch_dir: str = None
+    ) -> tuple:
+    """
+    First pass: per-month p25/p50/p75 of wage_hr_avg (same quantile
+    definition as groupby(...).transform(lambda x: x.quantile(q))).
+    Returns (first month id, array of shape (n_months, 3)).
+
+    Only the wages of unfinished months are held. The month-partitioned
+    dataset is scanned in calendar order, so a month is computed as soon as
+    a later one appears. Other sources are buffered by month and spilled to
+    one file per month in a directory under scratch_dir whenever the buffer
+    passes memory_bytes; each month is then computed from its file.
+    """
+    in_order = is_month_partitioned(source)
+    thresholds = {}
+    pending, pending_bytes = {}, 0
+    spill_dir = None
+    try:
+        for batch in source.to_batches(columns=WAGE_COLUMNS, filter=source_filter, batch_size=batch_size):
+            df = batch.to_pandas()
+            wage = wage_hr_avg(df).to_numpy(dtype='float64')
+            keep = ~np.isnan(wage)
+            months = month_ids(df['date'])[keep]
+            wage = wage[keep]
+            if not len(wage):
+                continue
+            order = np.argsort(months, kind='stable')
+            months, wage = months[order], wage[order]
+            bounds = np.flatnonzero(np.diff(months)) + 1
+            for first, last in zip(np.r_[0, bounds], np.r_[bounds, len(months)]):
+                pending.setdefault(int(months[first]), []).append(wage[first:last])
+            pending_bytes += wage.nbytes
+            if in_order:
+                for month in [month for month in pending if month < months[-1]]:
+                    pieces = pending.pop(month)
+                    pending_bytes -= sum(piece.nbytes for piece in pieces)
+                    thresholds[month] = month_thresholds(np.concatenate(pieces))
+            elif pending_bytes > memory_bytes:
+                spill_dir = spill_dir or tempfile.mkdtemp(prefix='wgt_quartiles-', dir=scratch_dir)
+                _spill(pending, spill_dir)
+                pending, pending_bytes = {}, 0
+
+        spilled = {int(name.split('.')[0]) for name in os.listdir(spill_dir)} if spill_dir else set()
+        for month in sorted(spilled | set(pending)):
+            pieces = pending.pop(month, [])
+            if month in spilled:
+                pieces.insert(0, np.fromfile(os.path.join(spill_dir, f"{month}.f8"), dtype='float64'))
+            thresholds[month] = month_thresholds(np.concatenate(pieces))
+    finally:
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    if not thresholds:
+        return 0, np.full((0, 3), np.nan)
+    first_month = min(thresholds)
+    table = np.full((max(thresholds) - first_month + 1, 3), np.nan)
+    for month, values in thresholds.items():
+        table[month - first_month] = values
+    return first_month, table
+
+
+def assign_wage_groups(df: pd.DataFrame, first_month: int, thresholds: np.ndarray) -> pd.Categorical:
+    index = month_ids(df['date']) - first_month
+    in_range = (index >= 0) & (index < len(thresholds))
+    p = np.full((len(df), 3), np.nan)
+    p[in_range] = thresholds[index[in_range]]
+    codes = wage_quartile_codes(wage_hr_avg(df), p[:, 0], p[:, 1], p[:, 2])
+    return codes_to_categorical(codes, WAGE_GROUP.labels)
+
+
+def batch_rows_for(source: ds.Dataset, columns: list, memory_bytes: int) -> int:
+    """Rows per batch so that a batch and its working copies fit in memory_bytes."""
+    schema = source.schema
+    bytes_per_row = sum(
+        schema.field(col).type.bit_width // 8 if pa.types.is_primitive(schema.field(col).type) else 16
+        for col in columns
+    ) + len(GROUPS) + 1
+    return max(10_000, int(memory_bytes // (bytes_per_row * BATCH_OVERHEAD)))
+
+
+def stream_wgt_groups(
+    source_path: str,
+    output_path: str,
+    memory_limit_gb: float = memory_limit_gb,
+    start_date: str = START_DATE
+    ):
+    """Create WGT_groups.parquet from a Parquet file or dataset within a memory ceiling."""
+    source = open_cps_dataset(source_path)
+    source_filter = cps_filter(source, start=start_date)
+    memory_bytes = memory_limit_gb * 1024**3
+    columns = list(dict.fromkeys(['personid'] + WAGE_COLUMNS + GROUP_COLUMNS))
+
+    # Pass 1: a quarter of the ceiling for batches, a quarter for buffered wages
+    print("Computing wage quartile thresholds...")
+    first_month, thresholds = wage_quartile_thresholds(
+        source, source_filter, batch_rows_for(source, WAGE_COLUMNS, memory_bytes / 4), memory_bytes / 4,
+        os.path.dirname(os.path.abspath(output_path))
+    )
+    print(f"Wage quartile thresholds computed for {len(thresholds)} months.")
+
+    # Pass 2: groups, one batch at a time. Rows are written in scan order,
+    # numbered with their row ids where those are consecutive (see cps_io.py)
+    next_row_id = first_row_id(source, start_date) if has_consecutive_row_ids(source, start_date) else None
+    batch_size = batch_rows_for(source, columns, memory_bytes / 2)
+    print(f"Assigning groups in batches of {batch_size} rows...")
+    writer = None
+    rows_processed = 0
+    try:
+        for batch in source.to_batches(columns=columns, filter=source_filter, batch_size=batch_size):
+            df = batch.to_pandas()
+            add_groups(df)
+            df['wagegroup'] = assign_wage_groups(df, first_month, thresholds)
+            output_columns = ['date', 'personid'] + [group.name for group in GROUPS] + ['wagegroup']
+            if next_row_id is not None:
+                df[ROW_ID] = np.arange(next_row_id, next_row_id + len(df))
+                next_row_id += len(df)
+                output_columns = [ROW_ID] + output_columns
+            df = df[output_columns]
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema, compression='snappy')
+            writer.write_table(table)
+            rows_processed += len(df)
+            print(f"{rows_processed} rows processed.")
+    finally:
+        if writer:
+            writer.close()
+    print(f"Saved wage growth tracker groups to {output_path}")
+
+
+if __name__ == "__main__":
+    stream_wgt_groups(
+        sourcepath,
+        f"{processeddatapath}/WGT_groups.parquet",
+        memory_limit_gb
+    )
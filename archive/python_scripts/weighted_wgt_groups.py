@@ -2,30 +2,49 @@
 import pandas as pd
 import numpy as np
 
-# Set file paths (modify as per your directory structure)
-rawdatapath = "C:/WageGrowthTracker/Data/rawdata"  # Path where the raw data is stored
-processeddatapath = "C:/WageGrowthTracker/Data/processeddata"  # Path where processed data will be stored
+from analysis_cache import read_cps_cached
+from cps_io import attach_groups
+from data_paths import processeddatapath, sourcepath
+from wgt_collapse import weighted_collapse_months
 
-# Read the data (modify file name as per your file)
-data = pd.read_stata(f"{rawdatapath}/CPS_harmonized_variable_longitudinally_matched_age16plus.dta")
+# Weight variants: output name -> weight column (assuming these columns exist).
+# Adding a variant here costs one cumulative sum per cut, not another pass.
+weights = {
+    'weighted': 'weightern82',
+    'weighted_97': 'weight_97_demojob'
+}
 
-# Filter data for records from 1982 onwards and for individuals aged 16 and above
-data = data[(data['date'] >= pd.to_datetime("1982-01-01")) & (data['age76'] >= 16)]
+# Read records from 1982 onwards for individuals aged 16 and above
+# (modify file name as per your file)
+start_date = "1982-01-01"
+data = read_cps_cached(
+    sourcepath,
+    columns=['personid', 'date', 'wagegrowthtracker83'] + list(weights.values()),
+    start=start_date,
+    row_ids=True
+)
 
-# Merge with WGT group data (assuming the file exists and has been created by Create_WGT_groups_usingcadre.py)
-wgt_groups = pd.read_stata(f"{rawdatapath}/WGT_groups.dta")
-data = data.merge(wgt_groups, on=['personid', 'date'], how='left')
+# Attach WGT groups (created by create_wgt_groups.py) by row id, without a
+# join on (personid, date); see attach_groups in cps_io.py
+wgt_groups = pd.read_parquet(f"{processeddatapath}/WGT_groups.parquet")
+data = attach_groups(data, wgt_groups)
 
 # Create date variables
 data['year'] = data['date'].dt.year
 data['month'] = data['date'].dt.month
 data['date_monthly'] = data['date'].dt.to_period('M')
 
-# Function to create weighted WGT time series
-def create_weighted_wgt(data, weight_column, output_name):
-    # Calculate weighted median
-    data_grouped = data.groupby('date_monthly').apply(lambda x: np.average(x['wagegrowthtracker83'], weights=x[weight_column])).reset_index()
-    data_grouped.columns = ['date_monthly', output_name]
+# Weighted medians (and p25/p75) for the overall series and every group cut,
+# all weight variants at once, from a single sort of wgt within each month
+data.rename(columns={'wagegrowthtracker83': 'wgt'}, inplace=True)
+collapsed = weighted_collapse_months(data, weights)
+collapsed.to_parquet(f"{processeddatapath}/wage-growth-data_weighted_collapsed.parquet", index=False)
+
+# Function to create smoothed weighted WGT time series
+def create_weighted_wgt(collapsed, output_name):
+    data_grouped = collapsed[['date_monthly', f'wgt_{output_name}']].rename(
+        columns={f'wgt_{output_name}': output_name}
+    )
 
     # Creating smoothed time series using 3-month and 12-month moving averages
     data_grouped[output_name+'_3mma'] = data_grouped[output_name].rolling(window=3, min_periods=1).mean()
@@ -41,6 +60,5 @@ def create_weighted_wgt(data, weight_column, output_name):
     # Save the data
     data_grouped.to_csv(f"{processeddatapath}/wage-growth-data_{output_name}_smoothed.csv", index=False)
 
-# Run the function for 'weightern82' and 'weight_97_demojob' (assuming these columns exist)
-create_weighted_wgt(data, 'weightern82', 'weighted')
-create_weighted_wgt(data, 'weight_97_demojob', 'weighted_97')
+for output_name in weights:
+    create_weighted_wgt(collapsed, output_name)
@@ -0,0 +1,131 @@
+"""
+Bitmap indexes over the group columns for arbitrary cross-cut queries.
+
+The unweighted observations with a wgt value are sorted by (month, wgt) once.
+Every group value then gets a bitset over the sorted rows (np.packbits, one
+bit per observation), so a cross-cut such as female x Bachelor+ x MSA x job
+switcher is a handful of byte-wise ANDs/ORs. Because the selected rows stay
+in (month, wgt) order, the per-month median and percentiles are offset
+lookups (wgt_collapse.segment_stats), with no sorting at query time:
+
+    index = load_bitmap_index()
+    index.stats(gengroup='Female', edgroup3='Bachelor+', msagroup='MSA', jstayergroup='Job Switcher')
+    index.stats(index.bitmap(agegroup='16-24') | index.bitmap(wagegroup='1st'))
+
+Keyword selections are ANDed across dimensions; a tuple of values within a
+dimension is ORed.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from data_paths import processeddatapath
+from group_registry import GROUPS, WAGE_GROUP
+from wgt_collapse import group_codes, segment_stats
+from wgt_cube import STATS
+
+BITMAP_PATH = f"{processeddatapath}/wgt_bitmaps.npz"
+
+# The 15 dimensions of wgt_groups
+DIMENSIONS = {group.name: group.labels for group in GROUPS + (WAGE_GROUP,)}
+
+
+@dataclass
+class BitmapIndex:
+    """Observations sorted by (month, wgt) and one packed bitset per group value."""
+    months: pd.PeriodIndex
+    month_ids: np.ndarray
+    values: np.ndarray
+    bitmaps: dict
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.values)
+
+    def bitmap(self, **selections) -> np.ndarray:
+        """
+        Packed bitset of the rows matching every selection, e.g.
+        bitmap(gengroup='Female', edgroup3=('Bachelor+', 'Associates')).
+        No selections selects every row.
+        """
+        result = np.full((self.n_rows + 7) // 8, 0xFF, dtype=np.uint8)
+        for dim, wanted in selections.items():
+            if dim not in DIMENSIONS:
+                raise KeyError(f"Unknown dimension {dim!r}; expected one of {list(DIMENSIONS)}")
+            wanted = (wanted,) if isinstance(wanted, str) else tuple(wanted)
+            dim_bits = np.zeros_like(result)
+            for value in wanted:
+                if value not in DIMENSIONS[dim]:
+                    raise KeyError(f"Unknown value {value!r} for {dim}; expected one of {DIMENSIONS[dim]}")
+                dim_bits |= self.bitmaps[(dim, value)]
+            result &= dim_bits
+        return result
+
+    def stats(self, bitmap: np.ndarray = None, **selections) -> pd.DataFrame:
+        """
+        Monthly median, p25, p75, mean and count of wgt for the rows in
+        `bitmap` (or matching `selections`), indexed by month. Months without
+        observations give NaN.
+        """
+        if bitmap is None:
+            bitmap = self.bitmap(**selections)
+        mask = np.unpackbits(bitmap, count=self.n_rows).view(bool)
+        stats = segment_stats(self.values[mask], self.month_ids[mask], len(self.months))
+        return pd.DataFrame({stat: stats[suffix] for stat, suffix in STATS.items()}, index=self.months)
+
+    def median(self, bitmap: np.ndarray = None, **selections) -> pd.Series:
+        return self.stats(bitmap, **selections)['median']
+
+
+def build_bitmap_index(df: pd.DataFrame) -> BitmapIndex:
+    """Index unweighted observations (columns of wage-growth-data_unweighted.parquet)."""
+    month_ids, months = pd.factorize(df['date_monthly'], sort=True)
+    wgt = df['wgt'].to_numpy(dtype='float64')
+    order = np.lexsort((wgt, month_ids))
+    # Months with no wgt at all (masking gaps) stay in `months` and query as NaN
+    order = order[~np.isnan(wgt[order])]
+
+    bitmaps = {}
+    for dim, labels in DIMENSIONS.items():
+        codes = group_codes(df[dim], dim)[order]
+        for code, value in enumerate(labels):
+            bitmaps[(dim, value)] = np.packbits(codes == code)
+    return BitmapIndex(
+        months=pd.PeriodIndex(months, freq='M'),
+        month_ids=month_ids[order].astype(np.int32),
+        values=wgt[order],
+        bitmaps=bitmaps
+    )
+
+
+def save_bitmap_index(index: BitmapIndex, path: str = BITMAP_PATH):
+    keys = list(index.bitmaps)
+    np.savez(
+        path,
+        months=index.months.strftime('%Y-%m').to_numpy(dtype=str),
+        month_ids=index.month_ids,
+        values=index.values,
+        bitmap_keys=np.array([f"{dim}={value}" for dim, value in keys]),
+        bitmaps=np.stack([index.bitmaps[key] for key in keys])
+    )
+
+
+def load_bitmap_index(path: str = BITMAP_PATH) -> BitmapIndex:
+    with np.load(path) as data:
+        keys = [tuple(key.split('=', 1)) for key in data['bitmap_keys']]
+        return BitmapIndex(
+            months=pd.PeriodIndex(data['months'], freq='M'),
+            month_ids=data['month_ids'],
+            values=data['values'],
+            bitmaps=dict(zip(keys, data['bitmaps']))
+        )
+
+
+if __name__ == "__main__":
+    print("Reading unweighted observations...")
+    df = pd.read_parquet(f"{processeddatapath}/wage-growth-data_unweighted.parquet")
+    print("Building bitmap index...")
+    index = build_bitmap_index(df)
+    save_bitmap_index(index)
+    print(f"Saved bitmaps for {len(index.bitmaps)} group values over {index.n_rows} observations to {BITMAP_PATH}")
@@ -0,0 +1,272 @@
+"""
+Collapse individual-level wage growth observations into monthly series.
+
+Instead of materializing one masked `wgt_*` column per cut and letting
+groupby re-sort each of them, the observations are sorted by (month, wgt)
+once. Each cut is then a boolean mask over the sorted values: selecting with
+the mask keeps the (month, wgt) order, so per-month medians and percentiles
+are direct lookups at offsets computed from the per-month counts. Weighted
+medians reuse the same sort: any number of weight columns only adds a
+cumulative sum per cut, not another scan.
+"""
+import numpy as np
+import pandas as pd
+
+from group_registry import CENSUS_DIVISIONS, GROUPS_BY_NAME
+
+# Cut name -> (group column, labels included in the cut). None = all observations.
+CUTS = {
+    'wgt': None,
+    # Average wage quartiles
+    'wgt_q1': ('wagegroup', ('1st',)),
+    'wgt_q2': ('wagegroup', ('2nd',)),
+    'wgt_q3': ('wagegroup', ('3rd',)),
+    'wgt_q4': ('wagegroup', ('4th',)),
+    # Metro and non-metro
+    'wgt_ym': ('msagroup', ('MSA',)),
+    'wgt_nm': ('msagroup', ('NonMSA',)),
+    # 3 age groups
+    'wgt_ya': ('agegroup', ('16-24',)),
+    'wgt_pa': ('agegroup', ('25-54',)),
+    'wgt_oa': ('agegroup', ('55+',)),
+    # Usually ft/usually pt
+    'wgt_ft': ('ftptgroup', ('Full-time',)),
+    'wgt_pt': ('ftptgroup', ('Part-time',)),
+    # Male/female
+    'wgt_ms': ('gengroup', ('Male',)),
+    'wgt_ws': ('gengroup', ('Female',)),
+    # Degree education
+    'wgt_he': ('edgroup3', ('Bachelor+', 'Associates')),
+    # Three ed groups
+    'wgt_de': ('edgroup3', ('Bachelor+',)),
+    'wgt_ae': ('edgroup3', ('Associates',)),
+    'wgt_le': ('edgroup3', ('Nodegree',)),
+    # Skill
+    'wgt_lo': ('skillgroup', ('Low',)),
+    'wgt_mo': ('skillgroup', ('Middle',)),
+    'wgt_ho': ('skillgroup', ('High',)),
+    # Service and goods industries
+    'wgt_si': ('secgroup', ('Services',)),
+    'wgt_gi': ('secgroup', ('Goods',)),
+    # White and other race
+    'wgt_wr': ('racegroup', ('White',)),
+    'wgt_or': ('racegroup', ('Nonwhite',)),
+    # Job stayer/switcher
+    'wgt_jst': ('jstayergroup', ('Job Stayer',)),
+    'wgt_jsw': ('jstayergroup', ('Job Switcher',)),
+    # Industries
+    'wgt_cmi': ('indgroup', ('Construction & Mining',)),
+    'wgt_ehi': ('indgroup', ('Education & Health',)),
+    'wgt_fpi': ('indgroup', ('Finance and Business Services',)),
+    'wgt_lhi': ('indgroup', ('Leisure & Hospitality',)),
+    'wgt_mni': ('indgroup', ('Manufacturing',)),
+    'wgt_pai': ('indgroup', ('Public Administration',)),
+    'wgt_tti': ('indgroup', ('Trade & Transportation',)),
+    # Hourly
+    'wgt_yhr': ('hrlygroup', ('Hourly',)),
+    'wgt_nhr': ('hrlygroup', ('Non-Hourly',)),
+}
+# Census divisions
+CUTS.update({f'wgt_{div}': ('cdivgroup', (div,)) for div in CENSUS_DIVISIONS})
+
+# Statistic suffixes produced for every cut; the median keeps the cut's name
+STATS = ('', '_p25', '_p75', '_avg', '_n')
+# Weighted statistics of weighted_collapse_months: suffix -> quantile
+WEIGHTED_QUANTILES = {'': 0.5, '_p25': 0.25, '_p75': 0.75}
+
+
+def group_codes(series: pd.Series, group_name: str) -> np.ndarray:
+    """int8 codes of a group column in registry label order (-1 = missing)."""
+    labels = list(GROUPS_BY_NAME[group_name].labels)
+    if isinstance(series.dtype, pd.CategoricalDtype) and list(series.cat.categories) == labels:
+        return series.cat.codes.to_numpy()
+    return pd.Categorical(series, categories=labels).codes
+
+
+def cut_mask(codes: np.ndarray, group_name: str, labels: tuple) -> np.ndarray:
+    group = GROUPS_BY_NAME[group_name]
+    return np.isin(codes, [group.code(label) for label in labels])
+
+
+def month_frame(df: pd.DataFrame, months: np.ndarray, month_index) -> pd.DataFrame:
+    """date_monthly, year and month of each factorized month."""
+    first = pd.Series(np.arange(len(df))).groupby(months).first().to_numpy()
+    return pd.DataFrame({
+        'date_monthly': month_index,
+        'year': df['year'].to_numpy()[first],
+        'month': df['month'].to_numpy()[first],
+    })
+
+
+def segment_quantile(
+    values: np.ndarray,
+    starts: np.ndarray,
+    counts: np.ndarray,
+    q: float,
+    median: bool = False
+    ) -> np.ndarray:
+    """
+    Linear-interpolated quantile (pandas/numpy default) of each segment
+    values[starts[i]:starts[i] + counts[i]], which must already be sorted.
+    Empty segments give NaN. With `median`, q must be 0.5 and the result
+    matches Series.median() rather than Series.quantile(0.5).
+    """
+    out = np.full(len(counts), np.nan)
+    has = counts > 0
+    pos = (counts[has] - 1) * q
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    a = values[starts[has] + lo]
+    b = values[starts[has] + hi]
+    if median:
+        # Same arithmetic as numpy's median: mean of the two middle values
+        out[has] = np.where(lo == hi, a, (a + b) / 2)
+    else:
+        t = pos - lo
+        diff = b - a
+        out[has] = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+    return out
+
+
+def segment_stats(values: np.ndarray, segments: np.ndarray, n_segments: int) -> dict:
+    """
+    Median, p25, p75, mean and count of each segment. `values` must be sorted
+    within segments and `segments` sorted ascending (no NaN in values).
+    """
+    counts = np.bincount(segments, minlength=n_segments)
+    starts = np.cumsum(counts) - counts
+    sums = np.bincount(segments, weights=values, minlength=n_segments)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counts > 0, sums / counts, np.nan)
+    return {
+        '': segment_quantile(values, starts, counts, 0.5, median=True),
+        '_p25': segment_quantile(values, starts, counts, 0.25),
+        '_p75': segment_quantile(values, starts, counts, 0.75),
+        '_avg': mean,
+        '_n': counts,
+    }
+
+
+def collapse_months(df: pd.DataFrame, cuts: dict = CUTS) -> pd.DataFrame:
+    """
+    Collapse observations (columns date_monthly, year, month, wgt,
+    recession76 and the group columns used by `cuts`) into one row per month
+    with every cut's median, p25, p75, mean and count in a single pass.
+    Months where every wgt is missing (the 1985-86 and 1995-96 masking gaps)
+    are kept with NaN statistics.
+    """
+    months, month_index = pd.factorize(df['date_monthly'], sort=True)
+    n_months = len(month_index)
+    wgt = df['wgt'].to_numpy(dtype='float64')
+
+    # One sort for everything: by month, then wgt (NaN last within a month)
+    order = np.lexsort((wgt, months))
+    months_sorted = months[order]
+    wgt_sorted = wgt[order]
+    valid = ~np.isnan(wgt_sorted)
+
+    codes_sorted = {}
+    columns = {}
+    for cut, definition in cuts.items():
+        mask = valid
+        if definition is not None:
+            group_name, labels = definition
+            if group_name not in codes_sorted:
+                codes_sorted[group_name] = group_codes(df[group_name], group_name)[order]
+            mask = valid & cut_mask(codes_sorted[group_name], group_name, labels)
+        for suffix, values in segment_stats(wgt_sorted[mask], months_sorted[mask], n_months).items():
+            columns[cut + suffix] = values
+
+    # zero keeps the original scripts' definition: the mean of an indicator
+    # that is 100 for a zero wage change (|wgt| < 0.5), 0 for a missing wgt
+    # and missing otherwise. Missing wgt rows are only kept in the masking gap
+    # years, so elsewhere it is 100 in a month with any zero change, else NaN.
+    n_zero = np.bincount(months_sorted[valid & (np.abs(wgt_sorted) < 0.5)], minlength=n_months)
+    n_missing = np.bincount(months_sorted[~valid], minlength=n_months)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        columns['zero'] = 100.0 * n_zero / (n_zero + n_missing)
+    # Share of recession months
+    columns['rec'] = df.groupby(months)['recession76'].mean().reindex(range(n_months)).to_numpy()
+    columns['wgt_raw'] = columns['wgt']
+
+    return pd.concat([month_frame(df, months, month_index), pd.DataFrame(columns)], axis=1)
+
+
+def segment_weighted_quantile(
+    values: np.ndarray,
+    weights: np.ndarray,
+    starts: np.ndarray,
+    counts: np.ndarray,
+    q: float
+    ) -> np.ndarray:
+    """
+    Weighted quantile of each sorted segment, using Stata's definition (as in
+    `collapse (median) [pweight=...]`): with cumulative weights W(i) and
+    P = q * W, the quantile is x(i) for the first i with W(i) > P, or the
+    mean of x(i) and x(i+1) when W(i) equals P exactly.
+    """
+    out = np.full(len(counts), np.nan)
+    has = counts > 0
+    if not has.any():
+        return out
+    cum = np.cumsum(weights)
+    starts, ends = starts[has], starts[has] + counts[has]
+    base = np.where(starts > 0, cum[np.maximum(starts - 1, 0)], 0.0)
+    target = base + q * (cum[ends - 1] - base)
+    # First position in the segment whose cumulative weight reaches the target
+    idx = np.clip(np.searchsorted(cum, target, side='left'), starts, ends - 1)
+    exact = np.isclose(cum[idx], target, rtol=1e-12, atol=0) & (idx + 1 < ends)
+    upper = values[np.minimum(idx + 1, ends - 1)]
+    out[has] = np.where(exact, (values[idx] + upper) / 2, values[idx])
+    return out
+
+
+def weighted_collapse_months(
+    df: pd.DataFrame,
+    weights: dict,
+    cuts: dict = CUTS,
+    value_column: str = 'wgt',
+    quantiles: dict = WEIGHTED_QUANTILES
+    ) -> pd.DataFrame:
+    """
+    Weighted median and percentiles of `value_column` per month for every
+    cut and every weight variant. `weights` maps an output name to a weight
+    column, e.g. {'weighted': 'weightern82', 'weighted_97': 'weight_97_demojob'};
+    output columns are named f"{cut}_{name}{suffix}" (plus f"{cut}_{name}_n",
+    the unweighted observation count). Observations with a missing value or
+    a missing/non-positive weight are ignored, as in Stata.
+    """
+    months, month_index = pd.factorize(df['date_monthly'], sort=True)
+    n_months = len(month_index)
+    values = df[value_column].to_numpy(dtype='float64')
+
+    # One sort shared by every cut and weight column
+    order = np.lexsort((values, months))
+    months_sorted = months[order]
+    values_sorted = values[order]
+    valid = ~np.isnan(values_sorted)
+    weights_sorted = {}
+    for name, column in weights.items():
+        w = df[column].to_numpy(dtype='float64')[order]
+        weights_sorted[name] = (w, valid & (w > 0))
+
+    codes_sorted = {}
+    columns = {}
+    for cut, definition in cuts.items():
+        in_cut = None
+        if definition is not None:
+            group_name, labels = definition
+            if group_name not in codes_sorted:
+                codes_sorted[group_name] = group_codes(df[group_name], group_name)[order]
+            in_cut = cut_mask(codes_sorted[group_name], group_name, labels)
+        for name, (w, usable) in weights_sorted.items():
+            mask = usable if in_cut is None else usable & in_cut
+            counts = np.bincount(months_sorted[mask], minlength=n_months)
+            starts = np.cumsum(counts) - counts
+            for suffix, q in quantiles.items():
+                columns[f"{cut}_{name}{suffix}"] = segment_weighted_quantile(
+                    values_sorted[mask], w[mask], starts, counts, q
+                )
+            columns[f"{cut}_{name}_n"] = counts
+
+    return pd.concat([month_frame(df, months, month_index), pd.DataFrame(columns)], axis=1)
@@ -0,0 +1,131 @@
+"""
+Materialized cube of monthly wage growth statistics for every value of every
+group dimension, and a small query API on top of it.
+
+The cube is built once from the unweighted observations (one collapse over
+all cuts, see wgt_collapse.py) and stored as a long Parquet table: one row per
+(dim, value, month) with the median, p25, p75, mean and count. Queries read
+the per-cell series from memory, so a chart does not have to aggregate the
+individual observations:
+
+    from wgt_cube import get_series
+    get_series(dim='edgroup3', value='Bachelor+', stat='median', smoothing='3mma')
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data_paths import processeddatapath
+from group_registry import GROUPS, WAGE_GROUP
+from smoothing import DASHBOARD_SMOOTHERS, SMOOTHED_START, smooth_array
+from wgt_collapse import collapse_months
+
+CUBE_PATH = f"{processeddatapath}/wgt_cube.parquet"
+
+# Dimension -> values. 'all' is the overall series.
+DIMENSIONS = {'all': ('all',)}
+DIMENSIONS.update({group.name: group.labels for group in GROUPS + (WAGE_GROUP,)})
+
+# Query stat name -> collapse_months suffix
+STATS = {'median': '', 'p25': '_p25', 'p75': '_p75', 'mean': '_avg', 'n': '_n'}
+
+# Smoothing name -> smoothing.py variant (None: unsmoothed)
+SMOOTHING = {None: None, 'raw': None, **{name: (name, spec) for name, spec in DASHBOARD_SMOOTHERS.items()}}
+
+
+def cube_cuts() -> dict:
+    """Cuts for collapse_months: 'wgt' (all) plus one per dimension value."""
+    cuts = {'wgt': None}
+    for dim, values in DIMENSIONS.items():
+        if dim != 'all':
+            cuts.update({f"{dim}={value}": (dim, (value,)) for value in values})
+    return cuts
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cube from unweighted observations (columns of
+    wage-growth-data_unweighted.parquet): one row per dimension value and
+    month with columns dim, value, date, median, p25, p75, mean and n.
+    """
+    collapsed = collapse_months(df, cube_cuts())
+    dates = pd.to_datetime({'year': collapsed['year'], 'month': collapsed['month'], 'day': 1})
+    cells = [('all', 'all', 'wgt')] + [
+        (dim, value, f"{dim}={value}") for dim, values in DIMENSIONS.items() if dim != 'all' for value in values
+    ]
+    frames = []
+    for dim, value, cut in cells:
+        frame = pd.DataFrame({'dim': dim, 'value': value, 'date': dates})
+        for stat, suffix in STATS.items():
+            frame[stat] = collapsed[cut + suffix]
+        frames.append(frame)
+    cube = pd.concat(frames, ignore_index=True)
+    cube['dim'] = pd.Categorical(cube['dim'], categories=list(DIMENSIONS))
+    cube['value'] = cube['value'].astype('category')
+    cube['n'] = cube['n'].astype(np.int32)
+    return cube
+
+
+def save_cube(cube: pd.DataFrame, path: str = CUBE_PATH):
+    cube.to_parquet(path, index=False, compression='zstd')
+    load_cube.cache_clear()
+    _cached_series.cache_clear()
+
+
+@lru_cache(maxsize=4)
+def load_cube(path: str = CUBE_PATH) -> dict:
+    """(dim, value) -> DataFrame of the stats indexed by month."""
+    cube = pd.read_parquet(path)
+    return {
+        (str(dim), str(value)): cell.set_index('date')[list(STATS)]
+        for (dim, value), cell in cube.groupby(['dim', 'value'], observed=True, sort=False)
+    }
+
+
+@lru_cache(maxsize=1024)
+def _cached_series(dim: str, value: str, stat: str, smoothing: str, path: str) -> pd.Series:
+    cells = load_cube(path)
+    if (dim, value) not in cells:
+        raise KeyError(f"No cube cell for {dim}={value!r}; see DIMENSIONS for the valid values.")
+    if stat not in STATS:
+        raise KeyError(f"Unknown stat {stat!r}; expected one of {list(STATS)}")
+    if smoothing not in SMOOTHING:
+        raise KeyError(f"Unknown smoothing {smoothing!r}; expected one of {list(SMOOTHING)}")
+
+    series = cells[(dim, value)][stat]
+    variant = SMOOTHING[smoothing]
+    if variant is not None:
+        series = series[series.index >= SMOOTHED_START]
+        suffix, spec = variant
+        smoothed = smooth_array(series.to_numpy(dtype='float64')[:, None], series.index, {suffix: spec})
+        series = pd.Series(smoothed[suffix][:, 0], index=series.index)
+    series.name = f"{dim}={value} {stat}" + (f" {smoothing}" if variant is not None else '')
+    return series
+
+
+def get_series(
+    dim: str = 'all',
+    value: str = 'all',
+    stat: str = 'median',
+    smoothing: str = None,
+    path: str = CUBE_PATH
+    ) -> pd.Series:
+    """
+    Monthly series of `stat` ('median', 'p25', 'p75', 'mean' or 'n') for the
+    observations with dim == value (e.g. dim='edgroup3', value='Bachelor+'),
+    optionally smoothed (a name in smoothing.DASHBOARD_SMOOTHERS: '3mma',
+    '6mma', '12mma', '24mma' or 'ewma'). Indexed by the first day of each
+    month.
+    """
+    # Copy so callers cannot modify the cached series
+    return _cached_series(dim, value, stat, smoothing, path).copy()
+
+
+if __name__ == "__main__":
+    print("Reading unweighted observations...")
+    df = pd.read_parquet(f"{processeddatapath}/wage-growth-data_unweighted.parquet")
+    print("Building cube...")
+    cube = build_cube(df)
+    save_cube(cube)
+    print(f"Saved cube with {len(cube)} rows to {CUBE_PATH}")
@@ -0,0 +1,156 @@
+"""
+Parallel version of create_wgt_groups.py and the collapse in
+unweighted_wgt_groups.py.
+
+Groups are row-local and wage quartiles, the unweighted filter and every
+collapsed statistic are computed within a month, so months are independent.
+Each worker reads one month (with the month-partitioned dataset only that
+month's files are opened), creates the groups and wage quartiles, and
+collapses it. Results come back in month order, and the computations within
+a month are the ones the serial scripts run, so the output values are
+bit-identical to the serial run. Column types are the same too when the
+source stores each column in one type with no missing integers, as
+ingest/convert_to_parquet.py writes it (dta_schema.py); with a source whose
+integer codes are missing in some months only, pass-through columns such as
+recession76 can come out wider. (The month-partitioned dataset is read in
+date order; a single-file source that is not sorted by date gives the same
+rows grouped by month.)
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from cps_io import ROW_ID, START_DATE, first_row_id, is_month_partitioned, open_cps_dataset, read_cps
+from data_paths import processeddatapath, sourcepath
+from group_registry import (
+    BLACKOUT_YEARS, GROUPS, GROUP_COLUMNS, WAGE_GROUP, add_groups, codes_to_categorical, wage_hr_avg,
+    wage_quartile_codes
+)
+from wgt_collapse import collapse_months
+
+# Worker processes (None = one per core)
+workers = None
+
+GROUP_OUTPUT_COLUMNS = ['date', 'personid'] + [group.name for group in GROUPS] + ['wagegroup']
+SOURCE_COLUMNS = list(dict.fromkeys(
+    ['date', 'personid', 'recession76', 'wageperhr82', 'wageperhr82_tm12', 'wagegrowthtracker83']
+    + GROUP_COLUMNS
+))
+
+
+def cps_months(path: str, start: str = START_DATE, end: str = None) -> list:
+    """Months (pd.Period) with observations from start up to end."""
+    dataset = open_cps_dataset(path)
+    if is_month_partitioned(dataset):
+        months = {
+            pd.Period(year=keys['year'], month=keys['month'], freq='M')
+            for keys in (ds.get_partition_keys(f.partition_expression) for f in dataset.get_fragments())
+        }
+    else:
+        dates = read_cps(path, columns=['date'], start=start, end=end)['date']
+        months = set(dates.dt.to_period('M').unique())
+    first = pd.Timestamp(start).to_period('M') if start is not None else None
+    last = pd.Timestamp(end).to_period('M') if end is not None else None
+    return sorted(m for m in months if (first is None or m >= first) and (last is None or m <= last))
+
+
+def month_range(month: pd.Period, start: str = START_DATE) -> tuple:
+    """(start, end) arguments of read_cps that select `month`, within the global start."""
+    month_start = month.to_timestamp()
+    if start is not None:
+        month_start = max(month_start, pd.Timestamp(start))
+    return month_start.strftime('%Y-%m-%d'), month.to_timestamp(how='end').strftime('%Y-%m-%d')
+
+
+def month_groups(df: pd.DataFrame) -> pd.DataFrame:
+    """Groups and wage quartiles, as in create_wgt_groups.py."""
+    add_groups(df)
+    df['wage_hr_avg'] = wage_hr_avg(df)
+    for quantile in [25, 50, 75]:
+        df[f'p{quantile}_a'] = df.groupby('date_monthly')['wage_hr_avg'].transform(lambda x: x.quantile(quantile / 100.0))
+    df['wagegroup'] = codes_to_categorical(
+        wage_quartile_codes(df['wage_hr_avg'], df['p25_a'], df['p50_a'], df['p75_a']),
+        WAGE_GROUP.labels
+    )
+    return df
+
+
+def month_outputs(df: pd.DataFrame) -> tuple:
+    """
+    (groups, unweighted observations, collapsed row) of one month's rows:
+    the month's slices of WGT_groups.parquet,
+    wage-growth-data_unweighted.parquet and the collapsed series.
+    """
+    df['year'] = df['date'].dt.year
+    df['month'] = df['date'].dt.month
+    df['date_monthly'] = df['date'].dt.to_period('M')
+    month_groups(df)
+    groups = df[GROUP_OUTPUT_COLUMNS]
+
+    # unweighted_wgt_groups.py: keep wgt observations (all rows in masking years)
+    df = df.rename(columns={'wagegrowthtracker83': 'wgt'})
+    df = df[df['wgt'].notna() | df['year'].isin(BLACKOUT_YEARS)]
+    unweighted = df[['personid', 'year', 'month', 'date_monthly', 'recession76', 'wgt']
+                    + [group.name for group in GROUPS] + ['wagegroup']]
+    collapsed = collapse_months(unweighted) if len(unweighted) else None
+    return groups, unweighted, collapsed
+
+
+def process_month(args) -> tuple:
+    """Worker: read one month and return its month_outputs()."""
+    source_path, month, start = args
+    month_start, month_end = month_range(month, start)
+    return month_outputs(read_cps(source_path, columns=SOURCE_COLUMNS, start=month_start, end=month_end))
+
+
+def map_months(func, source_path: str, months: list, start: str = START_DATE, workers: int = workers) -> list:
+    """Results of func((source_path, month, start)) for every month, in month order."""
+    tasks = [(source_path, month, start) for month in months]
+    if workers == 1:
+        return [func(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map yields results in submission order, whatever order workers finish in
+        return list(executor.map(func, tasks))
+
+
+def parallel_wgt_pipeline(
+    source_path: str,
+    start: str = START_DATE,
+    end: str = None,
+    workers: int = workers
+    ) -> tuple:
+    """
+    Run group creation, wage quartiles and the unweighted collapse for every
+    month on a process pool. Returns (groups, unweighted, collapsed) frames.
+    """
+    months = cps_months(source_path, start, end)
+    print(f"Processing {len(months)} months on {workers or os.cpu_count()} workers...")
+    results = map_months(process_month, source_path, months, start, workers)
+    groups = pd.concat([r[0] for r in results], ignore_index=True)
+    dataset = open_cps_dataset(source_path)
+    if is_month_partitioned(dataset):
+        # Months in calendar order are the full scan's order, so the rows'
+        # ids (see cps_io.py) are consecutive
+        groups.insert(0, ROW_ID, first_row_id(dataset, start) + np.arange(len(groups)))
+    unweighted = pd.concat([r[1] for r in results], ignore_index=True)
+    collapsed = pd.concat([r[2] for r in results if r[2] is not None], ignore_index=True)
+    print(f"Processed {len(groups)} observations.")
+    return groups, unweighted, collapsed
+
+
+if __name__ == "__main__":
+    groups, unweighted, collapsed = parallel_wgt_pipeline(
+        sourcepath,
+        workers=workers
+    )
+    groups.to_parquet(f"{processeddatapath}/WGT_groups.parquet", index=False)
+    print(f"Saved wage growth tracker groups to {processeddatapath}/WGT_groups.parquet")
+    unweighted.to_parquet(f"{processeddatapath}/wage-growth-data_unweighted.parquet", index=False)
+    print(f"Saved unweighted wage growth data to {processeddatapath}/wage-growth-data_unweighted.parquet")
+    collapsed['date'] = pd.to_datetime({'year': collapsed['year'], 'month': collapsed['month'], 'day': 1})
+    collapsed['date'] = collapsed['date'].dt.strftime('%m/%d/%Y')
+    collapsed.to_parquet(f"{processeddatapath}/wage-growth-data_unweighted_collapsed.parquet", index=False)
+    print(f"Saved unsmoothed unweighted cuts to {processeddatapath}/wage-growth-data_unweighted_collapsed.parquet")
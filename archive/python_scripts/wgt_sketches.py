@@ -0,0 +1,184 @@
+"""
+Mergeable quantile sketches of wgt per month and cut.
+
+The smoothed series are moving averages of monthly medians. A pooled median
+over several months (or several cuts) needs the underlying distribution,
+which these sketches keep in compact form: every wgt value is mapped to a
+logarithmic bucket (as in DDSketch), so a month's sketch for a cut is a
+vector of bucket counts. Merging months or cuts is adding count vectors, and
+any quantile read from a merged sketch is within a relative error of
+`alpha` of the exact value (values with |wgt| <= min_value share one bucket
+and are reported as 0).
+
+Counts are cumulated over months (once per cut, on first use), so the
+sketch of any window of months is a difference of two rows:
+
+    sketches = load_sketches()
+    sketches.window_quantile('wgt', '2023-01', '2023-12')     # pooled 12-month median
+    sketches.rolling_quantile('wgt_ws', window=24, q=0.25)    # series of 24-month p25s
+    sketches.window_quantile(['wgt_q1', 'wgt_q2'], '2023-01', '2023-12')
+
+Cuts are the ones in wgt_collapse.CUTS. Merging overlapping cuts counts the
+shared observations twice.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from data_paths import processeddatapath
+from wgt_collapse import CUTS, cut_mask, group_codes
+
+SKETCH_PATH = f"{processeddatapath}/wgt_sketches.npz"
+
+# Default relative accuracy of the quantiles and the smallest |wgt| (in
+# percent) distinguished from zero
+ALPHA = 0.01
+MIN_VALUE = 0.001
+
+
+def bucket_keys(values: np.ndarray, alpha: float = ALPHA, min_value: float = MIN_VALUE) -> np.ndarray:
+    """
+    Signed bucket key of each value, ordered like the values: k > 0 covers
+    (min_value * gamma**(k-1), min_value * gamma**k], -k the mirror image
+    and 0 the values with |x| <= min_value, where gamma = (1+alpha)/(1-alpha).
+    """
+    gamma = (1 + alpha) / (1 - alpha)
+    magnitude = np.abs(values)
+    keys = np.zeros(len(values), dtype=np.int32)
+    big = magnitude > min_value
+    keys[big] = np.ceil(np.log(magnitude[big] / min_value) / np.log(gamma)).astype(np.int32)
+    return np.where(values < 0, -keys, keys)
+
+
+def bucket_values(keys: np.ndarray, alpha: float = ALPHA, min_value: float = MIN_VALUE) -> np.ndarray:
+    """Representative value of each bucket (relative error at most alpha)."""
+    gamma = (1 + alpha) / (1 - alpha)
+    magnitude = min_value * 2 * gamma ** np.abs(keys).astype('float64') / (gamma + 1)
+    return np.where(keys == 0, 0.0, np.sign(keys) * magnitude)
+
+
+@dataclass
+class MonthlySketches:
+    """Bucket counts per cut, counts[cut] of shape (months, buckets)."""
+    months: pd.PeriodIndex
+    first_key: int
+    counts: dict
+    alpha: float = ALPHA
+    min_value: float = MIN_VALUE
+    _cumulative: dict = field(default_factory=dict, repr=False)
+    _values: np.ndarray = field(default=None, repr=False)
+
+    @property
+    def bucket_values(self) -> np.ndarray:
+        if self._values is None:
+            n_keys = next(iter(self.counts.values())).shape[1]
+            keys = np.arange(self.first_key, self.first_key + n_keys)
+            self._values = bucket_values(keys, self.alpha, self.min_value)
+        return self._values
+
+    def cumulative(self, cut: str) -> np.ndarray:
+        """Row i holds the merged counts of months 0..i-1."""
+        if cut not in self._cumulative:
+            if cut not in self.counts:
+                raise KeyError(f"No sketch for cut {cut!r}; expected one of {list(self.counts)}")
+            counts = self.counts[cut]
+            self._cumulative[cut] = np.vstack([
+                np.zeros((1, counts.shape[1]), dtype=np.int64), np.cumsum(counts, axis=0, dtype=np.int64)
+            ])
+        return self._cumulative[cut]
+
+    def _cuts(self, cuts) -> list:
+        return [cuts] if isinstance(cuts, str) else list(cuts)
+
+    def _month_position(self, month) -> int:
+        return self.months.get_loc(pd.Period(month, freq='M'))
+
+    def window_counts(self, cuts, start, end) -> np.ndarray:
+        """Merged bucket counts of `cuts` (a name or list) for months start..end inclusive."""
+        lo, hi = self._month_position(start), self._month_position(end) + 1
+        return sum(self.cumulative(cut)[hi] - self.cumulative(cut)[lo] for cut in self._cuts(cuts))
+
+    def quantiles(self, counts: np.ndarray, q: float) -> np.ndarray:
+        """Quantile q of each row of a 2-D array of bucket counts (NaN if empty)."""
+        counts = np.atleast_2d(counts)
+        running = np.cumsum(counts, axis=1)
+        total = running[:, -1]
+        # Lower-rank quantile: first bucket whose running count exceeds q * (n - 1)
+        rank = np.floor(q * (total - 1))
+        position = (running > rank[:, None]).argmax(axis=1)
+        return np.where(total > 0, self.bucket_values[position], np.nan)
+
+    def window_quantile(self, cuts, start, end, q: float = 0.5) -> float:
+        """Pooled quantile q of `cuts` over months start..end inclusive."""
+        return float(self.quantiles(self.window_counts(cuts, start, end), q)[0])
+
+    def rolling_quantile(self, cuts, window: int, q: float = 0.5) -> pd.Series:
+        """Pooled quantile q of each trailing `window`-month window, by month."""
+        cumulative = sum(self.cumulative(cut) for cut in self._cuts(cuts))
+        hi = np.arange(1, len(self.months) + 1)
+        lo = np.maximum(hi - window, 0)
+        return pd.Series(self.quantiles(cumulative[hi] - cumulative[lo], q), index=self.months)
+
+
+def build_sketches(
+    df: pd.DataFrame,
+    cuts: dict = CUTS,
+    alpha: float = ALPHA,
+    min_value: float = MIN_VALUE
+    ) -> MonthlySketches:
+    """Sketch wgt per month for every cut from unweighted observations."""
+    month_ids, months = pd.factorize(df['date_monthly'], sort=True)
+    wgt = df['wgt'].to_numpy(dtype='float64')
+    valid = ~np.isnan(wgt)
+    keys = np.zeros(len(wgt), dtype=np.int32)
+    keys[valid] = bucket_keys(wgt[valid], alpha, min_value)
+    first_key = int(keys[valid].min()) if valid.any() else 0
+    n_keys = int(keys[valid].max()) - first_key + 1 if valid.any() else 1
+    cells = month_ids.astype(np.int64) * n_keys + (keys - first_key)
+
+    codes = {}
+    counts = {}
+    for cut, definition in cuts.items():
+        mask = valid
+        if definition is not None:
+            group_name, labels = definition
+            if group_name not in codes:
+                codes[group_name] = group_codes(df[group_name], group_name)
+            mask = valid & cut_mask(codes[group_name], group_name, labels)
+        counts[cut] = np.bincount(cells[mask], minlength=len(months) * n_keys) \
+            .reshape(len(months), n_keys).astype(np.int32)
+    return MonthlySketches(pd.PeriodIndex(months, freq='M'), first_key, counts, alpha, min_value)
+
+
+def save_sketches(sketches: MonthlySketches, path: str = SKETCH_PATH):
+    cuts = list(sketches.counts)
+    np.savez_compressed(
+        path,
+        months=sketches.months.strftime('%Y-%m').to_numpy(dtype=str),
+        cuts=np.array(cuts),
+        counts=np.stack([sketches.counts[cut] for cut in cuts]),
+        first_key=sketches.first_key,
+        alpha=sketches.alpha,
+        min_value=sketches.min_value
+    )
+
+
+def load_sketches(path: str = SKETCH_PATH) -> MonthlySketches:
+    with np.load(path) as data:
+        return MonthlySketches(
+            months=pd.PeriodIndex(data['months'], freq='M'),
+            first_key=int(data['first_key']),
+            counts=dict(zip(data['cuts'].tolist(), data['counts'])),
+            alpha=float(data['alpha']),
+            min_value=float(data['min_value'])
+        )
+
+
+if __name__ == "__main__":
+    print("Reading unweighted observations...")
+    df = pd.read_parquet(f"{processeddatapath}/wage-growth-data_unweighted.parquet")
+    print("Building sketches...")
+    sketches = build_sketches(df)
+    save_sketches(sketches)
+    print(f"Saved sketches for {len(sketches.counts)} cuts and {len(sketches.months)} months to {SKETCH_PATH}")
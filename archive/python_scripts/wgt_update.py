@@ -0,0 +1,94 @@
+"""
+Incremental update of the unweighted collapsed and smoothed outputs.
+
+Instead of rerunning unweighted_wgt_groups.py over every month since 1982,
+only the new months (or the months passed on the command line, e.g. ones
+revised by a re-ingest) are read and collapsed. Their rows replace or are
+appended to wage-growth-data_unweighted_collapsed.parquet, and the smoothed
+series are recomputed from the first updated month on, with the preceding
+11 months as history; earlier smoothed rows are kept as they are. The
+masking-gap blanking is applied by date, as in the full run.
+
+    python wgt_update.py              # months in the source after the last collapsed month
+    python wgt_update.py 2024-01      # recollapse 2024-01 (and the months after it, if new)
+"""
+import sys
+import time
+
+import pandas as pd
+
+from cps_io import START_DATE
+from data_paths import processeddatapath, sourcepath
+from smoothing import smooth_collapsed
+from wgt_parallel import cps_months, map_months, process_month
+
+SOURCE_PATH = sourcepath
+COLLAPSED_PATH = f"{processeddatapath}/wage-growth-data_unweighted_collapsed.parquet"
+SMOOTHED_PATH = f"{processeddatapath}/wage-growth-data_unweighted_smoothed.parquet"
+
+
+def new_months(source_path: str, collapsed: pd.DataFrame) -> list:
+    """Months in the source after the last month of `collapsed`."""
+    last = collapsed['date_monthly'].max()
+    return cps_months(source_path, start=(last + 1).to_timestamp().strftime('%Y-%m-%d'))
+
+
+def collapse_new_months(source_path: str, months: list, workers: int = 1) -> pd.DataFrame:
+    """Collapsed rows of `months` (with the formatted date column of the full run)."""
+    results = map_months(process_month, source_path, months, START_DATE, workers)
+    collapsed = pd.concat([r[2] for r in results if r[2] is not None], ignore_index=True)
+    collapsed['date'] = pd.to_datetime({'year': collapsed['year'], 'month': collapsed['month'], 'day': 1})
+    collapsed['date'] = collapsed['date'].dt.strftime('%m/%d/%Y')
+    return collapsed
+
+
+def merge_months(existing: pd.DataFrame, updates: pd.DataFrame) -> pd.DataFrame:
+    """Replace the months of `updates` in `existing` and keep months in order."""
+    kept = existing[~existing['date_monthly'].isin(updates['date_monthly'])]
+    merged = pd.concat([kept, updates[existing.columns]], ignore_index=True)
+    return merged.sort_values('date_monthly', kind='stable').reset_index(drop=True)
+
+
+def update_smoothed(smoothed: pd.DataFrame, collapsed: pd.DataFrame, start) -> pd.DataFrame:
+    """Keep smoothed rows before `start` and recompute the rest from `collapsed`."""
+    start = pd.Period(start, 'M')
+    recomputed = smooth_collapsed(collapsed, start=start)
+    kept = smoothed[smoothed['date_monthly'] < start]
+    return pd.concat([kept, recomputed[smoothed.columns]], ignore_index=True)
+
+
+def update_outputs(
+    source_path: str = SOURCE_PATH,
+    collapsed_path: str = COLLAPSED_PATH,
+    smoothed_path: str = SMOOTHED_PATH,
+    months: list = None,
+    workers: int = 1
+    ) -> list:
+    """
+    Collapse `months` (default: the new months in the source), merge them into
+    the collapsed output and recompute the affected smoothed rows. Returns
+    the months updated.
+    """
+    start_time = time.time()
+    collapsed = pd.read_parquet(collapsed_path)
+    if months is None:
+        months = new_months(source_path, collapsed)
+    months = sorted(pd.Period(month, 'M') for month in months)
+    if not months:
+        print("No new months to collapse.")
+        return []
+
+    print(f"Collapsing {len(months)} months: {months[0]} to {months[-1]}...")
+    collapsed = merge_months(collapsed, collapse_new_months(source_path, months, workers))
+    collapsed.to_parquet(collapsed_path, index=False)
+    print(f"Saved unsmoothed unweighted cuts to {collapsed_path}")
+
+    smoothed = update_smoothed(pd.read_parquet(smoothed_path), collapsed, months[0])
+    smoothed.to_parquet(smoothed_path, index=False)
+    print(f"Saved smoothed unweighted cuts to {smoothed_path}")
+    print(f"Update completed in {time.time() - start_time:.1f} seconds.")
+    return months
+
+
+if __name__ == "__main__":
+    update_outputs(months=sys.argv[1:] or None)
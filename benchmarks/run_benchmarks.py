@@ -0,0 +1,209 @@
+"""
+Time each pipeline stage on synthetic data and append the results to a CSV.
+
+Stages, each run in a fresh process so its peak RSS is its own:
+  dta_to_sqlite    ingest_utils.dta_to_sqlite                    .dta -> SQLite
+  dta_to_parquet   ingest_utils.dta_to_parquet_parallel          .dta -> month-partitioned Parquet
+  groups           cps_io.read_cps + wgt_parallel.month_groups   groups and wage quartiles
+  collapse         wgt_collapse.collapse_months                  monthly series of every cut
+  smoothing        smoothing.smooth_collapsed                    3- and 12-month averages
+
+Each row of the results file has the scale, stage, seconds, rows per second
+and peak RSS (of the stage process and of its largest worker), with the git
+commit, so runs before and after a change can be compared:
+
+    python run_benchmarks.py --rows 1000000 10000000
+    python run_benchmarks.py --rows 1000000 --stages groups collapse --repeat 3
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import subprocess
+import sys
+import time
+import traceback
+
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCHMARKS_DIR, '..')
+sys.path.insert(0, os.path.join(REPO_DIR, 'ingest'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'archive', 'python_scripts'))
+
+from synthetic_cps import FILE_STEM, TABLE_NAME, generate
+
+STAGES = ['dta_to_sqlite', 'dta_to_parquet', 'groups', 'collapse', 'smoothing']
+RESULTS_PATH = os.path.join(BENCHMARKS_DIR, 'results.csv')
+RESULT_COLUMNS = [
+    'timestamp', 'commit', 'rows', 'stage', 'seconds', 'rows_per_second', 'peak_rss_mb', 'peak_worker_rss_mb'
+]
+CHUNKSIZE = 1_000_000
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+################################################################################
+# Stages: each reads the data directory and returns the number of rows processed
+################################################################################
+def stage_dta_to_sqlite(data_dir: str) -> int:
+    from ingest_utils import dta_to_sqlite
+    db_path = os.path.join(data_dir, 'bench.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    return dta_to_sqlite(os.path.join(data_dir, f'{FILE_STEM}.dta'), db_path, TABLE_NAME, CHUNKSIZE)['rows']
+
+
+def stage_dta_to_parquet(data_dir: str) -> int:
+    from ingest_utils import WGT_COLUMNS, dta_to_parquet_parallel
+    parquet_dir = os.path.join(data_dir, 'bench.parquet')
+    dta_to_parquet_parallel(
+        os.path.join(data_dir, f'{FILE_STEM}.dta'), parquet_dir, CHUNKSIZE, columns=WGT_COLUMNS,
+        partition_by_month=True
+    )
+    return len(pd.read_parquet(parquet_dir, columns=['personid']))
+
+
+def stage_groups(data_dir: str) -> int:
+    from cps_io import read_cps
+    from group_registry import BLACKOUT_YEARS, GROUPS
+    from wgt_parallel import SOURCE_COLUMNS, month_groups
+    df = read_cps(os.path.join(data_dir, f'{FILE_STEM}.parquet'), columns=SOURCE_COLUMNS)
+    df['year'] = df['date'].dt.year
+    df['month'] = df['date'].dt.month
+    df['date_monthly'] = df['date'].dt.to_period('M')
+    month_groups(df)
+    # Observations for the collapse stage, as in unweighted_wgt_groups.py
+    unweighted = df.rename(columns={'wagegrowthtracker83': 'wgt'})
+    unweighted = unweighted[unweighted['wgt'].notna() | unweighted['year'].isin(BLACKOUT_YEARS)]
+    unweighted[['personid', 'year', 'month', 'date_monthly', 'recession76', 'wgt']
+               + [group.name for group in GROUPS] + ['wagegroup']].to_parquet(
+        os.path.join(data_dir, 'bench_unweighted.parquet'), index=False
+    )
+    return len(df)
+
+
+def stage_collapse(data_dir: str) -> int:
+    from wgt_collapse import collapse_months
+    df = pd.read_parquet(os.path.join(data_dir, 'bench_unweighted.parquet'))
+    collapsed = collapse_months(df)
+    collapsed.to_parquet(os.path.join(data_dir, 'bench_collapsed.parquet'), index=False)
+    return len(df)
+
+
+def stage_smoothing(data_dir: str) -> int:
+    from smoothing import smooth_collapsed
+    collapsed = pd.read_parquet(os.path.join(data_dir, 'bench_collapsed.parquet'))
+    smooth_collapsed(collapsed)
+    return len(collapsed)
+
+
+def _run_stage(stage: str, data_dir: str, queue):
+    """Put ('ok', (rows, seconds, rss, worker rss)) or ('error', traceback) on `queue`."""
+    try:
+        start_time = time.time()
+        rows = globals()[f'stage_{stage}'](data_dir)
+        seconds = time.time() - start_time
+    except BaseException:
+        queue.put(('error', traceback.format_exc()))
+        return
+    # ru_maxrss is in KiB on Linux
+    queue.put(('ok', (
+        rows, seconds,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    )))
+
+
+def run_stage(stage: str, data_dir: str) -> dict:
+    """Run one stage in a fresh process and return its timing and peak RSS."""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, data_dir, queue))
+    process.start()
+    while True:
+        try:
+            status, result = queue.get(timeout=1)
+            break
+        except queue_module.Empty:
+            # A child killed before reporting (e.g. out of memory) puts nothing
+            if not process.is_alive() and queue.empty():
+                raise RuntimeError(f"Stage {stage} exited with code {process.exitcode} without a result.")
+    process.join()
+    if status == 'error':
+        raise RuntimeError(f"Stage {stage} failed:\n{result}")
+    rows, seconds, rss, worker_rss = result
+    return {
+        'stage': stage,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'peak_rss_mb': round(rss, 1),
+        'peak_worker_rss_mb': round(worker_rss, 1),
+    }
+
+
+def append_results(results: list, path: str = RESULTS_PATH):
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(results)
+
+
+def run_benchmarks(
+    scales: list,
+    work_dir: str,
+    stages: list = STAGES,
+    repeat: int = 1,
+    results_path: str = RESULTS_PATH,
+    seed: int = 0
+    ) -> list:
+    """
+    Generate synthetic data for each scale (reused if already in work_dir),
+    time `stages` on it `repeat` times and append the results to results_path.
+    """
+    results = []
+    for rows in scales:
+        data_dir = os.path.join(work_dir, f'rows_{rows}')
+        if not os.path.exists(os.path.join(data_dir, f'{FILE_STEM}.parquet')):
+            print(f"Generating {rows} synthetic rows in {data_dir}...")
+            generate(rows, data_dir, formats=('dta', 'parquet'), seed=seed)
+        actual_rows = len(pd.read_parquet(os.path.join(data_dir, f'{FILE_STEM}.parquet'), columns=['personid']))
+        for stage in stages:
+            for _ in range(repeat):
+                print(f"[{rows}] Running {stage}...")
+                result = run_stage(stage, data_dir)
+                result.update({
+                    'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+                    'commit': git_commit(),
+                    'rows': actual_rows,
+                })
+                print(f"[{rows}] {stage}: {result['seconds']:.2f} seconds, "
+                      f"{result['rows_per_second']:,} rows/s, peak RSS {result['peak_rss_mb']:,.0f} MB.")
+                append_results([result], results_path)
+                results.append(result)
+    print(f"Results appended to {results_path}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000], help="Scales to benchmark")
+    parser.add_argument('--work-dir', default='/tmp/tlg_wagetracker_benchmarks',
+                        help="Where synthetic data is generated (and reused)")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--results', default=RESULTS_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run_benchmarks(args.rows, args.work_dir, args.stages, args.repeat, args.results, args.seed)
@@ -0,0 +1,485 @@
+"""
+Synthetic CPS microdata with the schema of data/raw_column_names.txt.
+
+People follow the CPS rotation: in the survey for 4 months, out for 8, in for
+4 more, so each person is observed in months s..s+3 and s+12..s+15 (month in
+sample 1-8). Earnings are asked in months in sample 4 and 8, which gives the
+12-month wage pairs behind wagegrowthtracker83. Person attributes (sex, race,
+education, location, age) are fixed; employment, occupation, industry,
+hourly status and wage are drawn per survey year with realistic persistence,
+and the _tm1/_tm2/_tm12 columns hold the same person's earlier values. Lagged
+values are missing in the months where Census masked identifiers
+(1985-86, 1995-96).
+
+Rows are generated one month at a time, so any scale (100k to 200M rows) runs
+in bounded memory, and written as .dta (release 118), Parquet and/or SQLite:
+
+    python synthetic_cps.py --rows 1000000 --out /tmp/cps_synth --formats dta parquet sqlite
+"""
+import argparse
+import os
+import sqlite3
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(REPO_DIR, 'ingest'))
+from ingest_utils import LOAD_PRAGMAS, _create_table, apply_pragmas, bulk_insert_frame
+
+COLUMN_NAMES_PATH = os.path.join(REPO_DIR, 'data', 'raw_column_names.txt')
+TABLE_NAME = 'cps_harmonized_longitudinally_matched'
+FILE_STEM = 'CPS_harmonized_variable_longitudinally_matched_age16plus'
+
+FIRST_MONTH = '1982-01'
+LAST_MONTH = '2023-12'
+
+# Month in sample -> months since the person's first interview
+ROTATION = (0, 1, 2, 3, 12, 13, 14, 15)
+
+# Months without 12-month matches (Census masking of identifiers)
+MASKED_MONTHS = [('1985-07', '1986-09'), ('1995-06', '1996-08')]
+
+# NBER recession months
+RECESSIONS = [
+    ('1981-07', '1982-11'), ('1990-07', '1991-03'), ('2001-03', '2001-11'),
+    ('2007-12', '2009-06'), ('2020-02', '2020-04'),
+]
+
+# Code distributions
+EDUC92 = ((1, 2, 3, 4, 5, 6, 7), (0.10, 0.29, 0.18, 0.05, 0.05, 0.21, 0.12))
+RACE76 = ((1, 2, 3), (0.78, 0.13, 0.09))
+METSTAT78 = ((1, 2, 3), (0.80, 0.18, 0.02))
+CENSUSDIV76 = ((1, 2, 3, 4, 5, 6, 7, 8, 9), (0.05, 0.13, 0.15, 0.07, 0.20, 0.06, 0.12, 0.07, 0.15))
+# Occupation by degree (educ92 >= 4) vs no degree
+OCCUPATION76 = (11, 12, 13, 21, 22, 23, 31, 32, 33, 34)
+OCCUPATION76_P = {
+    False: (0.05, 0.04, 0.03, 0.08, 0.14, 0.08, 0.16, 0.16, 0.15, 0.11),
+    True: (0.22, 0.24, 0.12, 0.09, 0.11, 0.06, 0.05, 0.05, 0.04, 0.02),
+}
+INDUSTRY76 = (
+    (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13),
+    (0.02, 0.06, 0.11, 0.15, 0.05, 0.02, 0.07, 0.11, 0.22, 0.08, 0.05, 0.05, 0.01),
+)
+# lfdetail94: 6 and 8-20 full-time, 7 and 21-32 part-time, 1-5 not employed
+LF_FULL_TIME = ((6, 8, 9, 10, 11, 12, 14, 16, 18, 20), (0.05, 0.60, 0.08, 0.06, 0.05, 0.05, 0.04, 0.03, 0.02, 0.02))
+LF_PART_TIME = ((7, 21, 22, 24, 26, 28, 30, 32), (0.10, 0.40, 0.15, 0.10, 0.08, 0.07, 0.05, 0.05))
+LF_NOT_EMPLOYED = ((1, 2, 3, 4, 5), (0.05, 0.08, 0.50, 0.27, 0.10))
+
+# Stata storage type of each column: double for weights and wages, long for
+# ids and the date, byte for the codes
+DOUBLE_COLUMNS = {
+    'weight76', 'weightbls98', 'weightl92', 'weightern82', 'wageperwk82', 'wageperhr82',
+    'wageperhrclean82', 'wageperwkclean82', 'wagegrowth83', 'wagegrowthtracker83', 'wageperhr82_tm12',
+}
+LONG_COLUMNS = {'obsid', 'householdid', 'personid', 'date'}
+
+
+def read_column_names(path: str = COLUMN_NAMES_PATH) -> list:
+    """Column names from data/raw_column_names.txt ('(1 obsid)' per line)."""
+    with open(path) as f:
+        return [line.strip().strip('()').split()[1] for line in f if line.strip()]
+
+
+def column_type(name: str) -> str:
+    if name in DOUBLE_COLUMNS:
+        return 'f8'
+    if name in LONG_COLUMNS:
+        return 'i4'
+    return 'i1'
+
+
+def month_number(month: str) -> int:
+    period = pd.Period(month, 'M')
+    return period.year * 12 + period.month - 1
+
+
+def in_ranges(month: int, ranges: list) -> bool:
+    return any(month_number(first) <= month <= month_number(last) for first, last in ranges)
+
+
+def _choice(rng, codes_and_p, size):
+    codes, p = codes_and_p
+    return rng.choice(np.array(codes, dtype='float64'), size=size, p=np.array(p) / np.sum(p))
+
+
+################################################################################
+# Panels
+################################################################################
+def generate_cohort(seed: int, cohort: int, size: int) -> dict:
+    """
+    Attributes of the `size` people first interviewed in month `cohort`:
+    fixed per person, per survey year (shape (size, 2)) or per interview
+    (shape (size, 8)).
+    """
+    rng = np.random.default_rng([seed, cohort + 100_000])
+    c = {'size': size}
+    c['personid'] = cohort * size + np.arange(size, dtype=np.int64) + 1
+    c['householdid'] = c['personid'] // 2 + 1
+    c['female76'] = (rng.random(size) < 0.49).astype('float64')
+    c['race76'] = _choice(rng, RACE76, size)
+    c['educ92'] = _choice(rng, EDUC92, size)
+    c['metstat78'] = _choice(rng, METSTAT78, size)
+    c['censusdiv76'] = _choice(rng, CENSUSDIV76, size)
+    c['stfips76'] = rng.integers(1, 57, size).astype('float64')
+    c['age0'] = np.clip(16 + rng.gamma(2.2, 12, size), 16, 85).astype(np.int64).astype('float64')
+    c['marstat76'] = rng.integers(1, 7, size).astype('float64')
+    c['uscitizen94'] = np.where(rng.random(size) < 0.92, 1.0, 2.0)
+    c['numkids82'] = rng.poisson(0.8, size).clip(0, 9).astype('float64')
+
+    # Employment by survey year, persistent across the 12 months
+    degree = c['educ92'] >= 4
+    employed0 = rng.random(size) < np.where(degree, 0.74, 0.58) * np.where(c['age0'] >= 62, 0.5, 1.0)
+    stays = rng.random(size) < 0.92
+    employed1 = np.where(stays, employed0, ~employed0)
+    c['employed'] = np.column_stack([employed0, employed1])
+    full_time = rng.random((size, 2)) < 0.82
+    full_time[:, 1] = np.where(rng.random(size) < 0.9, full_time[:, 0], full_time[:, 1])
+    lf = np.where(
+        full_time, _choice(rng, LF_FULL_TIME, (size, 2)), _choice(rng, LF_PART_TIME, (size, 2))
+    )
+    c['lfdetail94'] = np.where(c['employed'], lf, _choice(rng, LF_NOT_EMPLOYED, (size, 2)))
+    c['mlr76'] = np.where(c['employed'], 1.0, np.where(c['lfdetail94'] <= 2, 2.0, 3.0))
+
+    # Job attributes by year: occupation depends on education
+    occupation = np.empty((size, 2))
+    for has_degree in (False, True):
+        rows = degree == has_degree
+        occupation[rows] = rng.choice(
+            np.array(OCCUPATION76, dtype='float64'), size=(rows.sum(), 2), p=OCCUPATION76_P[has_degree]
+        )
+    industry = _choice(rng, INDUSTRY76, (size, 2))
+    occupation[:, 1] = np.where(rng.random(size) < 0.85, occupation[:, 0], occupation[:, 1])
+    industry[:, 1] = np.where(rng.random(size) < 0.88, industry[:, 0], industry[:, 1])
+    c['occupation76'] = np.where(c['employed'], occupation, np.nan)
+    c['industry76'] = np.where(c['employed'], industry, np.nan)
+    c['employer89'] = np.where(c['employed'], np.where(rng.random((size, 2)) < 0.82, 1.0, 2.0), np.nan)
+    low_skill = np.isin(occupation, (32, 33, 34))
+    hourly = rng.random((size, 2)) < np.where(low_skill, 0.8, 0.5)
+    hourly[:, 1] = np.where(rng.random(size) < 0.92, hourly[:, 0], hourly[:, 1])
+    c['paidhrly82'] = np.where(c['employed'], hourly.astype('float64'), np.nan)
+    c['hours82'] = np.where(c['employed'], np.where(full_time, 40.0, 22.0), np.nan)
+
+    # Hourly wage (current dollars) with a Mincer-style profile and 12-month growth
+    experience = c['age0'] - 16
+    log_wage = (
+        1.6 + 0.11 * c['educ92'] + 0.035 * experience - 0.0006 * experience ** 2
+        + np.where(np.isin(occupation[:, 0], (11, 12, 13)), 0.25, 0.0)
+        + rng.normal(0, 0.45, size)
+    )
+    wage0 = np.exp(log_wage) * 1.03 ** ((cohort - month_number(FIRST_MONTH)) / 12)
+    growth = np.where(rng.random(size) < 0.12, 1.0, np.exp(rng.normal(0.045, 0.12, size)))
+    wage = np.round(np.column_stack([wage0, wage0 * growth]), 2)
+    c['wageperhr82'] = np.where(c['employed'], wage, np.nan)
+
+    # Survey answers per interview
+    c['sameemployer94'] = np.where(rng.random((size, 8)) < 0.97, 1.0, 2.0)
+    c['sameactivities94'] = np.where(rng.random((size, 8)) < 0.96, 1.0, 2.0)
+    c['weight76'] = np.round(rng.lognormal(7.3, 0.35, (size, 8)), 2)
+    return c
+
+
+def _tm(values: np.ndarray, available: np.ndarray) -> np.ndarray:
+    return np.where(available, values, np.nan)
+
+
+def month_rows(cohort: dict, month: int, mis: int, lags_masked: bool) -> dict:
+    """Columns for the rows of `cohort` interviewed in `month` in month-in-sample `mis`."""
+    size = cohort['size']
+    i = mis - 1
+    year = 0 if mis <= 4 else 1
+    outgoing = mis in (4, 8)
+    has_tm12 = mis >= 5 and not lags_masked
+    has_tm1 = mis not in (1, 5)
+    has_tm2 = mis not in (1, 2, 5, 6)
+    since_1994 = month >= month_number('1994-01')
+    employed = cohort['employed'][:, year]
+
+    rows = {name: cohort[name] for name in (
+        'personid', 'householdid', 'female76', 'race76', 'educ92', 'metstat78', 'censusdiv76',
+        'stfips76', 'marstat76', 'uscitizen94', 'numkids82'
+    )}
+    rows['mis76'] = np.full(size, float(mis))
+    rows['age76'] = np.minimum(cohort['age0'] + ROTATION[i] // 12, 90)
+    for name in ('lfdetail94', 'mlr76', 'occupation76', 'industry76', 'employer89', 'hours82'):
+        rows[name] = cohort[name][:, year]
+    rows['lfdetail76'] = rows['lfdetail94']
+    rows['hrsumainjob94'] = rows['hours82']
+    rows['hrsaalljobs82'] = rows['hours82']
+    rows['weight76'] = cohort['weight76'][:, i]
+    rows['weightbls98'] = rows['weight76']
+    rows['weightl92'] = rows['weight76']
+
+    # Earnings questions (outgoing rotation groups only)
+    earner = employed & outgoing
+    rows['paidhrly82'] = _tm(cohort['paidhrly82'][:, year], earner)
+    rows['wageperhr82'] = _tm(cohort['wageperhr82'][:, year], earner)
+    rows['wageperhrclean82'] = rows['wageperhr82']
+    rows['wageperwk82'] = np.round(rows['wageperhr82'] * rows['hours82'], 2)
+    rows['wageperwkclean82'] = rows['wageperwk82']
+    rows['weightern82'] = _tm(4 * rows['weight76'], earner)
+
+    # 12-month lags (from the first year of the panel)
+    lag12 = has_tm12 & cohort['employed'][:, 0]
+    for name in ('lfdetail76', 'lfdetail94', 'mlr76'):
+        source = 'lfdetail94' if name == 'lfdetail76' else name
+        rows[f'{name}_tm12'] = np.full(size, np.nan) if not has_tm12 else cohort[source][:, 0]
+    for name in ('occupation76', 'industry76', 'employer89', 'hours82'):
+        rows[f'{name}_tm12'] = _tm(cohort[name][:, 0], lag12)
+    rows['hrsumainjob94_tm12'] = rows['hours82_tm12']
+    rows['paidhrly82_tm12'] = _tm(cohort['paidhrly82'][:, 0], lag12 & outgoing)
+    rows['wageperhr82_tm12'] = _tm(cohort['wageperhr82'][:, 0], lag12 & outgoing)
+    growth = (rows['wageperhr82'] / rows['wageperhr82_tm12'] - 1) * 100
+    rows['wagegrowth83'] = growth
+    rows['wagegrowthtracker83'] = growth if month >= month_number('1983-01') else np.full(size, np.nan)
+
+    # 1- and 2-month lags (same survey year)
+    for name in ('lfdetail76', 'lfdetail94', 'mlr76'):
+        rows[f'{name}_tm1'] = _tm(rows[name], np.full(size, has_tm1))
+        rows[f'{name}_tm2'] = _tm(rows[name], np.full(size, has_tm2))
+    for name in ('occupation76', 'industry76'):
+        rows[f'{name}_tm1'] = _tm(rows[name], np.full(size, has_tm1))
+        rows[f'{name}_tm2'] = _tm(rows[name], np.full(size, has_tm2))
+    rows['nlfdetail94'] = np.where(employed, np.nan, rows['lfdetail94'])
+    for suffix in ('', '_tm1', '_tm2', '_tm12'):
+        rows[f'nlfdetail94{suffix}'] = np.where(employed, np.nan, rows[f'lfdetail94{suffix}'])
+
+    # Dependent interviewing questions (asked from 1994, not in the first month of each spell)
+    asked = employed & since_1994
+    for name in ('sameemployer94', 'sameactivities94'):
+        rows[name] = _tm(cohort[name][:, i], asked & has_tm1)
+        previous = month - 1 >= month_number('1994-01')
+        rows[f'{name}_tm1'] = _tm(cohort[name][:, max(i - 1, 0)], asked & has_tm2 & previous)
+        rows[f'{name}_tm2'] = _tm(
+            cohort[name][:, max(i - 2, 0)], asked & (mis in (4, 8)) & (month - 2 >= month_number('1994-01'))
+        )
+    return rows
+
+
+def generate_month(seed: int, month: int, persons_per_cohort: int, cohorts: OrderedDict) -> dict:
+    """All rows interviewed in `month`, one cohort per month in sample."""
+    lags_masked = in_ranges(month, MASKED_MONTHS)
+    parts = []
+    for mis, offset in enumerate(ROTATION, start=1):
+        cohort_month = month - offset
+        if cohort_month not in cohorts:
+            cohorts[cohort_month] = generate_cohort(seed, cohort_month, persons_per_cohort)
+            # A cohort is interviewed over 16 months
+            while len(cohorts) > 16:
+                cohorts.popitem(last=False)
+        parts.append(month_rows(cohorts[cohort_month], month, mis, lags_masked))
+    rows = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    n = len(rows['personid'])
+    rows['recession76'] = np.full(n, float(in_ranges(month, RECESSIONS)))
+    return rows
+
+
+def month_frame(rows: dict, month: int, first_obsid: int, columns: list, seed: int) -> pd.DataFrame:
+    """Rows as a frame in `columns` order; unmodeled columns get plausible codes."""
+    n = len(rows['personid'])
+    rng = np.random.default_rng([seed, month])
+    data = {}
+    for name in columns:
+        if name == 'obsid':
+            data[name] = np.arange(first_obsid, first_obsid + n, dtype=np.int64)
+        elif name == 'date':
+            data[name] = np.full(n, pd.Timestamp(year=month // 12, month=month % 12 + 1, day=1))
+        elif name in rows:
+            data[name] = rows[name]
+        elif name.startswith('numkids'):
+            data[name] = np.minimum(rows['numkids82'], rng.integers(0, 3, n))
+        elif name in ('absrsn94', 'payabs94', 'hrsvarymainjob94', 'untype89', 'unempdur76', 'unempdur94'):
+            data[name] = np.where(rows['mlr76'] == 1, np.nan, rng.integers(1, 10, n))
+        elif name in ('wageperhrtopcoded89', 'wageperhrallocated89'):
+            data[name] = np.where(np.isnan(rows['wageperhr82']), np.nan, (rng.random(n) < 0.03) * 1.0)
+        elif name == 'yrsofexp76':
+            data[name] = np.clip(rows['age76'] - 18, 0, 70)
+        elif name == 'educ76':
+            data[name] = np.minimum(rows['educ92'], 5)
+        elif name == 'raceeth76':
+            data[name] = rows['race76']
+        else:
+            data[name] = rng.integers(1, 5, n).astype('float64')
+    return pd.DataFrame(data)
+
+
+################################################################################
+# Writers
+################################################################################
+STATA_TYPE_CODES = {'f8': 65526, 'i4': 65528, 'i1': 65530}
+STATA_MISSING = {'f8': struct.unpack('<d', b'\x00\x00\x00\x00\x00\x00\xe0\x7f')[0], 'i4': 2147483621, 'i1': 101}
+STATA_FORMATS = {'f8': '%10.0g', 'i4': '%12.0g', 'i1': '%8.0g'}
+STATA_EPOCH = pd.Timestamp('1960-01-01')
+
+
+class DtaWriter:
+    """Streaming writer for Stata 14+ .dta files (release 118, numeric columns)."""
+
+    def __init__(self, path: str, columns: list):
+        self.path = path
+        self.columns = columns
+        self.types = [column_type(name) for name in columns]
+        self.dtype = np.dtype([(name, '<' + typ) for name, typ in zip(columns, self.types)])
+        self.nobs = 0
+        self.f = open(path, 'wb')
+        self.map = [0] * 14
+        self._write_header()
+
+    def _tag(self, index: int, tag: bytes):
+        self.map[index] = self.f.tell()
+        self.f.write(tag)
+
+    def _write_header(self):
+        f = self.f
+        nvar = len(self.columns)
+        f.write(b'<stata_dta><header><release>118</release><byteorder>LSF</byteorder>')
+        f.write(b'<K>' + struct.pack('<H', nvar) + b'</K>')
+        self.nobs_offset = f.tell() + 3
+        f.write(b'<N>' + struct.pack('<Q', 0) + b'</N>')
+        f.write(b'<label>' + struct.pack('<H', 0) + b'</label>')
+        f.write(b'<timestamp>' + bytes([17]) + time.strftime('%d %b %Y %H:%M').encode() + b'</timestamp></header>')
+        self._tag(1, b'<map>')
+        self.map_offset = f.tell()
+        f.write(struct.pack('<14Q', *self.map) + b'</map>')
+        self._tag(2, b'<variable_types>')
+        f.write(struct.pack(f'<{nvar}H', *(STATA_TYPE_CODES[t] for t in self.types)) + b'</variable_types>')
+        self._tag(3, b'<varnames>')
+        f.write(b''.join(name.encode().ljust(129, b'\x00') for name in self.columns) + b'</varnames>')
+        self._tag(4, b'<sortlist>')
+        f.write(b'\x00\x00' * (nvar + 1) + b'</sortlist>')
+        self._tag(5, b'<formats>')
+        formats = ['%td' if name == 'date' else STATA_FORMATS[t] for name, t in zip(self.columns, self.types)]
+        f.write(b''.join(fmt.encode().ljust(57, b'\x00') for fmt in formats) + b'</formats>')
+        self._tag(6, b'<value_label_names>')
+        f.write(b'\x00' * 129 * nvar + b'</value_label_names>')
+        self._tag(7, b'<variable_labels>')
+        f.write(b'\x00' * 321 * nvar + b'</variable_labels>')
+        self._tag(8, b'<characteristics>')
+        f.write(b'</characteristics>')
+        self._tag(9, b'<data>')
+
+    def write(self, df: pd.DataFrame):
+        records = np.empty(len(df), dtype=self.dtype)
+        for name, typ in zip(self.columns, self.types):
+            if name == 'date':
+                values = ((df[name] - STATA_EPOCH).dt.days).to_numpy(dtype='float64')
+            else:
+                values = df[name].to_numpy(dtype='float64')
+            records[name] = np.where(np.isnan(values), STATA_MISSING[typ], values)
+        self.f.write(records.tobytes())
+        self.nobs += len(df)
+
+    def close(self):
+        f = self.f
+        f.write(b'</data>')
+        self._tag(10, b'<strls>')
+        f.write(b'</strls>')
+        self._tag(11, b'<value_labels>')
+        f.write(b'</value_labels>')
+        self._tag(12, b'</stata_dta>')
+        self.map[13] = f.tell()
+        f.seek(self.nobs_offset)
+        f.write(struct.pack('<Q', self.nobs))
+        f.seek(self.map_offset)
+        f.write(struct.pack('<14Q', *self.map))
+        f.close()
+
+
+def arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Same types as ingest_utils.dta_to_parquet_parallel (integers keep their width, nulls for missing)."""
+    arrays = []
+    for name in df.columns:
+        typ = column_type(name)
+        values = df[name].to_numpy()
+        if name == 'date':
+            arrays.append(pa.array(values.astype('datetime64[ns]')))
+        elif typ == 'f8':
+            arrays.append(pa.array(values.astype('float64'), from_pandas=True))
+        else:
+            values = values.astype('float64')
+            missing = np.isnan(values)
+            arrays.append(pa.array(np.where(missing, 0, values).astype(typ), mask=missing))
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+def generate(
+    rows: int,
+    out_dir: str,
+    formats: tuple = ('dta', 'parquet', 'sqlite'),
+    first_month: str = FIRST_MONTH,
+    last_month: str = LAST_MONTH,
+    seed: int = 0
+    ) -> dict:
+    """
+    Write about `rows` synthetic rows spread evenly over first_month..last_month
+    in each of `formats`. Returns the paths written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    columns = read_column_names()
+    first, last = month_number(first_month), month_number(last_month)
+    n_months = last - first + 1
+    persons_per_cohort = max(1, rows // (n_months * len(ROTATION)))
+
+    paths = {}
+    writers = {}
+    if 'dta' in formats:
+        paths['dta'] = os.path.join(out_dir, f'{FILE_STEM}.dta')
+        writers['dta'] = DtaWriter(paths['dta'], columns)
+    if 'parquet' in formats:
+        paths['parquet'] = os.path.join(out_dir, f'{FILE_STEM}.parquet')
+    if 'sqlite' in formats:
+        paths['sqlite'] = os.path.join(out_dir, f'{FILE_STEM}.db')
+        if os.path.exists(paths['sqlite']):
+            os.remove(paths['sqlite'])
+        conn = sqlite3.connect(paths['sqlite'])
+        apply_pragmas(conn, LOAD_PRAGMAS)
+
+    start_time = time.time()
+    cohorts = OrderedDict()
+    written = 0
+    try:
+        for month in range(first, last + 1):
+            df = month_frame(
+                generate_month(seed, month, persons_per_cohort, cohorts), month, written + 1, columns, seed
+            )
+            if 'dta' in writers:
+                writers['dta'].write(df)
+            if 'parquet' in paths:
+                table = arrow_table(df)
+                if 'parquet' not in writers:
+                    writers['parquet'] = pq.ParquetWriter(paths['parquet'], table.schema, compression='snappy')
+                writers['parquet'].write_table(table)
+            if 'sqlite' in paths:
+                if written == 0:
+                    _create_table(conn, TABLE_NAME, df)
+                bulk_insert_frame(conn, TABLE_NAME, df)
+                conn.commit()
+            written += len(df)
+            if (month - first) % 60 == 59 or month == last:
+                print(f"{written} rows generated ({written / (time.time() - start_time):,.0f} rows/s).")
+    finally:
+        for writer in writers.values():
+            writer.close()
+        if 'sqlite' in paths:
+            conn.close()
+    print(f"Wrote {written} rows ({', '.join(paths)}) to {out_dir}.")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Approximate number of rows")
+    parser.add_argument('--out', required=True, help="Output directory")
+    parser.add_argument('--formats', nargs='+', default=['dta', 'parquet', 'sqlite'],
+                        choices=['dta', 'parquet', 'sqlite'])
+    parser.add_argument('--first-month', default=FIRST_MONTH)
+    parser.add_argument('--last-month', default=LAST_MONTH)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.rows, args.out, tuple(args.formats), args.first_month, args.last_month, args.seed)
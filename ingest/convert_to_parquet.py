@@ -0,0 +1,33 @@
+import yaml
+from dta_schema import ensure_dta_schema
+from ingest_utils import dta_to_parquet_parallel, WGT_COLUMNS
+
+def load_config(config_path):
+    with open(config_path, 'r') as file:
+        return yaml.safe_load(file)
+
+if __name__ == "__main__":
+    # Load config
+    config_path = 'config.yml'
+    config = load_config(config_path)
+
+    dta_file_path = config['dta_file_path']
+    parquet_path = config['parquet_path']
+    chunksize = config['chunksize']
+    workers = config.get('workers')
+    # 'wgt' keeps only the columns used by the group scripts
+    columns = WGT_COLUMNS if config.get('parquet_columns') == 'wgt' else None
+    partition_by_month = config.get('parquet_partition_by_month', False)
+    # Compact column types, inferred once per version of the .dta file
+    schema = ensure_dta_schema(dta_file_path, config.get('dta_schema_path'))
+
+    # Run conversion
+    dta_to_parquet_parallel(
+        dta_file_path, 
+        parquet_path, 
+        chunksize, 
+        columns, 
+        workers, 
+        partition_by_month,
+        schema
+    )
@@ -1,4 +1,5 @@
 import yaml
+from dta_schema import ensure_dta_schema
 from ingest_utils import dta_to_sqlite
 
 def load_config(config_path):
@@ -14,6 +15,8 @@ if __name__ == "__main__":
     sqlite_file_path = config['sqlite_file_path']
     table_name = config['dev_table_name']
     chunksize = config['chunksize']
+    # Compact column types, inferred once per version of the .dta file
+    schema = ensure_dta_schema(dta_file_path, config.get('dta_schema_path'))
 
     # Run ingest
-    dta_to_sqlite(dta_file_path, sqlite_file_path, table_name, chunksize)
+    dta_to_sqlite(dta_file_path, sqlite_file_path, table_name, chunksize, schema)
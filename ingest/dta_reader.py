@@ -0,0 +1,339 @@
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Stata 13+ (.dta releases 117, 118, 119) store the data section as fixed-width
+# records, so any row range maps to a single contiguous byte range:
+#   data_offset + start * record_width ... data_offset + stop * record_width
+# That is what lets us split the file across worker processes. The file is
+# memory-mapped as an array of records, so a column is a strided view and
+# only the requested columns are ever decoded.
+
+# Numeric type codes used in the <variable_types> section (release 117+)
+STATA_TYPES = {
+    65526: 'f8',  # double
+    65527: 'f4',  # float
+    65528: 'i4',  # long
+    65529: 'i2',  # int
+    65530: 'i1',  # byte
+}
+STRL_TYPE = 32768
+
+# Largest non-missing value for each numeric type; anything above is one
+# of Stata's missing values (., .a, ..., .z).
+MISSING_ABOVE = {
+    'i1': 100,
+    'i2': 32740,
+    'i4': 2147483620,
+    'f4': struct.unpack('<f', b'\xff\xff\xff\x7e')[0],
+    'f8': struct.unpack('<d', b'\xff\xff\xff\xff\xff\xff\xdf\x7f')[0],
+}
+
+# Days between Stata's epoch (1960-01-01) and the Unix epoch
+STATA_EPOCH_OFFSET_DAYS = 3653
+
+
+def _is_date_format(fmt: str) -> bool:
+    return fmt.startswith('%td') or fmt.startswith('%d')
+
+
+def _is_datetime_format(fmt: str) -> bool:
+    return fmt.startswith('%tc') or fmt.startswith('%tC')
+
+
+def _check_supported(typ: int):
+    """Raise TypeError for the storage types the decoders cannot convert (strL)."""
+    if typ == STRL_TYPE:
+        raise TypeError("strL columns are not supported; drop them via `columns`.")
+
+
+@dataclass
+class DtaLayout:
+    """Header information needed to decode the data section of a .dta file."""
+    release: int
+    byteorder: str
+    nvar: int
+    nobs: int
+    data_offset: int
+    varnames: list
+    typlist: list
+    fmtlist: list
+    dtype: np.dtype
+
+    @property
+    def record_width(self) -> int:
+        return self.dtype.itemsize
+
+    def byte_range(self, start: int, stop: int) -> tuple:
+        """Byte offsets of rows [start, stop) in the file."""
+        return (
+            self.data_offset + start * self.record_width,
+            self.data_offset + stop * self.record_width
+        )
+
+
+def _read_tagged_offset(f, tag: bytes) -> int:
+    """Advance past an opening tag and return the offset right after it."""
+    value = f.read(len(tag))
+    if value != tag:
+        raise ValueError(f"Expected {tag!r} in .dta header, found {value!r}.")
+    return f.tell()
+
+
+def _decode_name(raw: bytes, encoding: str) -> str:
+    return raw.split(b'\x00', 1)[0].decode(encoding)
+
+
+def read_dta_layout(dta_file_path: str) -> DtaLayout:
+    """
+    Parse the header, map, variable types, names and formats of a .dta file.
+    Only the XML-style formats written by Stata 13 and later are supported.
+    """
+    with open(dta_file_path, 'rb') as f:
+        if f.read(11) != b'<stata_dta>':
+            raise ValueError(
+                f"{dta_file_path} is not a Stata 13+ .dta file (release 117-119)."
+            )
+        _read_tagged_offset(f, b'<header><release>')
+        release = int(f.read(3))
+        if release not in (117, 118, 119):
+            raise ValueError(f"Unsupported .dta release {release}.")
+        _read_tagged_offset(f, b'</release><byteorder>')
+        byteorder = '<' if f.read(3) == b'LSF' else '>'
+        _read_tagged_offset(f, b'</byteorder><K>')
+        nvar = struct.unpack(byteorder + ('I' if release == 119 else 'H'),
+                             f.read(4 if release == 119 else 2))[0]
+        _read_tagged_offset(f, b'</K><N>')
+        nobs = struct.unpack(byteorder + ('I' if release == 117 else 'Q'),
+                             f.read(4 if release == 117 else 8))[0]
+
+        # Offsets of every section of the file
+        _read_tagged_offset(f, b'</N><label>')
+        label_len = struct.unpack(byteorder + ('B' if release == 117 else 'H'),
+                                  f.read(1 if release == 117 else 2))[0]
+        f.read(label_len)
+        _read_tagged_offset(f, b'</label><timestamp>')
+        f.read(struct.unpack('B', f.read(1))[0])
+        _read_tagged_offset(f, b'</timestamp></header><map>')
+        section_map = struct.unpack(byteorder + 'Q' * 14, f.read(8 * 14))
+
+        # Variable types
+        f.seek(section_map[2])
+        _read_tagged_offset(f, b'<variable_types>')
+        typlist = list(struct.unpack(byteorder + 'H' * nvar, f.read(2 * nvar)))
+
+        # Variable names
+        encoding = 'latin-1' if release == 117 else 'utf-8'
+        name_len = 33 if release == 117 else 129
+        f.seek(section_map[3])
+        _read_tagged_offset(f, b'<varnames>')
+        varnames = [_decode_name(f.read(name_len), encoding) for _ in range(nvar)]
+
+        # Display formats (used to recognise date columns)
+        fmt_len = 49 if release == 117 else 57
+        f.seek(section_map[5])
+        _read_tagged_offset(f, b'<formats>')
+        fmtlist = [_decode_name(f.read(fmt_len), encoding) for _ in range(nvar)]
+
+        f.seek(section_map[9])
+        data_offset = _read_tagged_offset(f, b'<data>')
+
+    fields = []
+    for name, typ in zip(varnames, typlist):
+        if typ in STATA_TYPES:
+            fields.append((name, byteorder + STATA_TYPES[typ]))
+        elif typ == STRL_TYPE:
+            # strL values are (v,o) references into a separate section
+            fields.append((name, 'V8'))
+        elif 1 <= typ <= 2045:
+            fields.append((name, f'S{typ}'))
+        else:
+            raise ValueError(f"Unknown Stata type code {typ} for {name}.")
+
+    return DtaLayout(
+        release=release,
+        byteorder=byteorder,
+        nvar=nvar,
+        nobs=nobs,
+        data_offset=data_offset,
+        varnames=varnames,
+        typlist=typlist,
+        fmtlist=fmtlist,
+        dtype=np.dtype(fields)
+    )
+
+
+def _to_arrow(values: np.ndarray, typ: int, fmt: str, encoding: str, dtype: str = None) -> pa.Array:
+    """
+    Convert one raw column to Arrow, mapping Stata missing values to nulls.
+    A numeric `dtype` (from a dta_schema) is the column's type, otherwise it
+    keeps its Stata width.
+    """
+    _check_supported(typ)
+    if typ not in STATA_TYPES:
+        # Fixed-width string
+        return pa.array([v.split(b'\x00', 1)[0].decode(encoding) for v in values.tolist()])
+
+    code = STATA_TYPES[typ]
+    values = values.astype(values.dtype.newbyteorder('='), copy=False)
+    missing = values > MISSING_ABOVE[code]
+    if _is_date_format(fmt):
+        days = np.where(missing, 0, values).astype('int64') - STATA_EPOCH_OFFSET_DAYS
+        return pa.array(days.astype('datetime64[D]').astype('datetime64[ns]'), mask=missing)
+    if _is_datetime_format(fmt):
+        ms = np.where(missing, 0, values).astype('int64') - STATA_EPOCH_OFFSET_DAYS * 86400000
+        return pa.array(ms.astype('datetime64[ms]').astype('datetime64[ns]'), mask=missing)
+    if dtype is not None:
+        values = values.astype(dtype)
+    if not missing.any():
+        return pa.array(values)
+    return pa.array(values, mask=missing)
+
+
+def map_dta_records(dta_file_path: str, layout: DtaLayout, start: int = 0, stop: int = None) -> np.ndarray:
+    """
+    Rows [start, stop) as a read-only memory-mapped structured array. Nothing
+    is read until it is accessed, and each field (records[name]) is a strided
+    view of one column.
+    """
+    stop = layout.nobs if stop is None else min(stop, layout.nobs)
+    if stop <= start:
+        return np.empty(0, dtype=layout.dtype)
+    first_byte, _ = layout.byte_range(start, stop)
+    return np.memmap(dta_file_path, dtype=layout.dtype, mode='r', offset=first_byte, shape=(stop - start,))
+
+
+def decode_column(values: np.ndarray, typ: int, fmt: str, encoding: str, dtype: str = None) -> np.ndarray:
+    """
+    Decode one raw (possibly strided) column into a contiguous NumPy array
+    with the types pd.read_stata(convert_categoricals=False) returns: Stata
+    widths are kept, integer columns with missing values become float64 and
+    missing values are NaN (NaT for dates).
+
+    A numeric `dtype` (from a dta_schema) is converted to directly from the
+    storage type instead; missing values are NaN.
+    """
+    _check_supported(typ)
+    if typ not in STATA_TYPES:
+        # Fixed-width string
+        return np.array([v.split(b'\x00', 1)[0].decode(encoding) for v in values.tolist()], dtype=object)
+
+    code = STATA_TYPES[typ]
+    missing = values > MISSING_ABOVE[code]
+    is_date = _is_date_format(fmt) or _is_datetime_format(fmt)
+    if dtype is not None and not is_date:
+        # The only copy: strided field -> contiguous array of the schema type
+        decoded = values.astype(dtype)
+        if missing.any():
+            if decoded.dtype.kind != 'f':
+                raise ValueError(f"Missing values in a column typed {dtype}; the schema is out of date.")
+            decoded[missing] = np.nan
+        return decoded
+    # The only copy: strided field -> contiguous native-endian array
+    values = values.astype(values.dtype.newbyteorder('='))
+    if is_date:
+        unit, offset = ('D', STATA_EPOCH_OFFSET_DAYS) if _is_date_format(fmt) else ('ms', STATA_EPOCH_OFFSET_DAYS * 86400000)
+        dates = (np.where(missing, 0, values).astype('int64') - offset).astype(f'datetime64[{unit}]').astype('datetime64[ns]')
+        dates[missing] = np.datetime64('NaT')
+        return dates
+    if missing.any():
+        if code.startswith('i'):
+            values = values.astype('float64')
+        values[missing] = np.nan
+    return values
+
+
+def read_dta_columns(
+    dta_file_path: str,
+    layout: DtaLayout = None,
+    columns: list = None,
+    start: int = 0,
+    stop: int = None,
+    schema: dict = None
+    ) -> dict:
+    """
+    Decode `columns` (all if None) of rows [start, stop) into NumPy arrays,
+    by name. Only the requested columns are decoded; the others are never
+    converted. `schema` ({column: dtype}, see dta_schema.py) sets the types.
+    """
+    schema = schema or {}
+    layout = layout or read_dta_layout(dta_file_path)
+    records = map_dta_records(dta_file_path, layout, start, stop)
+    encoding = 'latin-1' if layout.release == 117 else 'utf-8'
+    columns = layout.varnames if columns is None else columns
+    decoded = {}
+    for name in columns:
+        i = layout.varnames.index(name)
+        decoded[name] = decode_column(
+            records[name], layout.typlist[i], layout.fmtlist[i], encoding, schema.get(name)
+        )
+    return decoded
+
+
+def read_dta_frame(
+    dta_file_path: str,
+    layout: DtaLayout = None,
+    columns: list = None,
+    start: int = 0,
+    stop: int = None,
+    schema: dict = None
+    ) -> pd.DataFrame:
+    """Rows [start, stop) as a DataFrame indexed by row number, like a pd.read_stata chunk."""
+    layout = layout or read_dta_layout(dta_file_path)
+    stop = layout.nobs if stop is None else min(stop, layout.nobs)
+    decoded = read_dta_columns(dta_file_path, layout, columns, start, stop, schema)
+    return pd.DataFrame(decoded, index=pd.RangeIndex(start, max(start, stop)), copy=False)
+
+
+def iter_dta_frames(
+    dta_file_path: str,
+    chunksize: int,
+    columns: list = None,
+    layout: DtaLayout = None,
+    min_date=None,
+    schema: dict = None
+    ):
+    """
+    Full scan in chunks of `chunksize` rows; a replacement for
+    pd.read_stata(chunksize=...). With min_date only rows with date > min_date
+    are returned: the date column is decoded first, and chunks without newer
+    rows are skipped without decoding anything else.
+    """
+    layout = layout or read_dta_layout(dta_file_path)
+    for start in range(0, layout.nobs, chunksize):
+        stop = min(start + chunksize, layout.nobs)
+        if min_date is None:
+            yield read_dta_frame(dta_file_path, layout, columns, start, stop, schema)
+            continue
+        newer = read_dta_columns(dta_file_path, layout, ['date'], start, stop)['date'] > np.datetime64(pd.Timestamp(min_date))
+        if newer.any():
+            chunk = read_dta_frame(dta_file_path, layout, columns, start, stop, schema)
+            yield chunk[newer]
+
+
+def read_dta_rows(
+    dta_file_path: str,
+    layout: DtaLayout,
+    start: int,
+    stop: int,
+    columns: list = None,
+    schema: dict = None
+    ) -> pa.Table:
+    """
+    Decode rows [start, stop) of a .dta file into an Arrow table, keeping only
+    `columns` (all columns if None). Integer columns keep their Stata width
+    (or take their `schema` type) and use nulls for missing values, so every
+    range decodes to the same schema.
+    """
+    schema = schema or {}
+    records = map_dta_records(dta_file_path, layout, start, stop)
+    encoding = 'latin-1' if layout.release == 117 else 'utf-8'
+    columns = layout.varnames if columns is None else columns
+    arrays = []
+    for name in columns:
+        i = layout.varnames.index(name)
+        arrays.append(_to_arrow(records[name], layout.typlist[i], layout.fmtlist[i], encoding, schema.get(name)))
+    return pa.Table.from_arrays(arrays, names=list(columns))
@@ -0,0 +1,160 @@
+"""
+Compact column types for a .dta file, inferred once per version of the file.
+
+read_stata (and a plain decode) widens every integer column with a missing
+value to float64, and callers then downcast column by column on every run.
+infer_dta_schema scans the file once instead and records, for each column,
+the narrowest type that holds all of its values:
+
+  integer values, no missing values   -> int8 / int16 / int32 / int64
+  integer values with missing values  -> float32 (exact up to 2**24), else float64
+  other floats                        -> float32 if every value survives the
+                                         round trip, else float64
+  dates                               -> datetime64[ns]
+  strings                             -> object
+
+The schema is saved as JSON next to the file (<file>_schema.json) together
+with the file's size and modification time, and is inferred again when they
+change. The readers in dta_reader.py apply it while decoding (schema=...), so
+each column is converted from its Stata storage type straight to its final
+type.
+"""
+import json
+import os
+
+import numpy as np
+
+from dta_reader import (
+    MISSING_ABOVE, STATA_TYPES, STRL_TYPE, DtaLayout, _is_date_format, _is_datetime_format,
+    map_dta_records, read_dta_layout
+)
+
+SCHEMA_FORMAT = 1
+
+# Rows per range scanned by infer_dta_schema
+INFER_CHUNKSIZE = 1_000_000
+
+# Integers in [-FLOAT32_EXACT, FLOAT32_EXACT] are exact in float32
+FLOAT32_EXACT = 2**24
+
+INTEGER_TYPES = ('int8', 'int16', 'int32', 'int64')
+
+
+def default_schema_path(dta_file_path: str) -> str:
+    return f"{os.path.splitext(dta_file_path)[0]}_schema.json"
+
+
+def source_signature(dta_file_path: str) -> dict:
+    stat = os.stat(dta_file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _update_stats(stats: dict, values: np.ndarray, code: str):
+    """Fold one range of a raw numeric column into its running stats."""
+    missing = values > MISSING_ABOVE[code]
+    valid = values[~missing].astype(values.dtype.newbyteorder('='))
+    stats['missing'] = stats['missing'] or bool(missing.any())
+    if not len(valid):
+        return
+    stats['min'] = min(stats['min'], valid.min().item())
+    stats['max'] = max(stats['max'], valid.max().item())
+    if code.startswith('f'):
+        if stats['integral']:
+            stats['integral'] = bool((valid == np.trunc(valid)).all())
+        if stats['float32'] and code == 'f8':
+            stats['float32'] = bool((valid.astype('float32') == valid).all())
+
+
+def _narrowest_type(stats: dict) -> str:
+    if stats['min'] > stats['max']:
+        # No non-missing values
+        return 'float32'
+    if stats['integral']:
+        if not stats['missing']:
+            for dtype in INTEGER_TYPES:
+                info = np.iinfo(dtype)
+                if info.min <= stats['min'] and stats['max'] <= info.max:
+                    return dtype
+        if -FLOAT32_EXACT <= stats['min'] and stats['max'] <= FLOAT32_EXACT:
+            return 'float32'
+        return 'float64'
+    return 'float32' if stats['float32'] else 'float64'
+
+
+def infer_dta_schema(
+    dta_file_path: str,
+    layout: DtaLayout = None,
+    chunksize: int = INFER_CHUNKSIZE
+    ) -> dict:
+    """Scan the file once and return {column: dtype name} for every column."""
+    layout = layout or read_dta_layout(dta_file_path)
+    numeric = {
+        name: STATA_TYPES[typ]
+        for name, typ, fmt in zip(layout.varnames, layout.typlist, layout.fmtlist)
+        if typ in STATA_TYPES and not (_is_date_format(fmt) or _is_datetime_format(fmt))
+    }
+    stats = {
+        name: {'min': np.inf, 'max': -np.inf, 'missing': False, 'integral': True, 'float32': True}
+        for name in numeric
+    }
+    for start in range(0, layout.nobs, chunksize):
+        records = map_dta_records(dta_file_path, layout, start, start + chunksize)
+        for name, code in numeric.items():
+            _update_stats(stats[name], records[name], code)
+
+    schema = {}
+    for name, typ in zip(layout.varnames, layout.typlist):
+        if name in numeric:
+            schema[name] = _narrowest_type(stats[name])
+        elif typ in STATA_TYPES:
+            schema[name] = 'datetime64[ns]'
+        elif typ != STRL_TYPE:
+            schema[name] = 'object'
+    return schema
+
+
+def save_dta_schema(schema: dict, schema_path: str, dta_file_path: str):
+    document = {
+        'format': SCHEMA_FORMAT,
+        'source': source_signature(dta_file_path),
+        'columns': schema,
+    }
+    with open(f"{schema_path}.tmp", 'w') as file:
+        json.dump(document, file, indent=2)
+    os.replace(f"{schema_path}.tmp", schema_path)
+
+
+def load_dta_schema(schema_path: str, dta_file_path: str) -> dict:
+    """The saved schema, or None if there is none or it was inferred from another version of the file."""
+    if not os.path.exists(schema_path):
+        return None
+    with open(schema_path, 'r') as file:
+        document = json.load(file)
+    if document.get('format') != SCHEMA_FORMAT or document.get('source') != source_signature(dta_file_path):
+        return None
+    return document['columns']
+
+
+def ensure_dta_schema(dta_file_path: str, schema_path: str = None) -> dict:
+    """Load the file's schema, inferring and saving it first if it is missing or stale."""
+    schema_path = schema_path or default_schema_path(dta_file_path)
+    schema = load_dta_schema(schema_path, dta_file_path)
+    if schema is None:
+        print(f"Inferring column types of {dta_file_path}...")
+        schema = infer_dta_schema(dta_file_path)
+        save_dta_schema(schema, schema_path, dta_file_path)
+        print(f"Saved column types to {schema_path}")
+    return schema
+
+
+if __name__ == "__main__":
+    import yaml
+
+    # Load config
+    with open('config.yml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    # Infer (or refresh) the schema of the configured .dta file
+    schema = ensure_dta_schema(config['dta_file_path'], config.get('dta_schema_path'))
+    for name, dtype in schema.items():
+        print(f"{name}: {dtype}")
@@ -1,5 +1,6 @@
 import yaml
-from ingest_utils import insert_recent_records_dta_to_sqlite
+from dta_schema import ensure_dta_schema
+from ingest_utils import insert_recent_records_dta_to_sqlite, refresh_wgt_groups
 
 def load_config(config_path):
     with open(config_path, 'r') as file:
@@ -14,11 +15,17 @@ if __name__ == "__main__":
     sqlite_file_path = config['sqlite_file_path']
     dev_table_name = config['dev_table_name']
     chunksize = config['chunksize']
+    # Compact column types, inferred once per version of the .dta file
+    schema = ensure_dta_schema(dta_file_path, config.get('dta_schema_path'))
 
     # Run ingest
-    insert_recent_records_dta_to_sqlite(
+    stats = insert_recent_records_dta_to_sqlite(
         dta_file_path, 
         sqlite_file_path, 
         dev_table_name, 
-        chunksize
+        chunksize,
+        schema
     )
+
+    # Rebuild groups for the months that received new records
+    refresh_wgt_groups(sqlite_file_path, dev_table_name, stats['months'])
@@ -1,46 +1,313 @@
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
+import os
+import shutil
 import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy import create_engine
 
+from dta_reader import iter_dta_frames, read_dta_layout, read_dta_rows
+
+# Raw columns used by the group and wage growth scripts in archive/python_scripts
+# (create_wgt_groups.py, unweighted_wgt_groups.py, weighted_wgt_groups.py).
+# The .dta file has 83 columns (see data/raw_column_names.txt); keeping only
+# these cuts conversion time and output size roughly by two thirds.
+WGT_COLUMNS = [
+    'personid', 'date', 'age76', 'female76', 'race76', 'censusdiv76',
+    'metstat78', 'educ92', 'employer89', 'recession76', 'weightern82',
+    'occupation76', 'occupation76_tm12', 'industry76', 'industry76_tm12',
+    'paidhrly82', 'paidhrly82_tm12', 'wageperhr82', 'wageperhr82_tm12',
+    'wageperhrclean82', 'wagegrowthtracker83', 'lfdetail94', 'lfdetail94_tm12',
+    'sameemployer94', 'sameemployer94_tm1', 'sameemployer94_tm2',
+    'sameactivities94', 'sameactivities94_tm1', 'sameactivities94_tm2'
+]
+
+SQL_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sqlite', 'scripts')
+
+# PRAGMAs applied for the duration of a bulk load. The database is rebuilt
+# from the .dta file if a load is interrupted, so durability is traded for speed.
+# WAL lets readers (wgt_service.py) keep reading committed data during a load.
+LOAD_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'cache_size': -1048576,  # negative = KiB, i.e. 1GB page cache
+    'temp_store': 'MEMORY'
+}
+
+# Format pandas.to_sql uses for datetimes over a plain sqlite3 connection
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value};")
+
+def _sqlite_type(dtype) -> str:
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+def _column_buffers(df: pd.DataFrame) -> list:
+    """
+    Convert each column to a list of Python values sqlite3 can bind directly,
+    with None for missing values. Done column-at-a-time with vectorized
+    conversions instead of walking the frame row by row.
+    """
+    buffers = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.strftime(SQLITE_DATETIME_FORMAT).to_numpy(dtype=object)
+        else:
+            values = series.to_numpy(dtype=object if series.hasnans else None)
+        if series.hasnans:
+            values[series.isna().to_numpy()] = None
+        buffers.append(values.tolist())
+    return buffers
+
+def _create_table(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame, temp: bool = False):
+    columns = ', '.join(f'"{col}" {_sqlite_type(df[col].dtype)}' for col in df.columns)
+    conn.execute(f"CREATE {'TEMP ' if temp else ''}TABLE {table_name} ({columns});")
+
+def _pop_indexes(conn: sqlite3.Connection, table_name: str, keep: tuple = ()) -> list:
+    """Drop the table's indexes (except `keep`) and return their CREATE statements."""
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL;",
+        (table_name,)
+    ).fetchall()
+    statements = []
+    for name, sql in indexes:
+        if name in keep:
+            continue
+        conn.execute(f"DROP INDEX {name};")
+        statements.append(sql)
+    return statements
+
+def bulk_insert_frame(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame) -> int:
+    """Insert a DataFrame with one prepared statement and executemany."""
+    columns = ', '.join(f'"{col}"' for col in df.columns)
+    placeholders = ', '.join(['?'] * len(df.columns))
+    conn.executemany(
+        f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders});",
+        zip(*_column_buffers(df))
+    )
+    return len(df)
+
+def bulk_load_dta_to_sqlite(
+    dta_file_path: str, 
+    sqlite_db_path: str, 
+    table_name: str, 
+    chunksize: int,
+    mode: str = 'append',
+    min_date=None,
+    pragmas: dict = LOAD_PRAGMAS,
+    schema: dict = None
+    ) -> dict:
+    """
+    Bulk load a .dta file into SQLite.
+
+    mode='replace' recreates the table, 'append' inserts rows and 'upsert'
+    loads each chunk into a staging table and merges it with one
+    INSERT ... SELECT ... ON CONFLICT(obsid) statement. Only rows with
+    date > min_date are loaded if min_date is given. `schema` (see
+    dta_schema.py) sets the column types, so every chunk is decoded to the
+    same compact types.
+
+    Existing indexes are dropped for the load and recreated at the end (the
+    unique obsid index needed by upserts is kept). Returns row count, elapsed
+    seconds, rows per second and the 'YYYY-MM' months that received rows
+    (pass those to refresh_wgt_groups).
+    """
+    if mode not in ('replace', 'append', 'upsert'):
+        raise ValueError(f"Unknown load mode '{mode}'.")
+
+    conn = sqlite3.connect(sqlite_db_path)
+    apply_pragmas(conn, pragmas)
+    obsid_index = f"idx_{table_name}_obsid"
+    table_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)
+    ).fetchone() is not None
+
+    # Defer index maintenance until all rows are in
+    deferred_indexes = []
+    if table_exists:
+        deferred_indexes = _pop_indexes(conn, table_name, keep=(obsid_index,) if mode == 'upsert' else ())
+        if mode == 'replace':
+            conn.execute(f"DROP TABLE {table_name};")
+            table_exists = False
+    conn.commit()
+
+    start_time = time.perf_counter()
+    rows_processed = 0
+    months = set()
+    staging_name = f"{table_name}_staging"
+    try:
+        for chunk in iter_dta_frames(dta_file_path, chunksize, min_date=min_date, schema=schema):
+            if chunk.empty:
+                continue
+            if not table_exists:
+                _create_table(conn, table_name, chunk)
+                table_exists = True
+            if mode == 'upsert':
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {obsid_index} ON {table_name}(obsid);")
+                conn.execute(f"DROP TABLE IF EXISTS temp.{staging_name};")
+                _create_table(conn, staging_name, chunk, temp=True)
+                bulk_insert_frame(conn, staging_name, chunk)
+                columns = ', '.join(f'"{col}"' for col in chunk.columns)
+                updates = ', '.join(f'"{col}" = excluded."{col}"' for col in chunk.columns if col != 'obsid')
+                # "WHERE true" resolves the parsing ambiguity between a join's ON and the upsert's ON
+                conn.execute(f"""
+                    INSERT INTO {table_name} ({columns})
+                    SELECT {columns} FROM temp.{staging_name} WHERE true
+                    ON CONFLICT(obsid) DO UPDATE SET {updates};
+                """)
+                conn.execute(f"DROP TABLE temp.{staging_name};")
+            else:
+                bulk_insert_frame(conn, table_name, chunk)
+            conn.commit()
+            months.update(chunk['date'].dt.strftime('%Y-%m').dropna().unique())
+            rows_processed += len(chunk)
+            elapsed = time.perf_counter() - start_time
+            print(f"{rows_processed} rows processed ({rows_processed / elapsed:,.0f} rows/s).")
+    except BaseException:
+        # Keep the committed chunks; only the one in progress is lost
+        conn.rollback()
+        raise
+    finally:
+        # Restore the indexes even if the load fails partway (a rolled back
+        # first chunk of a replace load also rolls back the new table)
+        table_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)
+        ).fetchone() is not None
+        if deferred_indexes and table_exists:
+            print(f"Rebuilding {len(deferred_indexes)} indexes...")
+            for sql in deferred_indexes:
+                conn.execute(sql)
+            conn.commit()
+        conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        'rows': rows_processed,
+        'seconds': elapsed,
+        'rows_per_second': rows_processed / elapsed if elapsed else 0.0,
+        'months': sorted(months)
+    }
+    print(f"Loaded {rows_processed} rows into {table_name} in {elapsed:.1f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s).")
+    return stats
+
+################################################################################
+################################################################################
+
+def rebuild_wgt_table(sqlite_db_path: str, table_name: str):
+    """
+    Rebuild cps_wgt (see sqlite_schema.py) after a replace or upsert load of
+    the ingest table it was built from, which can change rows in any month.
+    Does nothing if cps_wgt has not been built yet or mirrors another table.
+    """
+    from sqlite_schema import SOURCE_TABLE, WGT_TABLE, build_wgt_table, wgt_source_table, wgt_table_exists
+
+    conn = sqlite3.connect(sqlite_db_path)
+    exists = wgt_table_exists(conn)
+    # cps_wgt built before its source was recorded was copied from SOURCE_TABLE
+    source_table = wgt_source_table(conn) or SOURCE_TABLE
+    conn.close()
+    if exists and source_table == table_name:
+        print(f"Rebuilding {WGT_TABLE} from {table_name}...")
+        build_wgt_table(sqlite_db_path, source_table=table_name)
+
+################################################################################
+################################################################################
+
+def refresh_wgt_groups(sqlite_db_path: str, table_name: str, months: list):
+    """
+    Recompute wgt_groups for the given 'YYYY-MM' months only, in a single
+    transaction. Groups and wage quartiles are per-month, so the other months
+    are unaffected by an ingest and are left alone. The months' rows are
+    first copied from the ingest table `table_name` into cps_wgt (see
+    sqlite_schema.py), which must be the table cps_wgt was built from.
+    """
+    from sqlite_schema import SOURCE_TABLE, WGT_TABLE, refresh_wgt_table, wgt_source_table, wgt_table_exists
+
+    if not months:
+        print("No months to refresh.")
+        return
+    conn = sqlite3.connect(sqlite_db_path)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'wgt_groups';").fetchone() is None:
+        print("wgt_groups does not exist yet; run sqlite/scripts/create_wgt_groups.sql first.")
+        conn.close()
+        return
+    if not wgt_table_exists(conn):
+        print(f"{WGT_TABLE} does not exist yet; run ingest/sqlite_schema.py first.")
+        conn.close()
+        return
+    # cps_wgt built before its source was recorded was copied from SOURCE_TABLE
+    source_table = wgt_source_table(conn) or SOURCE_TABLE
+    if source_table != table_name:
+        print(f"{WGT_TABLE} was built from {source_table}, not {table_name}; not refreshed.")
+        conn.close()
+        return
+
+    # The old per-row rebuild trigger must not fire on later inserts
+    conn.execute("DROP TRIGGER IF EXISTS update_wgt_groups;")
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS refresh_months "
+        "(date_monthly INTEGER PRIMARY KEY, month_start TEXT, month_end TEXT);"
+    )
+    conn.execute("DELETE FROM temp.refresh_months;")
+    month_starts = pd.to_datetime(pd.Series(sorted(months)), format='%Y-%m')
+    conn.executemany(
+        "INSERT INTO temp.refresh_months VALUES (?, ?, ?);",
+        zip(
+            month_starts.dt.strftime('%Y%m').astype(int),
+            month_starts.dt.strftime('%Y-%m-%d'),
+            (month_starts + pd.offsets.MonthBegin(1)).dt.strftime('%Y-%m-%d')
+        )
+    )
+    conn.commit()
+    rows = refresh_wgt_table(conn, table_name)
+    print(f"Copied {rows} rows of {len(months)} months into {WGT_TABLE}.")
+
+    with open(os.path.join(SQL_SCRIPTS_DIR, 'refresh_wgt_groups.sql'), 'r') as file:
+        conn.executescript(file.read())
+    conn.close()
+    print(f"Refreshed wgt_groups for {len(months)} months ({months[0]} to {months[-1]}).")
+
+################################################################################
+################################################################################
+
 def insert_recent_records_dta_to_sqlite(
     dta_file_path: str, 
     sqlite_db_path: str, 
     table_name: str, 
-    chunksize: int
+    chunksize: int,
+    schema: dict = None
     ):
     """
     Check table for most recent records and only insert new records. 
     The assumption in this approach is that old records are static.
     """
-    # Connect to SQLite database
-    conn = sqlite3.connect(sqlite_db_path)
-    cursor = conn.cursor()
-
     # Find date of most recent record
+    conn = sqlite3.connect(sqlite_db_path)
     sql = f"SELECT MAX(date) FROM {table_name};"
-    cursor.execute(sql)
-    result = cursor.fetchone()[0]
+    result = conn.execute(sql).fetchone()[0]
+    conn.close()
     most_recent_record = pd.to_datetime(result)
     print(f"Most recent record: {most_recent_record}")
 
-    # Process chunks
-    rows_processed = 0
-    for chunk in pd.read_stata(dta_file_path, chunksize=chunksize, convert_categoricals=False):
-        # Filter chunk to only new records
-        chunk = chunk[chunk['date'] > most_recent_record]
-        if chunk.empty:
-            print("No new records in chunk, continuing...")
-            continue
-        else:
-            print(f"New records found. Processing {len(chunk)} new records...")
-        # Append new records
-        chunk.to_sql(table_name, con=conn, if_exists='append', index=False)
-        rows_processed += len(chunk)
-        print(f"{rows_processed} records processed.")
-    # Close connection
-    conn.close()
+    # Append new records
+    return bulk_load_dta_to_sqlite(
+        dta_file_path, sqlite_db_path, table_name, chunksize,
+        mode='append', min_date=most_recent_record, schema=schema
+    )
 
 ################################################################################
 ################################################################################
@@ -49,33 +316,14 @@ def upsert_dta_to_sqlite(
     dta_file_path: str, 
     sqlite_db_path: str, 
     table_name: str, 
-    chunksize: int
+    chunksize: int,
+    schema: dict = None
     ):
-    # Connect to SQLite database
-    conn = sqlite3.connect(sqlite_db_path)
-    cursor = conn.cursor()
-
-    rows_processed = 0
-    for chunk in pd.read_stata(dta_file_path, chunksize=chunksize, convert_categoricals=False):
-        # Dynamically create column names part and placeholders for VALUES
-        columns = ', '.join(chunk.columns)
-        placeholders = ', '.join(['?'] * len(chunk.columns))
-        # Upsert statement
-        upsert_sql = f"""
-            INSERT INTO {table_name} ({columns})
-            VALUES ({placeholders})
-            ON CONFLICT(obsid) DO UPDATE SET
-            {', '.join([f"{col}=excluded.{col}" for col in chunk.columns if col != 'obsid'])};
-        """
-        # Execute statement for each row
-        for row in chunk.itertuples(index=False, name=None):
-            cursor.execute(upsert_sql, row)
-        # Commit changes
-        conn.commit()
-        rows_processed += chunksize
-        print(f"{rows_processed} rows processed.")
-    # Close connection
-    conn.close()
+    stats = bulk_load_dta_to_sqlite(
+        dta_file_path, sqlite_db_path, table_name, chunksize, mode='upsert', schema=schema
+    )
+    rebuild_wgt_table(sqlite_db_path, table_name)
+    return stats
 
 ################################################################################
 ################################################################################
@@ -84,30 +332,17 @@ def dta_to_sqlite(
     dta_file_path: str, 
     sqlite_db_path: str, 
     table_name: str, 
-    chunksize: int
+    chunksize: int,
+    schema: dict = None
     ):
-    # Create a database connection
-    engine = create_engine(f'sqlite:///{sqlite_db_path}')
-    
-    # Initialize a variable to track whether the table is created
-    table_created = False
-
-    # Read the .dta file in chunks
-    # Note: without convert_categoricals=False, read_stata converts numerical columns
-    # based on some info inside the .dta file
-    rows_processed = 0
-    for chunk in pd.read_stata(dta_file_path, chunksize=chunksize, convert_categoricals=False):
-        if not table_created:
-            # If table doesn't exist, create it
-            chunk.to_sql(table_name, con=engine, if_exists='replace', index=False)
-            table_created = True
-        else:
-            # Append subsequent chunks to the table
-            chunk.to_sql(table_name, con=engine, if_exists='append', index=False)
-        rows_processed += chunksize
-        print(f"{rows_processed} rows processed.")
-    
+    # Note: the bulk loader keeps the numeric codes (like read_stata with
+    # convert_categoricals=False); value labels are not applied
+    stats = bulk_load_dta_to_sqlite(
+        dta_file_path, sqlite_db_path, table_name, chunksize, mode='replace', schema=schema
+    )
     print(f"Data has been successfully loaded into the {table_name} table in the SQLite database.")
+    rebuild_wgt_table(sqlite_db_path, table_name)
+    return stats
 
 ################################################################################
 ################################################################################
@@ -151,10 +386,11 @@ def dta_to_parquet(
     parquet_file_path: str,
     chunksize: int,
     table_schema=None,
-    writer=None
+    writer=None,
+    schema: dict = None
     ):
     try:
-        for i,chunk in enumerate(pd.read_stata(dta_file_path, chunksize=1000000, convert_categoricals=False)):
+        for i,chunk in enumerate(iter_dta_frames(dta_file_path, chunksize, schema=schema)):
             print(f"Processing chunk #{i+1}...")
 
             table = pa.Table.from_pandas(chunk)
@@ -177,4 +413,125 @@ def dta_to_parquet(
         if writer:
             writer.close()
 
-    print("Conversion to Parquet completed.")
\ No newline at end of file
+    print("Conversion to Parquet completed.")
+
+################################################################################
+################################################################################
+
+def _convert_dta_range(args):
+    """
+    Worker for dta_to_parquet_parallel: decode one row range and write it as
+    one file, or as one file per month under year=YYYY/month=M/ if partitioned.
+    """
+    dta_file_path, layout, start, stop, columns, parquet_dir_path, i, partition_by_month, schema = args
+    table = read_dta_rows(dta_file_path, layout, start, stop, columns, schema)
+    if not partition_by_month:
+        part_path = os.path.join(parquet_dir_path, f"part-{i:05d}.parquet")
+        pq.write_table(table, part_path, row_group_size=stop - start, compression='snappy')
+        return table.num_rows
+
+    table = table.append_column('year', pc.year(table['date']).cast(pa.int16()))
+    table = table.append_column('month', pc.month(table['date']).cast(pa.int8()))
+    pq.write_to_dataset(
+        table,
+        parquet_dir_path,
+        partition_cols=['year', 'month'],
+        basename_template=f"range-{i:05d}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        compression='snappy'
+    )
+    return table.num_rows
+
+def _compact_month_partition(partition_path: str) -> int:
+    """Merge a month's range files into one file sorted by personid."""
+    range_files = sorted(
+        os.path.join(partition_path, name) for name in os.listdir(partition_path)
+        if name.startswith('range-')
+    )
+    table = pa.concat_tables([pq.read_table(path) for path in range_files])
+    table = table.sort_by([('personid', 'ascending')])
+    pq.write_table(table, os.path.join(partition_path, 'part-0.parquet'), compression='snappy')
+    for path in range_files:
+        os.remove(path)
+    return table.num_rows
+
+def dta_to_parquet_parallel(
+    dta_file_path: str, 
+    parquet_dir_path: str,
+    chunksize: int,
+    columns: list = None,
+    workers: int = None,
+    partition_by_month: bool = False,
+    schema: dict = None
+    ):
+    """
+    Convert a .dta file to a Parquet dataset (a directory of part files) using
+    a process pool. Records in a Stata 13+ file are fixed-width, so the data
+    section is split into byte ranges of `chunksize` rows; each worker decodes
+    its range straight from the file and writes it as one row group.
+    Part files are numbered in row order, so reading the directory returns
+    rows in the same order as the .dta file.
+
+    With `partition_by_month`, the dataset is Hive-partitioned by
+    year=YYYY/month=M instead, with one file per month sorted by personid,
+    so readers can skip whole months (see archive/python_scripts/cps_io.py).
+
+    `columns` limits the output to a subset of columns (e.g. WGT_COLUMNS);
+    `workers` defaults to the number of CPUs. `schema` (see dta_schema.py)
+    writes each column in its compact type instead of its Stata storage type.
+
+    The dataset is written to a temporary directory next to parquet_dir_path
+    and replaces whatever was there only once it is complete, so no part
+    files of an earlier run (another chunksize or layout, months no longer in
+    the source) are left behind, and a failed run leaves the old dataset.
+    """
+    layout = read_dta_layout(dta_file_path)
+    if columns is not None:
+        unknown = [col for col in columns if col not in layout.varnames]
+        if unknown:
+            raise ValueError(f"Columns not in {dta_file_path}: {unknown}")
+        if partition_by_month and not {'date', 'personid'} <= set(columns):
+            raise ValueError("Partitioning by month requires the 'date' and 'personid' columns.")
+    print(f"{layout.nobs} rows, {layout.nvar} columns, {layout.record_width} bytes per row.")
+
+    parent_dir = os.path.dirname(os.path.abspath(parquet_dir_path))
+    os.makedirs(parent_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(parquet_dir_path)}.tmp-", dir=parent_dir)
+    tasks = [
+        (dta_file_path, layout, start, min(start + chunksize, layout.nobs), columns,
+         build_dir, i, partition_by_month, schema)
+        for i, start in enumerate(range(0, layout.nobs, chunksize))
+    ]
+
+    rows_processed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rows in executor.map(_convert_dta_range, tasks):
+                rows_processed += rows
+                print(f"{rows_processed} rows processed.")
+
+            if partition_by_month:
+                partitions = sorted(
+                    root for root, _, files in os.walk(build_dir)
+                    if any(name.startswith('range-') for name in files)
+                )
+                print(f"Sorting {len(partitions)} month partitions by personid...")
+                list(executor.map(_compact_month_partition, partitions))
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    # Swap the new dataset in; the old one is moved aside first since a
+    # non-empty directory cannot be replaced in one step
+    if os.path.lexists(parquet_dir_path):
+        old_path = f"{build_dir}.old"
+        os.replace(parquet_dir_path, old_path)
+        os.replace(build_dir, parquet_dir_path)
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path)
+        else:
+            os.remove(old_path)
+    else:
+        os.replace(build_dir, parquet_dir_path)
+
+    print(f"Conversion to Parquet completed: {len(tasks)} ranges in {parquet_dir_path}.")
@@ -0,0 +1,146 @@
+"""
+Run the SQL group pipeline (sqlite/scripts/create_wgt_groups.sql, then
+create_wgt_unweighted.sql) on the backend named by `sql_backend` in
+config.yml:
+
+  sqlite  (default) the cps_wgt table in sqlite_file_path, built from the
+          table loaded by create_and_fill_cps.py (see sqlite_schema.py)
+  duckdb  the Parquet output of convert_to_parquet.py (parquet_path), read
+          in place by DuckDB, an in-process columnar engine. wgt_groups and
+          wgt_unweighted are written to duckdb_file_path.
+
+Both run the same scripts. The DuckDB view casts the Parquet columns to
+what cps_wgt stores (the date as 'YYYY-MM-DD HH:MM:SS' text, integer codes
+as BIGINT, the rest as DOUBLE; see duckdb_source_sql), so the tables have
+the same values and column types on both backends. DuckDB scans only the
+columns the scripts use and runs the window functions on every core.
+"""
+import os
+import re
+import sqlite3
+import time
+
+import yaml
+
+from sqlite_schema import WGT_TABLE, build_wgt_table, column_affinity, wgt_columns, wgt_table_current
+
+SQL_BACKENDS = ('sqlite', 'duckdb')
+DEFAULT_SQL_BACKEND = 'sqlite'
+
+SQL_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sqlite', 'scripts')
+WGT_SQL_SCRIPTS = ('create_wgt_groups.sql', 'create_wgt_unweighted.sql')
+WGT_TABLES = ('wgt_groups', 'wgt_unweighted')
+
+
+def load_config(config_path):
+    with open(config_path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def read_sql_script(filename: str) -> str:
+    with open(os.path.join(SQL_SCRIPTS_DIR, filename), 'r') as file:
+        return file.read()
+
+
+def duckdb_sql(text: str) -> str:
+    """
+    Translate the SQLite dialect of the scripts for DuckDB: SQLite's
+    null-safe `a is not b` is `a is distinct from b`. (DuckDB accepts `==`
+    as it is, and divides integers like SQLite with integer_division set.)
+    """
+    return re.sub(r"\bis not (?!null\b)", "is distinct from ", text, flags=re.I)
+
+
+def parquet_source(parquet_path: str) -> str:
+    """read_parquet() argument for a Parquet file or a (partitioned) dataset directory."""
+    if os.path.isdir(parquet_path):
+        return os.path.join(parquet_path, '**', '*.parquet')
+    return parquet_path
+
+
+def create_wgt_tables_sqlite(sqlite_db_path: str) -> dict:
+    """Rebuild wgt_groups and wgt_unweighted in the SQLite database."""
+    conn = sqlite3.connect(sqlite_db_path)
+    # Rebuilt if the ingest table was reloaded since (see sqlite_schema.py)
+    if not wgt_table_current(conn):
+        build_wgt_table(sqlite_db_path)
+    timings = {}
+    for table in reversed(WGT_TABLES):
+        conn.execute(f"DROP TABLE IF EXISTS {table};")
+    for table, script in zip(WGT_TABLES, WGT_SQL_SCRIPTS):
+        start_time = time.time()
+        conn.executescript(read_sql_script(script))
+        conn.commit()
+        timings[table] = time.time() - start_time
+        print(f"Created {table} in {timings[table]:.1f} seconds.")
+    conn.close()
+    return timings
+
+
+def duckdb_source_sql(parquet_path: str) -> str:
+    """
+    SELECT for the cps_wgt view over the Parquet source, with each column
+    cast to the type SQLite stores it as in cps_wgt (sqlite_schema.py).
+    """
+    duckdb_types = {'INTEGER': 'BIGINT', 'REAL': 'DOUBLE'}
+    selected = []
+    for col in wgt_columns():
+        if col == 'date_monthly':
+            selected.append("CAST(year(date) * 100 + month(date) AS BIGINT) AS date_monthly")
+        elif col == 'date':
+            # The SQLite loader stores pandas timestamps as text
+            selected.append("strftime(date, '%Y-%m-%d %H:%M:%S') AS date")
+        else:
+            selected.append(f"CAST({col} AS {duckdb_types[column_affinity(col)]}) AS {col}")
+    return (
+        f"SELECT {', '.join(selected)} "
+        f"FROM read_parquet('{parquet_source(parquet_path)}', hive_partitioning = false)"
+    )
+
+
+def create_wgt_tables_duckdb(parquet_path: str, duckdb_db_path: str, threads: int = None) -> dict:
+    """Build wgt_groups and wgt_unweighted in a DuckDB database from the Parquet source."""
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("sql_backend: duckdb requires the duckdb package (see requirements.txt).")
+
+    conn = duckdb.connect(duckdb_db_path)
+    conn.execute("SET enable_progress_bar = false;")
+    conn.execute("SET integer_division = true;")
+    if threads:
+        conn.execute(f"SET threads = {int(threads)};")
+    # The scripts read cps_wgt by name; the view scans the Parquet files in place
+    conn.execute(f"CREATE OR REPLACE VIEW {WGT_TABLE} AS {duckdb_source_sql(parquet_path)};")
+    timings = {}
+    for table in reversed(WGT_TABLES):
+        conn.execute(f"DROP TABLE IF EXISTS {table};")
+    for table, script in zip(WGT_TABLES, WGT_SQL_SCRIPTS):
+        start_time = time.time()
+        conn.execute(duckdb_sql(read_sql_script(script)))
+        timings[table] = time.time() - start_time
+        print(f"Created {table} in {timings[table]:.1f} seconds.")
+    conn.close()
+    return timings
+
+
+def create_wgt_tables(config: dict) -> dict:
+    """Build wgt_groups and wgt_unweighted on the backend selected in config."""
+    backend = config.get('sql_backend', DEFAULT_SQL_BACKEND)
+    if backend not in SQL_BACKENDS:
+        raise ValueError(f"Unknown sql_backend {backend!r}; expected one of {SQL_BACKENDS}")
+    print(f"Creating {', '.join(WGT_TABLES)} with {backend}...")
+    if backend == 'duckdb':
+        return create_wgt_tables_duckdb(
+            config['parquet_path'], config['duckdb_file_path'], config.get('duckdb_threads')
+        )
+    return create_wgt_tables_sqlite(config['sqlite_file_path'])
+
+
+if __name__ == "__main__":
+    # Load config
+    config_path = 'config.yml'
+    config = load_config(config_path)
+
+    # Run the SQL pipeline
+    create_wgt_tables(config)
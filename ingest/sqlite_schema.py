@@ -0,0 +1,179 @@
+"""
+Query-optimized copy of the CPS table for the SQL group pipeline.
+
+The ingest table (cps_harmonized_longitudinally_matched) is a rowid table
+with all 83 .dta columns and the date stored as text, so every script that
+groups by month has to call strftime() on every row. cps_wgt, which the
+scripts in sqlite/scripts read instead, has:
+  - only the columns the group scripts use (WGT_COLUMNS), with explicit
+    INTEGER / REAL / TEXT affinities
+  - date_monthly as an integer yyyymm, computed once when rows are copied
+  - no rowid: the primary key (date_monthly, personid) is the table's
+    B-tree, so a month's rows are stored together
+  - a partial covering index on the scripts' predicate
+    (age76 >= 16 and wagegrowthtracker83 is not null), so the scripts read
+    the few percent of rows with a wage growth observation from the index
+    instead of scanning the table
+  - ANALYZE statistics, so the planner knows the partial index is the
+    smaller one
+
+cps_wgt_meta records the ingest table cps_wgt was copied from with its row
+count and latest date at that time. The loaders that replace or upsert the
+ingest table rebuild cps_wgt (see ingest_utils.py), and sql_backend.py
+rebuilds it whenever the recorded count or date no longer match.
+
+    python sqlite_schema.py        # (re)build cps_wgt from the ingest table (config.yml)
+"""
+import sqlite3
+import time
+
+import yaml
+
+from ingest_utils import LOAD_PRAGMAS, WGT_COLUMNS, apply_pragmas
+
+SOURCE_TABLE = 'cps_harmonized_longitudinally_matched'
+WGT_TABLE = 'cps_wgt'
+WGT_INDEX = 'idx_cps_wgt_observations'
+WGT_META_TABLE = 'cps_wgt_meta'
+
+# Affinities of WGT_COLUMNS; the others are integer codes
+REAL_COLUMNS = ('weightern82', 'wageperhr82', 'wageperhr82_tm12', 'wageperhrclean82', 'wagegrowthtracker83')
+TEXT_COLUMNS = ('date',)
+
+# Rows the group scripts read (create_wgt_groups.sql, create_wgt_unweighted.sql)
+WGT_PREDICATE = 'age76 >= 16 and wagegrowthtracker83 is not null'
+# Columns the scripts never read, left out of the covering index
+UNCOVERED_COLUMNS = ('weightern82', 'wageperhrclean82')
+
+
+def load_config(config_path):
+    with open(config_path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def column_affinity(column: str) -> str:
+    if column in REAL_COLUMNS:
+        return 'REAL'
+    if column in TEXT_COLUMNS:
+        return 'TEXT'
+    return 'INTEGER'
+
+
+def wgt_columns() -> list:
+    """Columns of cps_wgt in table order: the key, then the rest of WGT_COLUMNS."""
+    return ['date_monthly', 'personid'] + [col for col in WGT_COLUMNS if col != 'personid']
+
+
+def create_wgt_table_sql(table: str = WGT_TABLE) -> str:
+    columns = ',\n'.join(
+        f"\t{col} {column_affinity(col)}{' NOT NULL' if col in ('date_monthly', 'personid', 'date') else ''}"
+        for col in wgt_columns()
+    )
+    return f"CREATE TABLE {table} (\n{columns},\n\tPRIMARY KEY (date_monthly, personid)\n) WITHOUT ROWID;"
+
+
+def create_wgt_index_sql(table: str = WGT_TABLE, index: str = WGT_INDEX) -> str:
+    # Index entries of a WITHOUT ROWID table carry the primary key, so
+    # (date_monthly, personid) need not be listed again
+    covered = [col for col in wgt_columns()[2:] if col not in UNCOVERED_COLUMNS]
+    return f"CREATE INDEX {index} ON {table} (date_monthly, {', '.join(covered)}) WHERE {WGT_PREDICATE};"
+
+
+def copy_rows_sql(table: str = WGT_TABLE, source: str = f"{SOURCE_TABLE} c") -> str:
+    """INSERT ... SELECT from the ingest table (aliased c in `source`), in primary key order."""
+    columns = wgt_columns()
+    selected = ["cast(strftime('%Y%m', c.date) as integer)"] + [f"c.{col}" for col in columns[1:]]
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)})\n"
+        f"SELECT {', '.join(selected)}\nFROM {source}\nORDER BY 1, 2;"
+    )
+
+
+def build_wgt_table(
+    sqlite_db_path: str,
+    source_table: str = SOURCE_TABLE,
+    table: str = WGT_TABLE,
+    pragmas: dict = LOAD_PRAGMAS
+    ) -> int:
+    """(Re)create cps_wgt from the ingest table, index it and ANALYZE. Returns rows copied."""
+    start_time = time.perf_counter()
+    conn = sqlite3.connect(sqlite_db_path)
+    apply_pragmas(conn, pragmas)
+    conn.execute(f"DROP TABLE IF EXISTS {table};")
+    conn.execute(create_wgt_table_sql(table))
+    rows = conn.execute(copy_rows_sql(table, f"{source_table} c")).rowcount
+    conn.commit()
+    print(f"Copied {rows} rows into {table} in {time.perf_counter() - start_time:.1f}s.")
+    conn.execute(create_wgt_index_sql(table))
+    conn.execute(f"ANALYZE {table};")
+    record_wgt_source(conn, source_table)
+    conn.close()
+    print(f"Built {table} in {time.perf_counter() - start_time:.1f}s.")
+    return rows
+
+
+def refresh_wgt_table(conn: sqlite3.Connection, source_table: str = SOURCE_TABLE, table: str = WGT_TABLE) -> int:
+    """
+    Replace the rows of the months in temp.refresh_months (see
+    refresh_wgt_groups in ingest_utils.py) with the ingest table's current
+    rows. Returns rows copied.
+    """
+    conn.execute(f"DELETE FROM {table} WHERE date_monthly IN (SELECT date_monthly FROM temp.refresh_months);")
+    # Month ranges on the text date can use the ingest table's idx_date
+    rows = conn.execute(copy_rows_sql(
+        table,
+        f"temp.refresh_months r\nJOIN {source_table} c ON c.date >= r.month_start AND c.date < r.month_end"
+    )).rowcount
+    conn.commit()
+    record_wgt_source(conn, source_table)
+    return rows
+
+
+def wgt_table_exists(conn: sqlite3.Connection, table: str = WGT_TABLE) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,)
+    ).fetchone() is not None
+
+
+def source_stamp(conn: sqlite3.Connection, source_table: str = SOURCE_TABLE) -> tuple:
+    """(row count, latest date) of the ingest table."""
+    rows, max_date = conn.execute(f"SELECT count(*), max(date) FROM {source_table};").fetchone()
+    return rows, max_date
+
+
+def record_wgt_source(conn: sqlite3.Connection, source_table: str = SOURCE_TABLE):
+    """Record the ingest table cps_wgt now mirrors (see wgt_table_current)."""
+    rows, max_date = source_stamp(conn, source_table)
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {WGT_META_TABLE} (source_table TEXT, source_rows INTEGER, source_max_date TEXT);"
+    )
+    conn.execute(f"DELETE FROM {WGT_META_TABLE};")
+    conn.execute(f"INSERT INTO {WGT_META_TABLE} VALUES (?, ?, ?);", (source_table, rows, max_date))
+    conn.commit()
+
+
+def wgt_source_table(conn: sqlite3.Connection) -> str:
+    """Ingest table cps_wgt was built from (None if not recorded)."""
+    if not wgt_table_exists(conn, WGT_META_TABLE):
+        return None
+    row = conn.execute(f"SELECT source_table FROM {WGT_META_TABLE};").fetchone()
+    return row[0] if row else None
+
+
+def wgt_table_current(conn: sqlite3.Connection, source_table: str = SOURCE_TABLE) -> bool:
+    """cps_wgt exists and the ingest table has the row count and latest date it was built from."""
+    if not wgt_table_exists(conn) or not wgt_table_exists(conn, WGT_META_TABLE):
+        return False
+    recorded = conn.execute(
+        f"SELECT source_table, source_rows, source_max_date FROM {WGT_META_TABLE};"
+    ).fetchone()
+    return recorded is not None and recorded == (source_table, *source_stamp(conn, source_table))
+
+
+if __name__ == "__main__":
+    # Load config
+    config_path = 'config.yml'
+    config = load_config(config_path)
+
+    # Build the query table
+    build_wgt_table(config['sqlite_file_path'])
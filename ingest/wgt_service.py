@@ -0,0 +1,308 @@
+"""
+Read-only HTTP/JSON service over the SQLite database, for the dashboard and
+ad-hoc queries.
+
+    python wgt_service.py        # serve sqlite_file_path (config.yml) on service_host:service_port
+
+Endpoints (GET):
+  /health                        the database's current data version
+  /dimensions                    group columns of wgt_unweighted and their values
+  /series?<group>=<value>&...    monthly median, p25, p75, mean and n of
+                                 wagegrowthtracker83 over the rows matching every
+                                 filter, e.g. /series?edgroup3=Bachelor%2B&gengroup=Female.
+                                 A group given twice matches either value.
+
+The database is switched to WAL mode, so a load (ingest_new.py) commits while
+readers keep reading the last committed snapshot instead of waiting for the
+writer. Requests share a pool of read-only connections. Responses are cached
+in memory by request and data version and carry an ETag made of the same two,
+so a repeated chart load is answered from memory, or with 304 Not Modified if
+the client already has it, until the next commit. The data version is a
+checksum of wgt_unweighted taken once at startup, so it (and every ETag) is
+the same after a restart while the data is, plus a generation that goes up
+whenever PRAGMA data_version reports a commit by another connection.
+"""
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+import yaml
+
+SERIES_TABLE = 'wgt_unweighted'
+VALUE_COLUMN = 'wagegrowthtracker83'
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8050
+DEFAULT_POOL_SIZE = 4
+# Responses kept in memory (least recently used are dropped)
+DEFAULT_CACHE_ENTRIES = 256
+
+
+def load_config(config_path):
+    with open(config_path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def enable_wal(sqlite_db_path: str) -> str:
+    """Switch the database to WAL mode (persistent) and return the journal mode."""
+    conn = sqlite3.connect(sqlite_db_path)
+    mode = conn.execute("PRAGMA journal_mode = WAL;").fetchone()[0]
+    conn.close()
+    return mode
+
+
+def read_only_connection(sqlite_db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        f"file:{os.path.abspath(sqlite_db_path)}?mode=ro", uri=True, check_same_thread=False
+    )
+    conn.execute("PRAGMA query_only = ON;")
+    return conn
+
+
+def content_stamp(conn: sqlite3.Connection) -> str:
+    """
+    Stamp of the served data: the schema version and a checksum of
+    wgt_unweighted (one scan). Unlike file sizes and times it is the same
+    across restarts while the data is.
+    """
+    schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+    summary = conn.execute(
+        f"SELECT count(*), total({VALUE_COLUMN}), min(year * 100 + month), max(year * 100 + month) "
+        f"FROM {SERIES_TABLE};"
+    ).fetchone()
+    return hashlib.blake2b(repr((schema_version, summary)).encode(), digest_size=8).hexdigest()
+
+
+class DataVersion:
+    """
+    Version of the data that changes with every commit: the content stamp
+    taken at startup plus a generation counted up whenever PRAGMA
+    data_version (which changes when another connection commits) changes.
+    """
+
+    def __init__(self, sqlite_db_path: str):
+        self._conn = read_only_connection(sqlite_db_path)
+        self._lock = threading.Lock()
+        self._stamp = content_stamp(self._conn)
+        self._data_version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+        self._generation = 0
+
+    def current(self) -> str:
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._generation += 1
+            generation = self._generation
+        return self._stamp if generation == 0 else f"{self._stamp}.{generation}"
+
+    def close(self):
+        self._conn.close()
+
+
+class ConnectionPool:
+    """Fixed pool of read-only connections shared by the request threads."""
+
+    def __init__(self, sqlite_db_path: str, size: int = DEFAULT_POOL_SIZE):
+        self._connections = queue.Queue()
+        for _ in range(size):
+            self._connections.put(read_only_connection(sqlite_db_path))
+
+    @contextmanager
+    def connection(self):
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get().close()
+
+
+class ResponseCache:
+    """Encoded responses by (request, data version), least recently used dropped first."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def group_columns(conn: sqlite3.Connection) -> list:
+    """Group (dimension) columns of wgt_unweighted, in table order."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({SERIES_TABLE});") if 'group' in row[1]]
+
+
+def query_dimensions(conn: sqlite3.Connection) -> dict:
+    dimensions = {
+        column: [row[0] for row in conn.execute(
+            f'SELECT DISTINCT "{column}" FROM {SERIES_TABLE} WHERE "{column}" IS NOT NULL ORDER BY 1;'
+        )]
+        for column in group_columns(conn)
+    }
+    return {'dimensions': dimensions}
+
+
+def unknown_columns(conn: sqlite3.Connection, filters: list) -> list:
+    return sorted({column for column, _ in filters} - set(group_columns(conn)))
+
+
+def query_series(conn: sqlite3.Connection, filters: list) -> dict:
+    """
+    Monthly stats of wagegrowthtracker83 over the rows matching `filters`,
+    a list of (group column, value) pairs: ANDed across columns, ORed within
+    one. Columns must be group columns (see unknown_columns); values are bound.
+    """
+    values = {}
+    for column, value in filters:
+        values.setdefault(column, []).append(value)
+    where = ' AND '.join(
+        f'"{column}" IN ({", ".join("?" * len(column_values))})' for column, column_values in values.items()
+    )
+    params = [value for column_values in values.values() for value in column_values]
+    df = pd.read_sql_query(
+        f"SELECT year, month, {VALUE_COLUMN} FROM {SERIES_TABLE} "
+        f"WHERE {VALUE_COLUMN} IS NOT NULL{' AND ' + where if where else ''};",
+        conn, params=params
+    )
+    df[VALUE_COLUMN] = df[VALUE_COLUMN].astype('float64')
+    grouped = df.groupby(['year', 'month'], sort=True)[VALUE_COLUMN]
+    stats = pd.DataFrame({
+        'median': grouped.median(),
+        'p25': grouped.quantile(0.25),
+        'p75': grouped.quantile(0.75),
+        'mean': grouped.mean(),
+        'n': grouped.size(),
+    }).reset_index()
+    dates = [f"{int(year):04d}-{int(month):02d}" for year, month in zip(stats['year'], stats['month'])]
+    series = {'date': dates}
+    for stat in ('median', 'p25', 'p75', 'mean'):
+        series[stat] = [None if pd.isna(value) else round(float(value), 6) for value in stats[stat]]
+    series['n'] = stats['n'].astype(int).tolist()
+    return {'filters': values, 'series': series}
+
+
+class WgtService:
+    """The pool, cache and queries behind the HTTP handler."""
+
+    def __init__(
+        self,
+        sqlite_db_path: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        cache_entries: int = DEFAULT_CACHE_ENTRIES
+        ):
+        self.sqlite_db_path = sqlite_db_path
+        print(f"Journal mode: {enable_wal(sqlite_db_path)}")
+        self.pool = ConnectionPool(sqlite_db_path, pool_size)
+        self.cache = ResponseCache(cache_entries)
+        self.version = DataVersion(sqlite_db_path)
+
+    def etag(self, path: str, params: list, version: str) -> str:
+        request = repr((path, sorted(params))).encode()
+        return f'"{version}-{hashlib.blake2b(request, digest_size=8).hexdigest()}"'
+
+    def respond(self, path: str, params: list, if_none_match: str = None) -> tuple:
+        """(status, ETag, JSON body) for a GET request; body is None for 304."""
+        version = self.version.current()
+        if path == '/health':
+            return 200, None, json.dumps({'status': 'ok', 'data_version': version}).encode()
+        if path not in ('/dimensions', '/series'):
+            return 404, None, json.dumps({'error': f"Unknown endpoint {path}"}).encode()
+
+        etag = self.etag(path, params, version)
+        if if_none_match == etag:
+            return 304, etag, None
+        key = (path, tuple(sorted(params)), version)
+        body = self.cache.get(key)
+        if body is None:
+            with self.pool.connection() as conn:
+                if path == '/dimensions':
+                    result = query_dimensions(conn)
+                else:
+                    unknown = unknown_columns(conn, params)
+                    if unknown:
+                        error = f"Unknown group columns {unknown}; expected some of {group_columns(conn)}"
+                        return 400, None, json.dumps({'error': error}).encode()
+                    result = query_series(conn, params)
+            body = json.dumps({'data_version': version, **result}).encode()
+            self.cache.put(key, body)
+        return 200, etag, body
+
+
+class WgtRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, etag, body = self.service.respond(
+            url.path.rstrip('/') or '/', parse_qsl(url.query), self.headers.get('If-None-Match')
+        )
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(
+    sqlite_db_path: str,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    pool_size: int = DEFAULT_POOL_SIZE
+    ):
+    handler = type('Handler', (WgtRequestHandler,), {'service': WgtService(sqlite_db_path, pool_size)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {sqlite_db_path} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        handler.service.pool.close()
+        handler.service.version.close()
+
+
+if __name__ == "__main__":
+    # Load config
+    config_path = 'config.yml'
+    config = load_config(config_path)
+
+    serve(
+        config['sqlite_file_path'],
+        config.get('service_host', DEFAULT_HOST),
+        config.get('service_port', DEFAULT_PORT),
+        config.get('service_pool_size', DEFAULT_POOL_SIZE)
+    )
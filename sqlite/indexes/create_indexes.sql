@@ -1,8 +1,5 @@
--- Used for create_wgt_groups
-CREATE INDEX idx_personid ON cps_harmonized_longitudinally_matched(personid);
+-- Month ranges on the ingest table, used when refresh_wgt_groups copies new months into cps_wgt.
+-- cps_wgt itself is keyed and indexed by ingest/sqlite_schema.py.
 CREATE INDEX idx_date ON cps_harmonized_longitudinally_matched(date);
-CREATE INDEX idx_personid_date ON cps_harmonized_longitudinally_matched(personid, date);
-CREATE INDEX idx_personid_wgt_groups ON wgt_groups(personid);
-CREATE INDEX idx_date_wgt_groups ON wgt_groups(date);
-CREATE INDEX idx_personid_date_wgt_groups ON wgt_groups(personid, date);
-
+-- Month deletes in refresh_wgt_groups and lookups by cps_wgt's key
+CREATE INDEX idx_key_wgt_groups ON wgt_groups(date_monthly, personid);
@@ -5,6 +5,10 @@
 * This script mimicks the Atlanta Fed's create_wgt_groups.do Stata script
 * for analyzing wage growth. It creates groups (dimensions) to slice the
 * data on.
+* 
+* Reads cps_wgt (built by ingest/sqlite_schema.py): date_monthly is an
+* integer yyyymm, and the where clause matches its partial covering index,
+* so only rows with a wage growth observation are read.
 */
 create table wgt_groups as
 with 
@@ -40,26 +44,12 @@ with
 			, sameactivities94
 			, sameactivities94_tm1
 			, sameactivities94_tm2
-			, strftime('%Y', date) as year
-		    , strftime('%m', date) as month
-		    , strftime('%Y-%m', date) as date_monthly
-		from cps_harmonized_longitudinally_matched
+			, date_monthly
+		from cps_wgt
 		where 
 			age76 >= 16
 			/* Wage observations present for current observation and 12-month lag of same person. */
 			and wagegrowthtracker83 is not null
-		order by date desc
-	),
-	/* Wage quartiles */
-	wage_quartiles as (
-	    select
-	    	personid
-	        , date_monthly
-	        , ntile(4) over (
-	            partition by date_monthly
-	            order by wage_hr_avg
-	        ) as wagegroup
-	    from cps
 	),
 	/* Create all groups */
 	groups as (
@@ -67,16 +57,23 @@ with
 			personid
 			, date
 			, date_monthly
+			/* Wage quartile within the month, computed in the same pass as the groups */
+			, ntile(4) over (
+				partition by date_monthly
+				/* personid breaks ties, so every engine assigns the same quartiles */
+				order by wage_hr_avg, personid
+			) as wagequartile
 			, wageperhr82
 			, wageperhr82_tm12
+			/* begin generated: group cases */
 			, case
-				when paidhrly82 == 1 then 'Hourly'
-				when paidhrly82 == 2 then 'Non-Hourly'
+				when paidhrly82 == 1 and paidhrly82_tm12 == 1 then 'Hourly'
+				when paidhrly82 in (0,1) and paidhrly82_tm12 in (0,1) then 'Non-Hourly'
 			end as hrlygroup
 			, case
 				when
-					occupation76 != occupation76_tm12
-					or industry76 != industry76_tm12
+					occupation76 is not occupation76_tm12
+					or industry76 is not industry76_tm12
 					or sameemployer94 == 2
 					or sameemployer94_tm1 == 2
 					or sameemployer94_tm2 == 2
@@ -86,15 +83,15 @@ with
 				then 'Job Switcher'
 				else 'Job Stayer'
 			end as jstayergroup
-			, case 
+			, case
 				when age76 between 16 and 24 then '16-24'
 				when age76 between 25 and 54 then '25-54'
 				when age76 >= 55 then '55+'
 			end as agegroup
 			, case
+				when female76 == 0 then 'Male'
 				when female76 == 1 then 'Female'
-				else 'Male'
-			end as gendergroup
+			end as gengroup
 			, case
 				when industry76 in (1,2,3,13) then 'Goods'
 				when industry76 in (4,5,6,7,8,9,10,11,12) then 'Services'
@@ -132,7 +129,7 @@ with
 			end as indgroup
 			, case
 				when race76 == 1 then 'White'
-				when race76 in (2,3) then 'Nonwhite'
+				when race76 between 2 and 3 then 'Nonwhite'
 			end as racegroup
 			, case
 				when metstat78 == 1 then 'MSA'
@@ -149,15 +146,18 @@ with
 				when censusdiv76 == 8 then 'enc'
 				when censusdiv76 == 9 then 'mat'
 			end as cdivgroup
+			/* end generated */
 		from cps
 	)
 select
 	g.personid
 	, g.date
+	, g.date_monthly
+	/* begin generated: group columns */
 	, g.hrlygroup
 	, g.jstayergroup
 	, g.agegroup
-	, g.gendergroup
+	, g.gengroup
 	, g.secgroup
 	, g.edgroup3
 	, g.edgroup2
@@ -167,9 +167,17 @@ select
 	, g.indgroup
 	, g.racegroup
 	, g.msagroup
-	, w.wagegroup
+	, g.cdivgroup
+	/* end generated */
+	/* begin generated: wage group */
+	, case g.wagequartile
+		when 1 then '1st'
+		when 2 then '2nd'
+		when 3 then '3rd'
+		when 4 then '4th'
+	end as wagegroup
+	/* end generated */
 from groups g
-join wage_quartiles w 
-	on g.personid = w.personid
-	and g.date_monthly = w.date_monthly;
+/* cps_wgt key order, so wgt_unweighted reads cps_wgt rows in order */
+order by g.date_monthly, g.personid;
 
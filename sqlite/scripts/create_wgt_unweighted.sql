@@ -5,40 +5,24 @@
 * Joins groups created in create_wgt_groups back to some columns from
 * the original data. This is the dataset that will be used for unweighted
 * aggregations.
+* 
+* Reads cps_wgt (see create_wgt_groups.sql): year and month come from the
+* integer yyyymm date_monthly instead of parsing the date of every row.
+* wgt_groups has exactly the cps_wgt rows with a wage growth observation,
+* written in cps_wgt key order (date_monthly, personid), so each group row
+* finds its cps_wgt row by a primary key lookup in the same order rather
+* than through a join on the text date.
 */
 create table wgt_unweighted as
-with 
-	wages as (
-		select 
-			personid
-			, date
-			, strftime('%Y', date) as year
-		    , strftime('%m', date) as month
-		    , strftime('%Y-%m', date) as date_monthly
-		    , recession76
-		    /* Atlanta Fed uses average of wage and 12-month lag to create quartiles. */
-			, (wageperhr82 + wageperhr82_tm12) / 2 as wage_hr_avg
-			, wagegrowthtracker83 
-		from cps_harmonized_longitudinally_matched
-		where 
-			age76 >= 16
-			/* Wage observations present for current observation and 12-month lag of same person. */
-			and wagegrowthtracker83 is not null
-	),
-	groups as (
-		select * 
-		from wgt_groups
-	)
 select
 	g.*
-	, w.year
-	, w.month
-	, w.date_monthly
+	, g.date_monthly / 100 as year
+	, g.date_monthly % 100 as month
 	, w.recession76
-	, w.wage_hr_avg
+	/* Atlanta Fed uses average of wage and 12-month lag to create quartiles. */
+	, (w.wageperhr82 + w.wageperhr82_tm12) / 2 as wage_hr_avg
 	, w.wagegrowthtracker83
-from groups g
-join wages w
-	on g.personid = w.personid
-	and g.date = w.date;
-			
\ No newline at end of file
+from wgt_groups g
+join cps_wgt w
+	on w.date_monthly = g.date_monthly
+	and w.personid = g.personid;
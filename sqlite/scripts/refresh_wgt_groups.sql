@@ -0,0 +1,187 @@
+/* 
+* Recomputes wgt_groups for the months listed in the temp table
+* refresh_months(date_monthly, month_start, month_end), which is filled by
+* refresh_wgt_groups() in ingest/ingest_utils.py after a load.
+* 
+* Groups and wage quartiles are computed per date_monthly, so rebuilding
+* only the months an ingest touched gives the same result as rerunning
+* create_wgt_groups.sql. cps_wgt is clustered on date_monthly (an integer
+* yyyymm), so its rows are read by key; wgt_groups rows are deleted by
+* date_monthly, using idx_key_wgt_groups.
+*/
+begin;
+
+delete from wgt_groups
+where date_monthly in (select date_monthly from refresh_months);
+
+insert into wgt_groups
+with 
+	cps as (
+		select 
+			c.personid
+			, c.date
+			, c.age76
+			, c.female76
+			, c.race76
+			, c.censusdiv76
+			, c.occupation76
+			, c.occupation76_tm12
+			, c.industry76
+			, c.industry76_tm12
+			, c.recession76
+			, c.metstat78
+			, c.wageperhr82
+			, c.wageperhr82_tm12
+			/* Atlanta Fed uses average of wage and 12-month lag to create quartiles. */
+			, (c.wageperhr82 + c.wageperhr82_tm12) / 2 as wage_hr_avg
+			, c.paidhrly82
+			, c.paidhrly82_tm12
+			, c.wagegrowthtracker83
+			, c.employer89
+			, c.educ92
+			, c.lfdetail94
+			, c.lfdetail94_tm12
+			, c.sameemployer94
+			, c.sameemployer94_tm1
+			, c.sameemployer94_tm2
+			, c.sameactivities94
+			, c.sameactivities94_tm1
+			, c.sameactivities94_tm2
+		    , c.date_monthly
+		from refresh_months r
+		join cps_wgt c
+			on c.date_monthly = r.date_monthly
+		where 
+			c.age76 >= 16
+			/* Wage observations present for current observation and 12-month lag of same person. */
+			and c.wagegrowthtracker83 is not null
+	),
+	/* Create all groups */
+	groups as (
+		select 
+			personid
+			, date
+			, date_monthly
+			/* Wage quartile within the month, computed in the same pass as the groups */
+			, ntile(4) over (
+				partition by date_monthly
+				/* personid breaks ties, so every engine assigns the same quartiles */
+				order by wage_hr_avg, personid
+			) as wagequartile
+			/* begin generated: group cases */
+			, case
+				when paidhrly82 == 1 and paidhrly82_tm12 == 1 then 'Hourly'
+				when paidhrly82 in (0,1) and paidhrly82_tm12 in (0,1) then 'Non-Hourly'
+			end as hrlygroup
+			, case
+				when
+					occupation76 is not occupation76_tm12
+					or industry76 is not industry76_tm12
+					or sameemployer94 == 2
+					or sameemployer94_tm1 == 2
+					or sameemployer94_tm2 == 2
+					or sameactivities94 == 2
+					or sameactivities94_tm1 == 2
+					or sameactivities94_tm2 == 2
+				then 'Job Switcher'
+				else 'Job Stayer'
+			end as jstayergroup
+			, case
+				when age76 between 16 and 24 then '16-24'
+				when age76 between 25 and 54 then '25-54'
+				when age76 >= 55 then '55+'
+			end as agegroup
+			, case
+				when female76 == 0 then 'Male'
+				when female76 == 1 then 'Female'
+			end as gengroup
+			, case
+				when industry76 in (1,2,3,13) then 'Goods'
+				when industry76 in (4,5,6,7,8,9,10,11,12) then 'Services'
+			end as secgroup
+			, case
+				when educ92 between 1 and 3 then 'Nodegree'
+				when educ92 between 6 and 7 then 'Bachelor+'
+				when educ92 between 4 and 5 then 'Associates'
+			end as edgroup3
+			, case
+				when educ92 between 1 and 3 then 'Nodegree'
+				when educ92 between 4 and 7 then 'Degree'
+			end as edgroup2
+			, case
+				when occupation76 in (11,12,13) then 'Professional'
+				when occupation76 in (21,22,23,31,32,33,34) then 'Nonprofessional'
+			end as occgroup
+			, case
+				when lfdetail94 == 6 or lfdetail94 between 8 and 20 then 'Full-time'
+				when lfdetail94 == 7 or lfdetail94 between 21 and 32 then 'Part-time'
+			end as ftptgroup
+			, case
+				when occupation76 in (32,33,34) then 'Low'
+				when occupation76 in (21,22,23,31) then 'Middle'
+				when occupation76 in (11,12,13) then 'High'
+			end as skillgroup
+			, case
+				when industry76 in (1,2) then 'Construction & Mining'
+				when industry76 == 9 then 'Education & Health'
+				when industry76 in (6,7,8) then 'Finance and Business Services'
+				when industry76 in (10,11) then 'Leisure & Hospitality'
+				when industry76 == 3 then 'Manufacturing'
+				when industry76 == 12 then 'Public Administration'
+				when industry76 in (4,5) then 'Trade & Transportation'
+			end as indgroup
+			, case
+				when race76 == 1 then 'White'
+				when race76 between 2 and 3 then 'Nonwhite'
+			end as racegroup
+			, case
+				when metstat78 == 1 then 'MSA'
+				when metstat78 == 2 then 'NonMSA'
+			end as msagroup
+			, case
+				when censusdiv76 == 1 then 'pac'
+				when censusdiv76 == 2 then 'esc'
+				when censusdiv76 == 3 then 'wsc'
+				when censusdiv76 == 4 then 'mnt'
+				when censusdiv76 == 5 then 'nen'
+				when censusdiv76 == 6 then 'sat'
+				when censusdiv76 == 7 then 'wnc'
+				when censusdiv76 == 8 then 'enc'
+				when censusdiv76 == 9 then 'mat'
+			end as cdivgroup
+			/* end generated */
+		from cps
+	)
+select
+	g.personid
+	, g.date
+	, g.date_monthly
+	/* begin generated: group columns */
+	, g.hrlygroup
+	, g.jstayergroup
+	, g.agegroup
+	, g.gengroup
+	, g.secgroup
+	, g.edgroup3
+	, g.edgroup2
+	, g.occgroup
+	, g.ftptgroup
+	, g.skillgroup
+	, g.indgroup
+	, g.racegroup
+	, g.msagroup
+	, g.cdivgroup
+	/* end generated */
+	/* begin generated: wage group */
+	, case g.wagequartile
+		when 1 then '1st'
+		when 2 then '2nd'
+		when 3 then '3rd'
+		when 4 then '4th'
+	end as wagegroup
+	/* end generated */
+from groups g
+/* cps_wgt key order, so wgt_unweighted reads cps_wgt rows in order */
+order by g.date_monthly, g.personid;
+
+commit;